@@ -1,66 +1,196 @@
-from netmiko import ConnectHandler
 import os
-import io
+import status_cache
+import re
+import json
+import threading
 import subprocess
-import glob
-from textfsm import TextFSM
+import metrics
+from backup_catalog import catalog
 
 username = "admin"
 password = "cisco"
 
+BASE_DIR = os.path.dirname(os.path.abspath(__file__)) or '.'
+
+# Jobs arriving within this many seconds share one ansible-playbook run
+BATCH_WINDOW = float(os.environ.get("ANSIBLE_BATCH_WINDOW", 0.5))
+# Upper limit for the -f (forks) option of a combined run
+MAX_FORKS = int(os.environ.get("ANSIBLE_MAX_FORKS", 10))
+
+# ansible-playbook prints one JSON document with every task result instead
+# of the human readable log, so results are read instead of scraped
+CALLBACK_ENV = {
+    "ANSIBLE_STDOUT_CALLBACK": os.environ.get("ANSIBLE_JSON_CALLBACK", "ansible.posix.json"),
+    "ANSIBLE_LOAD_CALLBACK_PLUGINS": "1",
+}
+
+# IOS shows the banner between ^C delimiters whatever delimiter was configured
+MOTD_BANNER = re.compile(r'banner motd \^C(.*?)\^C', re.DOTALL)
+
+
+def _host_results(report, hosts):
+    """
+    Per-host results from the JSON callback report
+
+    Returns {host: {"ok": bool, "tasks": {task name: task result}}}
+    """
+    host_results = {host: {"ok": False, "tasks": {}} for host in hosts}
+
+    for play in report.get("plays", []):
+        for task in play.get("tasks", []):
+            name = task.get("task", {}).get("name", "")
+            for host, task_result in task.get("hosts", {}).items():
+                if host in host_results:
+                    host_results[host]["tasks"][name] = task_result
+
+    # the stats have the same counters as PLAY RECAP
+    for host, stats in report.get("stats", {}).items():
+        if host in host_results:
+            host_results[host]["ok"] = stats.get("unreachable", 0) == 0 and stats.get("failures", 0) == 0
+
+    return host_results
+
+
+def run_playbook(playbook, hosts, extra_vars=None):
+    """
+    Run one ansible-playbook for several hosts at once
+
+    Args:
+        playbook: playbook file name
+        hosts: list of inventory hosts, passed as a combined --limit
+        extra_vars: optional string for -e
+
+    Returns:
+        Dict with "returncode", "stderr" and "hosts", where hosts maps each
+        host to {"ok": bool, "tasks": {task name: registered result}}
+    """
+    cmd = ['ansible-playbook', playbook, '-l', ",".join(hosts), '-f', str(max(1, min(len(hosts), MAX_FORKS)))]
+    if extra_vars is not None:
+        cmd.extend(['-e', extra_vars])
+
+    with metrics.timed("rpc", "ansible"):
+        result = subprocess.run(
+            cmd,
+            capture_output=True,
+            text=True,
+            cwd=BASE_DIR,
+            env={**os.environ, **CALLBACK_ENV}
+        )
+
+    with metrics.timed("reply_parse", "ansible"):
+        try:
+            report = json.loads(result.stdout)
+        except ValueError:
+            # ansible-playbook failed before the callback could report anything
+            print(f"Error: no JSON report from ansible-playbook: {result.stderr.strip()}")
+            report = {}
+        host_results = _host_results(report, hosts)
+
+    for host_result in host_results.values():
+        if not host_result["ok"]:
+            metrics.device_errors_total.inc(backend="ansible", reason="playbook")
+
+    return {
+        "returncode": result.returncode,
+        "stderr": result.stderr,
+        "hosts": host_results,
+    }
+
+
+class AnsibleBatcher:
+    """
+    Coalesce playbook jobs into one multi-host ansible-playbook run
+
+    The first job for a (playbook, extra_vars) pair opens a batch and starts
+    a timer; jobs for the same pair arriving within the window join the batch.
+    When the timer fires the batch runs once with a combined --limit and every
+    waiting caller gets the result of its own host.
+    """
+
+    def __init__(self, window=BATCH_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._batches = {}  # (playbook, extra_vars) -> open batch
+
+    def submit(self, playbook, router_ip, extra_vars=None):
+        """Run playbook for router_ip as part of a batch, returns the per-host result"""
+        key = (playbook, extra_vars)
+        with self._lock:
+            batch = self._batches.get(key)
+            if batch is None:
+                batch = {"hosts": [], "done": threading.Event(), "result": None, "error": None}
+                self._batches[key] = batch
+                timer = threading.Timer(self.window, self._run, (key,))
+                timer.daemon = True
+                timer.start()
+            if router_ip not in batch["hosts"]:
+                batch["hosts"].append(router_ip)
+
+        batch["done"].wait()
+        if batch["error"] is not None:
+            raise batch["error"]
+        result = batch["result"]
+        return {
+            "returncode": result["returncode"],
+            "stderr": result["stderr"],
+            **result["hosts"][router_ip],
+        }
+
+    def _run(self, key):
+        with self._lock:
+            batch = self._batches.pop(key)
+        playbook, extra_vars = key
+        print(f"Running {playbook} for {len(batch['hosts'])} host(s): {', '.join(batch['hosts'])}")
+        try:
+            batch["result"] = run_playbook(playbook, batch["hosts"], extra_vars)
+        except Exception as e:
+            batch["error"] = e
+        finally:
+            batch["done"].set()
+
+
+batcher = AnsibleBatcher()
+
 
 def showrun(router_ip):
     """
     Use Ansible playbook to backup running-config from Cisco router
-    
+
     Args:
         router_ip: IP address of the router
-    
+
     Returns:
         Tuple of (status, backup_file_path)
     """
     try:
-        # Create backups directory if not exists
-        if not os.path.exists("backups"):
-            os.makedirs("backups")
-        
-        # Run ansible-playbook command with limit to specific host
-        result = subprocess.run(
-            ['ansible-playbook', 'playbook.yaml', '-l', router_ip],
-            capture_output=True,
-            text=True,
-            cwd=os.path.dirname(os.path.abspath(__file__)) or '.'
-        )
-        
-        # Check if ansible-playbook executed successfully
-        if result.returncode == 0:
-            print(f"Ansible playbook executed successfully")
-            print(result.stdout)
-            
-            # Find the backup file created by Ansible
-            # Pattern: backups/show_run_66070077_*.txt
-            backup_pattern = "backups/show_run_66070077_*.txt"
-            backup_files = glob.glob(backup_pattern)
-            
-            if backup_files:
-                # Get the most recent backup file
-                backup_file = max(backup_files, key=os.path.getctime)
+        # Create the backups directory of the router if not exists; the
+        # playbook runs in BASE_DIR, whatever directory the bot started in
+        os.makedirs(os.path.join(BASE_DIR, "backups", router_ip), exist_ok=True)
+
+        # Run ansible-playbook, batched with other showrun requests
+        result = batcher.submit('playbook.yaml', router_ip)
+
+        # Check if the playbook succeeded for this host
+        if result["ok"]:
+            print(f"Ansible playbook executed successfully for {router_ip}")
+
+            # Hostname fact and the file written by the copy task
+            tasks = result["tasks"]
+            hostname = tasks.get("EXTRACT HOSTNAME", {}).get("ansible_facts", {}).get("router_hostname")
+            backup_file = tasks.get("SAVE OUTPUT TO ./backups/", {}).get("dest")
+
+            if backup_file and os.path.exists(os.path.join(BASE_DIR, backup_file)):
                 print(f"Successfully saved running-config to {backup_file}")
-                return ('ok', backup_file)
+                catalog.record(router_ip, hostname, os.path.join(BASE_DIR, backup_file))
+                return ('ok', catalog.latest_path(router_ip))
             else:
-                # Fallback: check for specific router IP
-                backup_file = f"backups/show_run_66070077_{router_ip}.txt"
-                if os.path.exists(backup_file):
-                    print(f"Successfully saved running-config to {backup_file}")
-                    return ('ok', backup_file)
-                else:
-                    print("Error: Backup file not found after Ansible execution")
-                    return ('Error: Ansible - Backup file not created', None)
+                print("Error: Backup file not found after Ansible execution")
+                return ('Error: Ansible - Backup file not created', None)
         else:
-            print(f"Ansible playbook failed with return code {result.returncode}")
-            print(f"Error output: {result.stderr}")
+            print(f"Ansible playbook failed for {router_ip} with return code {result['returncode']}")
+            print(f"Error output: {result['stderr']}")
             return ('Error: Ansible', None)
-            
+
     except FileNotFoundError:
         print("Error: ansible-playbook command not found. Make sure Ansible is installed.")
         return ('Error: Ansible not installed', None)
@@ -69,83 +199,59 @@ def showrun(router_ip):
         return ('Error: Ansible', None)
 
 
+def _parse_motd(output):
+    """Extract the MOTD text from "show running-config | section banner motd" output"""
+    match = MOTD_BANNER.search(output)
+    if not match:
+        return None
+    lines = [line.strip() for line in match.group(1).split('\n')]
+    return '\n'.join(line for line in lines if line) or None
+
+
+@status_cache.invalidates
 def motd(router_ip, motd_message=None):
     """
     Configure or read MOTD banner on router using Ansible
-    
+
     Args:
         router_ip: IP address of the router
         motd_message: Message to set as MOTD banner (None to read current MOTD)
-    
+
     Returns:
         Success message or current MOTD text
     """
     try:
-        # Build ansible-playbook command
-        cmd = ['ansible-playbook', 'playbook_motd.yaml', '-l', router_ip]
-        
         # Add extra vars if configuring MOTD
+        extra_vars = None
         if motd_message is not None:
             # Properly quote the message for shell
             # Replace single quotes with escaped version for YAML
             safe_message = motd_message.replace("'", "''")
-            cmd.extend(['-e', f"motd_message='{safe_message}'"])
-        
-        # Run ansible-playbook command
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            cwd=os.path.dirname(os.path.abspath(__file__)) or '.'
-        )
-        
-        # Check if ansible-playbook executed successfully
-        if result.returncode == 0:
-            print(f"Ansible MOTD playbook executed successfully")
-            print(result.stdout)
-            
+            extra_vars = f"motd_message='{safe_message}'"
+
+        # Run ansible-playbook, batched with other requests using the same message
+        result = batcher.submit('playbook_motd.yaml', router_ip, extra_vars)
+
+        # Check if the playbook succeeded for this host
+        if result["ok"]:
+            print(f"Ansible MOTD playbook executed successfully for {router_ip}")
+
             if motd_message is None:
-                # Parse MOTD from Ansible output
-                output = result.stdout
-                
-                # Extract MOTD content from Ansible debug output
-                if "banner motd" in output:
-                    lines = output.split('\n')
-                    banner_content = []
-                    capture = False
-                    
-                    for line in lines:
-                        if 'banner motd' in line:
-                            # Check for single-line banner
-                            if '^C' in line:
-                                parts = line.split('^C')
-                                if len(parts) >= 3:
-                                    return parts[1].strip()
-                                else:
-                                    capture = True
-                                    continue
-                        elif capture:
-                            if '^C' in line and line.strip() == '^C':
-                                break
-                            elif line.strip() and not line.strip().startswith('TASK') and not line.strip().startswith('PLAY'):
-                                banner_content.append(line.strip())
-                    
-                    if banner_content:
-                        # Clean up Ansible formatting
-                        motd_text = '\n'.join(banner_content)
-                        # Remove Ansible debug prefixes
-                        motd_text = motd_text.replace('"msg":', '').replace('"', '').strip()
-                        return motd_text if motd_text else "No MOTD banner configured"
-                
+                # stdout registered by the READ CURRENT MOTD task
+                stdout = result["tasks"].get("READ CURRENT MOTD", {}).get("stdout") or [""]
+                motd_text = _parse_motd(stdout[0])
+                if motd_text:
+                    return motd_text
+
                 return "No MOTD banner configured"
             else:
                 # MOTD was configured successfully
                 return "Ok: success"
         else:
-            print(f"Ansible MOTD playbook failed with return code {result.returncode}")
-            print(f"Error output: {result.stderr}")
+            print(f"Ansible MOTD playbook failed for {router_ip} with return code {result['returncode']}")
+            print(f"Error output: {result['stderr']}")
             return f"Error: Ansible failed"
-            
+
     except FileNotFoundError:
         print("Error: ansible-playbook command not found. Make sure Ansible is installed.")
         return "Error: Ansible not installed"
@@ -0,0 +1,115 @@
+import importlib
+import os
+import sys
+import threading
+import time
+
+# Load every backend in a background thread right after start instead of on
+# first use (IPA_WARMUP=1), so the first command does not pay for the imports
+WARMUP = os.environ.get("IPA_WARMUP", "0").lower() in ("1", "true", "yes", "on")
+
+# Seconds each lazily imported module took to load, in load order
+load_times = {}
+
+
+class LazyModule:
+    """
+    Stand-in for a module that is imported on its first attribute access
+
+    restconf_final = backends.lazy("restconf_final") can be used like the
+    module itself; the import (ncclient, paramiko, netmiko, textfsm, ...)
+    happens the first time a command needs it. Concurrent first uses share
+    one import.
+    """
+
+    def __init__(self, name):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+        self.__dict__["_lock"] = threading.Lock()
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is not None:
+            return module
+        name = self.__dict__["_name"]
+        with self.__dict__["_lock"]:
+            if self.__dict__["_module"] is None:
+                loaded = name in sys.modules
+                start = time.perf_counter()
+                module = importlib.import_module(name)
+                if not loaded:
+                    load_times[name] = time.perf_counter() - start
+                    print(f"Loaded {name} in {load_times[name] * 1000:.0f} ms")
+                self.__dict__["_module"] = module
+            return self.__dict__["_module"]
+
+    @property
+    def loaded(self):
+        return self.__dict__["_module"] is not None
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __repr__(self):
+        state = "loaded" if self.loaded else "not loaded"
+        return f"<lazy module {self.__dict__['_name']} ({state})>"
+
+
+_modules = {}
+_modules_lock = threading.Lock()
+
+
+def lazy(name):
+    """The shared LazyModule of a module name"""
+    with _modules_lock:
+        if name not in _modules:
+            _modules[name] = LazyModule(name)
+        return _modules[name]
+
+
+def warm_up(names=None):
+    """
+    Import the given lazy modules one after another
+
+    By default all of them, including lazy modules that the loaded modules
+    declare themselves (e.g. netmiko in netmiko_final).
+    """
+    done = set()
+    while True:
+        todo = [name for name in (names or list(_modules)) if name not in done]
+        if not todo:
+            return
+        for name in todo:
+            done.add(name)
+            try:
+                lazy(name)._load()
+            except Exception as e:
+                print(f"Error loading {name}: {e}")
+
+
+def start_warm_up(names=None):
+    thread = threading.Thread(target=warm_up, args=(names,), name="warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def report(started_at):
+    """
+    Where startup time went, as text
+
+    started_at is the time.perf_counter() at which the main module started
+    importing; lazy modules are listed with their load time once loaded.
+    For a per-module breakdown run python -X importtime ipa2024_final.py.
+    """
+    lines = [f"Started in {(time.perf_counter() - started_at) * 1000:.0f} ms"]
+    for name, module in sorted(_modules.items()):
+        if name in load_times:
+            lines.append(f"  {name}: {load_times[name] * 1000:.0f} ms")
+        elif module.loaded:
+            lines.append(f"  {name}: already imported")
+        else:
+            lines.append(f"  {name}: on first use")
+    return "\n".join(lines)
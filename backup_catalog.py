@@ -0,0 +1,150 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from backup_store import store
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CATALOG_FILE = os.path.join(BASE_DIR, "backups", "catalog.json")
+
+
+def file_sha256(path):
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(65536), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+class BackupCatalog:
+    """
+    Index of running-config backups per router
+
+    The catalog maps router IP -> {"hostname", "versions"} where every version
+    records the file path (relative to the repository), the time it was taken,
+    its size and SHA-256. It is updated whenever a backup is written and saved
+    as JSON next to the backups, so finding the latest backup of a router is a
+    dictionary lookup instead of scanning the backups directory.
+
+    The file at a version's path is overwritten by the next backup; the
+    content of every version is kept in the backup store under its SHA-256.
+    """
+
+    def __init__(self, path=CATALOG_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._routers = {}
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self._routers = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Error reading backup catalog {path}: {e}")
+
+    def _save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._routers, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def record(self, router_ip, hostname, path, sha256=None, size=None):
+        """
+        Add a backup of router_ip that was just written to path
+
+        sha256 and size are computed from the file when not given. A config
+        identical to the latest version does not create a new version; the
+        latest one is returned with "unchanged" set instead. New content goes
+        into the backup store as a delta against the previous version.
+        Returns the version entry.
+        """
+        if sha256 is None:
+            sha256 = file_sha256(path)
+        if size is None:
+            size = os.path.getsize(path)
+
+        previous = self.latest(router_ip)
+        if previous is not None and previous["sha256"] == sha256 and store.has(sha256):
+            with self._lock:
+                latest = self._routers[router_ip]["versions"][-1]
+                if latest["path"] != os.path.relpath(path, BASE_DIR):
+                    latest["path"] = os.path.relpath(path, BASE_DIR)
+                    self._save()
+                previous = dict(latest, unchanged=True)
+            return previous
+
+        with open(path, "rb") as f:
+            content = f.read()
+        store.put(content, base=previous["sha256"] if previous else None)
+
+        with self._lock:
+            router = self._routers.setdefault(router_ip, {"hostname": hostname, "versions": []})
+            version = {
+                "version": len(router["versions"]) + 1,
+                "path": os.path.relpath(path, BASE_DIR),
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime()),
+                "size": size,
+                "sha256": sha256,
+            }
+            router["hostname"] = hostname
+            router["versions"].append(version)
+            self._save()
+        return version
+
+    def latest(self, router_ip):
+        """Latest version entry of router_ip, or None if it was never backed up"""
+        with self._lock:
+            router = self._routers.get(router_ip)
+            if not router or not router["versions"]:
+                return None
+            return dict(router["versions"][-1])
+
+    def latest_path(self, router_ip):
+        """
+        Absolute path of the latest backup file of router_ip, or None
+
+        The file is checked against the SHA-256 of the version and written
+        again from the backup store when something else changed it.
+        """
+        version = self.latest(router_ip)
+        if version is None:
+            return None
+        path = os.path.join(BASE_DIR, version["path"])
+        if os.path.exists(path) and file_sha256(path) == version["sha256"]:
+            return path
+        if not store.has(version["sha256"]):
+            print(f"Error: backup {version['path']} of {router_ip} changed and is not in the store")
+            return None
+        print(f"Restoring {version['path']} of {router_ip} from the backup store")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(store.get(version["sha256"]))
+        os.replace(tmp_path, path)
+        return path
+
+    def versions(self, router_ip):
+        with self._lock:
+            router = self._routers.get(router_ip)
+            return [dict(v) for v in router["versions"]] if router else []
+
+    def version(self, router_ip, number):
+        """Version entry number (1 = oldest, negative counts from the latest)"""
+        with self._lock:
+            router = self._routers.get(router_ip)
+            if not router:
+                return None
+            versions = router["versions"]
+            index = number - 1 if number > 0 else len(versions) + number
+            if 0 <= index < len(versions):
+                return dict(versions[index], version=index + 1)
+            return None
+
+    def hostname(self, router_ip):
+        with self._lock:
+            router = self._routers.get(router_ip)
+            return router["hostname"] if router else None
+
+
+catalog = BackupCatalog()
@@ -0,0 +1,153 @@
+import os
+import time
+import hashlib
+import metrics
+import backends
+from backup_catalog import catalog
+from backup_store import store
+
+# loaded when a backup is made with the engine that needs it
+netmiko_final = backends.lazy("netmiko_final")
+ansible_final = backends.lazy("ansible_final")
+
+BACKUP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backups")
+
+# "native" streams the config over the cached Netmiko channel,
+# "ansible" runs playbook.yaml like before
+SHOWRUN_ENGINE = os.environ.get("SHOWRUN_ENGINE", "native")
+SHOWRUN_TIMEOUT = float(os.environ.get("SHOWRUN_TIMEOUT", 60))
+
+
+def showrun(router_ip, engine=None):
+    """
+    Save the running-config of a router to backups/<router_ip>/show_run_66070077_<hostname>.txt
+
+    Args:
+        router_ip: IP address of the router
+        engine: "native" or "ansible" (default: SHOWRUN_ENGINE)
+
+    Returns:
+        Tuple of (status, backup_file_path)
+    """
+    engine = engine or SHOWRUN_ENGINE
+    if engine == "ansible":
+        return ansible_final.showrun(router_ip)
+    return showrun_native(router_ip)
+
+
+def last_backup(router_ip):
+    """
+    Latest backup of a router from the catalog, without contacting the router
+
+    Returns:
+        Tuple of (status, backup_file_path)
+    """
+    backup_file = catalog.latest_path(router_ip)
+    if backup_file and os.path.exists(backup_file):
+        return ('ok', backup_file)
+    return ('Error: No backup found', None)
+
+
+def diff_backups(router_ip, old=None, new=None):
+    """
+    Changed lines between two backup versions of a router
+
+    Versions are the numbers from the catalog (1 = oldest); by default the
+    latest backup is compared with the one before it. The versions come from
+    the backup store, the router is not contacted.
+    """
+    new_version = catalog.version(router_ip, new if new is not None else -1)
+    old_version = catalog.version(router_ip, old if old is not None else new_version["version"] - 1) if new_version else None
+    if new_version is None or old_version is None:
+        return f"Error: Not enough backups of {router_ip} to compare"
+
+    old_name = f"v{old_version['version']} {old_version['timestamp']}"
+    new_name = f"v{new_version['version']} {new_version['timestamp']}"
+    lines = store.diff(old_version["sha256"], new_version["sha256"], old_name, new_name)
+    if not lines:
+        return f"No changes between {old_name} and {new_name}"
+    return "\n".join(lines)
+
+
+def _stream_running_config(ssh, fileobject):
+    """
+    Send "show running-config" and write the output to fileobject as it arrives
+
+    Lines are written one by one instead of collecting the whole config in
+    memory, and the hostname, size and SHA-256 are picked up on the way.
+    Returns (hostname, sha256, size).
+    """
+    hostname = None
+    sha = hashlib.sha256()
+    size = 0
+    prompt = ssh.base_prompt
+    ssh.clear_buffer()
+    ssh.write_channel("show running-config" + ssh.RETURN)
+
+    pending = ""
+    echo_skipped = False
+    deadline = time.monotonic() + SHOWRUN_TIMEOUT
+    while True:
+        chunk = ssh.read_channel()
+        if not chunk:
+            if time.monotonic() > deadline:
+                raise TimeoutError("Timed out reading running-config")
+            time.sleep(0.05)
+            continue
+
+        pending += chunk
+        lines = pending.split("\n")
+        # the last piece is an unfinished line (or the prompt), keep it for later
+        pending = lines.pop()
+        for line in lines:
+            line = line.rstrip("\r")
+            if not echo_skipped:
+                # skip up to the echo of the command itself, anything before
+                # it (e.g. a late prompt of the previous command) is old output
+                echo_skipped = "show running-config" in line
+                continue
+            if hostname is None and line.startswith("hostname "):
+                hostname = line.split()[1]
+            data = (line + "\n").encode()
+            sha.update(data)
+            size += len(data)
+            fileobject.write(data)
+
+        # the router prints its prompt again when the output is complete
+        tail = pending.strip()
+        if echo_skipped and tail.startswith(prompt) and tail[-1:] in ("#", ">"):
+            break
+
+    return hostname or prompt, sha.hexdigest(), size
+
+
+def showrun_native(router_ip):
+    """
+    Back up the running-config over the cached Netmiko SSH channel
+
+    One "show running-config" is streamed to a temporary file which is then
+    renamed using the hostname found in the same output.
+    """
+    router_dir = os.path.join(BACKUP_DIR, router_ip)
+    tmp_path = os.path.join(router_dir, ".show_run.tmp")
+    try:
+        os.makedirs(router_dir, exist_ok=True)
+
+        with netmiko_final.connections.connection(router_ip) as ssh:
+            with open(tmp_path, "wb") as fileobject, metrics.timed("rpc", "cli"):
+                hostname, sha256, size = _stream_running_config(ssh, fileobject)
+
+        # one directory per router, two routers with the same hostname do not share a file
+        backup_file = os.path.join(router_dir, f"show_run_66070077_{hostname}.txt")
+        os.replace(tmp_path, backup_file)
+        catalog.record(router_ip, hostname, backup_file, sha256=sha256, size=size)
+        print(f"Successfully saved running-config to {backup_file}")
+        return ('ok', backup_file)
+    except Exception as e:
+        print(f"Error backing up running-config of {router_ip}: {e}")
+        # do not leave a partial config behind
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        return ('Error: Backup failed', None)
@@ -0,0 +1,129 @@
+import difflib
+import hashlib
+import json
+import os
+import threading
+import zlib
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STORE_DIR = os.path.join(BASE_DIR, "backups", "store")
+
+# After this many deltas in a row a full copy is stored again, so rebuilding
+# an old version never has to walk a long chain
+MAX_CHAIN = int(os.environ.get("BACKUP_MAX_CHAIN", 10))
+
+
+class BackupStore:
+    """
+    Content-addressed store for running-config versions
+
+    Every version is stored once under its SHA-256, zlib compressed, either
+    as a full copy or as a line delta against an earlier version (its base).
+    Identical configs are stored only once, and since successive backups
+    usually differ by a few lines most versions are a small delta.
+
+    Object format (before compression):
+        b"F" + content                                   full copy
+        b"D" + json {"base": sha, "depth": n, "ops": [...]}   delta
+
+    Delta ops rebuild the new lines from the base lines:
+        ["=", i1, i2]          copy base lines i1:i2
+        ["+", [line, ...]]     insert these lines
+    """
+
+    def __init__(self, path=STORE_DIR):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _object_path(self, sha256):
+        return os.path.join(self.path, sha256[:2], sha256 + ".z")
+
+    def has(self, sha256):
+        return os.path.exists(self._object_path(sha256))
+
+    def _read(self, sha256):
+        with open(self._object_path(sha256), "rb") as f:
+            return zlib.decompress(f.read())
+
+    def _write(self, sha256, data):
+        path = self._object_path(sha256)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(zlib.compress(data, 9))
+        os.replace(tmp_path, path)
+
+    def _depth(self, sha256):
+        data = self._read(sha256)
+        if data[:1] == b"F":
+            return 0
+        return json.loads(data[1:])["depth"]
+
+    def put(self, content, base=None):
+        """
+        Store content (bytes), as a delta against base when that is worth it
+
+        Returns (sha256, stored) where stored is False if the exact same
+        content was already in the store.
+        """
+        sha256 = hashlib.sha256(content).hexdigest()
+        with self._lock:
+            if self.has(sha256):
+                return sha256, False
+
+            data = b"F" + content
+            if base is not None and self.has(base):
+                depth = self._depth(base) + 1
+                if depth <= MAX_CHAIN:
+                    ops = self._make_delta(self.get(base), content)
+                    delta = b"D" + json.dumps({"base": base, "depth": depth, "ops": ops}).encode()
+                    # a delta of a totally different config can be bigger than a copy
+                    if len(delta) < len(data):
+                        data = delta
+            self._write(sha256, data)
+        return sha256, True
+
+    def get(self, sha256):
+        """Rebuild the content of a version (bytes)"""
+        # walk back to the nearest full copy, then apply the deltas forwards
+        chain = []
+        data = self._read(sha256)
+        while data[:1] == b"D":
+            delta = json.loads(data[1:])
+            chain.append(delta["ops"])
+            data = self._read(delta["base"])
+
+        lines = data[1:].decode().splitlines(keepends=True)
+        for ops in reversed(chain):
+            lines = self._apply_delta(lines, ops)
+        return "".join(lines).encode()
+
+    def _make_delta(self, old, new):
+        old_lines = old.decode().splitlines(keepends=True)
+        new_lines = new.decode().splitlines(keepends=True)
+        ops = []
+        matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == "equal":
+                ops.append(["=", i1, i2])
+            elif j2 > j1:
+                ops.append(["+", new_lines[j1:j2]])
+        return ops
+
+    def _apply_delta(self, lines, ops):
+        result = []
+        for op in ops:
+            if op[0] == "=":
+                result.extend(lines[op[1]:op[2]])
+            else:
+                result.extend(op[1])
+        return result
+
+    def diff(self, old_sha, new_sha, old_name="old", new_name="new"):
+        """Changed lines between two stored versions (unified diff without context)"""
+        old_lines = self.get(old_sha).decode().splitlines()
+        new_lines = self.get(new_sha).decode().splitlines()
+        return list(difflib.unified_diff(old_lines, new_lines, old_name, new_name, n=0, lineterm=""))
+
+
+store = BackupStore()
@@ -0,0 +1,283 @@
+"""
+End-to-end latency and throughput of the bot commands against local simulators
+
+Starts RESTCONF, NETCONF and IOS CLI simulators for 10.0.15.61-65 plus a
+fake Webex API, points the bot modules at them and times every command per
+method. Prints p50/p95/p99 latency and throughput per scenario; --json saves
+the results and --baseline compares against an earlier run (exit code 1 on a
+regression), so slowdowns are caught without real routers.
+
+Run from the repository root:
+    python benchmarks/bench_e2e.py [-n 30] [-c 1] [--latency 5] [--only restconf]
+    python benchmarks/bench_e2e.py --json before.json
+    python benchmarks/bench_e2e.py --baseline before.json
+
+Ansible is not covered: its modules need a real IOS over network_cli.
+"""
+import argparse
+import importlib
+import os
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import benchlib
+from simulators import ROUTER_IPS, SimulatedNetwork, WebexSimulator
+
+ROOM_ID = "sim-room"
+TOKEN = "sim-token"
+
+
+def ok_text(result):
+    text = result if isinstance(result, str) else str(result)
+    return not text.startswith(("Error", "Cannot"))
+
+
+def ok_showrun(result):
+    return isinstance(result, tuple) and result[0] == "ok"
+
+
+def setup_environment(network, webex, workdir, cache_ttl=None, workers=None):
+    """Settings that must be in place before the bot modules are imported"""
+    os.environ.update(network.env())
+    os.environ.update({
+        "WEBEX_API_URL": webex.url,
+        "WEBEX_ACCESS_TOKEN": TOKEN,
+        "WEBEX_ROOM_ID": ROOM_ID,
+        "MESSAGE_CURSOR_FILE": os.path.join(workdir, "cursor.json"),
+        "SHOWRUN_ENGINE": "native",
+    })
+    if cache_ttl is not None:
+        os.environ["STATUS_CACHE_TTL"] = str(cache_ttl)
+    if workers is not None:
+        os.environ["DISPATCH_WORKERS"] = str(workers)
+
+
+def load_bot(workdir):
+    bot = {name: importlib.import_module(name) for name in (
+        "restconf_final", "netconf_final", "netmiko_final", "backup_final",
+        "backup_catalog", "backup_store", "ipa2024_final",
+    )}
+    # keep the benchmark backups out of the repository
+    bot["backup_final"].BACKUP_DIR = os.path.join(workdir, "backups")
+    bot["backup_catalog"].catalog.path = os.path.join(workdir, "backups", "catalog.json")
+    bot["backup_store"].store.path = os.path.join(workdir, "backups", "store")
+    return bot
+
+
+def loopback_cycle(method):
+    """create, status, disable, enable, delete of one loopback through a backend"""
+    def run(bot, rec, router_ip, number, record=True):
+        backend = bot[f"{method}_final"]
+        steps = [
+            ("create", lambda: backend.create(router_ip, number)),
+            ("status", lambda: backend.status(router_ip, number)),
+            ("disable", lambda: backend.disable(router_ip, number)),
+            ("enable", lambda: backend.enable(router_ip, number)),
+            ("delete", lambda: backend.delete(router_ip, number)),
+        ]
+        for name, step in steps:
+            if record:
+                rec.time(name, method, step, ok_text)
+            else:
+                step()
+    return run
+
+
+def gigabit_status(backend):
+    def run(bot, rec, router_ip, number, record=True):
+        bot["netmiko_final"].GIGABIT_STATUS_BACKEND = backend
+        step = lambda: bot["netmiko_final"].gigabit_status(router_ip)
+        rec.time("gigabit_status", backend, step, ok_text) if record else step()
+    return run
+
+
+def motd(bot, rec, router_ip, number, record=True):
+    step = lambda: bot["netmiko_final"].motd_read(router_ip)
+    rec.time("motd read", "netmiko", step, ok_text) if record else step()
+
+
+def showrun(bot, rec, router_ip, number, record=True):
+    step = lambda: bot["backup_final"].showrun(router_ip)
+    rec.time("showrun", "native", step, ok_showrun) if record else step()
+
+
+class BotDriver:
+    """
+    Drive ipa2024_final through the fake Webex room
+
+    A poller thread calls poll_once() every poll_interval seconds; send()
+    writes a command into the room and waits for the reply that contains
+    the expected text.
+    """
+
+    def __init__(self, bot, webex, poll_interval):
+        self.ipa = bot["ipa2024_final"]
+        self.webex = webex
+        self.poll_interval = poll_interval
+        self._replies = []
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        webex.on_reply.append(self._on_reply)
+
+    def _on_reply(self, message):
+        with self._cond:
+            self._replies.append(message)
+            self._cond.notify_all()
+
+    def start(self):
+        # the first poll only places the cursor on the latest message
+        self.webex.post(ROOM_ID, "benchmark started")
+        self.ipa.poll_once()
+        threading.Thread(target=self._poll_forever, daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _poll_forever(self):
+        while not self._stop.is_set():
+            try:
+                self.ipa.poll_once()
+            except Exception as e:
+                print(f"Error in poll: {e}", file=sys.__stderr__)
+            time.sleep(self.poll_interval)
+
+    def send(self, text, expect, timeout=60):
+        self.webex.post(ROOM_ID, text)
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                for reply in self._replies:
+                    if expect in reply["text"]:
+                        self._replies.remove(reply)
+                        return reply["text"]
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"No reply to {text!r}")
+                self._cond.wait(remaining)
+
+
+def bot_cycle(method):
+    """create, status, delete sent as Webex messages, timed until the reply is posted"""
+    def run(bot, rec, router_ip, number, record=True):
+        driver = bot["driver"]
+        for command in ("create", "status", "delete"):
+            step = lambda: driver.send(f"/66070077 {router_ip} {command} {number}", f"loopback {number} ")
+            rec.time(f"bot {command}", method, step, ok_text) if record else step()
+    return run
+
+
+SCENARIOS = [
+    ("restconf", loopback_cycle("restconf")),
+    ("netconf", loopback_cycle("netconf")),
+    ("gigabit-restconf", gigabit_status("restconf")),
+    ("gigabit-netconf", gigabit_status("netconf")),
+    ("gigabit-cli", gigabit_status("cli")),
+    ("motd", motd),
+    ("showrun", showrun),
+    ("bot-restconf", bot_cycle("restconf")),
+    ("bot-netconf", bot_cycle("netconf")),
+]
+
+
+def run_scenario(bot, rec, name, scenario, args, routers):
+    """Run scenario with args.concurrency workers, args.iterations times in total"""
+    workers = max(args.concurrency, 1)
+    per_worker = max(1, -(-args.iterations // workers))
+
+    if name.startswith("bot-"):
+        method = name.split("-", 1)[1]
+        bot["driver"].send(f"/66070077 {method}", f"Ok: {method.capitalize()}")
+
+    def worker(index):
+        router_ip = routers[index % len(routers)]
+        # every worker has its own loopback so workers on one router do not collide
+        number = str(1000 + index)
+        try:
+            for _ in range(args.warmup):
+                scenario(bot, rec, router_ip, number, record=False)
+        except Exception as e:
+            print(f"Warm-up of {name} failed: {e}", file=sys.__stderr__)
+        finally:
+            # the other workers and the main thread wait for this one
+            barrier.wait()
+        for _ in range(per_worker):
+            scenario(bot, rec, router_ip, number)
+
+    before = set(rec.samples)
+    barrier = threading.Barrier(workers + 1)
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(workers)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    for thread in threads:
+        thread.join()
+    # a step is busy for sum(latencies) / workers seconds of the run, which
+    # gives its throughput even when it is one of several steps of a cycle
+    for key in set(rec.samples) - before:
+        rec.set_wall(*key, sum(rec.samples[key]) / workers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("-n", "--iterations", type=int, default=30, help="iterations per scenario (all workers)")
+    parser.add_argument("-c", "--concurrency", type=int, default=1, help="workers running a scenario at once")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed iterations per worker (opens connections)")
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated device latency per request in ms")
+    parser.add_argument("--webex-latency", type=float, default=0.0, help="simulated Webex API latency in ms")
+    parser.add_argument("--poll-interval", type=float, default=0.01, help="seconds between bot polls")
+    parser.add_argument("--cache-ttl", type=float, default=0.0, help="STATUS_CACHE_TTL while measuring")
+    parser.add_argument("--routers", type=int, default=len(ROUTER_IPS), help="number of simulated routers")
+    parser.add_argument("--only", action="append", help="run only scenarios containing this text (repeatable)")
+    parser.add_argument("--json", help="save results to this file")
+    parser.add_argument("--baseline", help="compare with results saved by --json")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown against the baseline")
+    parser.add_argument("-v", "--verbose", action="store_true", help="show the output of the bot modules")
+    args = parser.parse_args()
+
+    routers = ROUTER_IPS[:args.routers]
+    workdir = tempfile.mkdtemp(prefix="ipa-bench-")
+    network = SimulatedNetwork(routers, latency=args.latency / 1000).start()
+    webex = WebexSimulator(token=TOKEN, latency=args.webex_latency / 1000)
+    webex.start()
+    setup_environment(network, webex, workdir, args.cache_ttl, max(args.concurrency, 1))
+
+    rec = benchlib.Recorder()
+    try:
+        with benchlib.quiet(not args.verbose):
+            bot = load_bot(workdir)
+            bot["driver"] = BotDriver(bot, webex, args.poll_interval)
+            bot["driver"].start()
+            for name, scenario in SCENARIOS:
+                if args.only and not any(text in name for text in args.only):
+                    continue
+                print(f"running {name}", file=sys.__stderr__)
+                run_scenario(bot, rec, name, scenario, args, routers)
+            bot["driver"].stop()
+            bot["ipa2024_final"].dispatcher.shutdown(wait=True)
+    finally:
+        webex.stop()
+        network.stop()
+
+    rows = rec.rows()
+    benchlib.print_table(rows, title=(
+        f"{len(routers)} routers, {args.concurrency} worker(s), device latency {args.latency} ms, "
+        f"Webex latency {args.webex_latency} ms"
+    ))
+    if args.json:
+        benchlib.save(rows, args.json, meta=vars(args))
+    if args.baseline:
+        regressions = benchlib.compare(rows, args.baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Per-parse cost of CLI parsing: compiling TextFSM on every call vs the registry
+
+Run from the repository root:
+    python benchmarks/bench_parsers.py [iterations]
+"""
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from textfsm import TextFSM
+import parsers
+import netmiko_final
+
+SHOW_IP_INTERFACE_BRIEF = """Interface              IP-Address      OK? Method Status                Protocol
+GigabitEthernet1       10.0.15.64      YES NVRAM  up                    up
+GigabitEthernet2       unassigned      YES NVRAM  administratively down down
+GigabitEthernet3       unassigned      YES NVRAM  down                  down
+GigabitEthernet4       unassigned      YES NVRAM  administratively down down
+Loopback66070077       172.0.77.1      YES other  up                    up
+"""
+
+SHOW_BANNER_MOTD = "Authorized access only! Managed by 66070077\n"
+
+RUNNING_CONFIG_BANNER = "banner motd ^C\nAuthorized access only!\n^C\n"
+
+
+def before_motd():
+    # what motd_read did on every call: open + compile the template
+    template_path = os.path.join(parsers.TEMPLATE_DIR, "cisco_ios_show_banner_motd.textfsm")
+    with open(template_path) as template_file:
+        return TextFSM(template_file).ParseText(SHOW_BANNER_MOTD)
+
+
+def after_motd():
+    return parsers.registry.parse_rows("cisco_ios_show_banner_motd", SHOW_BANNER_MOTD)
+
+
+def before_interfaces():
+    # send_command(..., use_textfsm=True) looks the template up in the
+    # ntc-templates index and compiles it on every call
+    from netmiko.utilities import get_structured_data_textfsm
+    return get_structured_data_textfsm(SHOW_IP_INTERFACE_BRIEF, platform="cisco_ios", command="show ip interface brief")
+
+
+def after_interfaces():
+    return parsers.registry.parse("cisco_ios_show_ip_interface_brief", SHOW_IP_INTERFACE_BRIEF)
+
+
+def before_regex():
+    for pattern in [r'banner motd\s+\^C(.*?)\^C', r'banner motd\s+@(.*?)@', r'banner motd\s+\$(.*?)\$']:
+        # re caches compiled patterns, but every call still goes through the cache lookup
+        match = re.search(pattern, RUNNING_CONFIG_BANNER, re.DOTALL)
+        if match:
+            return match.group(1)
+
+
+def after_regex():
+    for pattern in netmiko_final.MOTD_PATTERNS:
+        match = pattern.search(RUNNING_CONFIG_BANNER)
+        if match:
+            return match.group(1)
+
+
+def per_call_us(function, iterations):
+    function()  # first call pays one-off imports/compilation
+    return timeit.timeit(function, number=iterations) / iterations * 1e6
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    cases = [
+        ("show banner motd (TextFSM)", before_motd, after_motd),
+        ("show ip interface brief (TextFSM)", before_interfaces, after_interfaces),
+        ("banner regex fallback", before_regex, after_regex),
+    ]
+    assert before_motd() == after_motd()
+    print(f"{'parser':36} {'before us':>10} {'after us':>10} {'speedup':>8}")
+    for name, before, after in cases:
+        b = per_call_us(before, iterations)
+        a = per_call_us(after, iterations)
+        print(f"{name:36} {b:10.1f} {a:10.1f} {b / a:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
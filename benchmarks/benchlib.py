@@ -0,0 +1,136 @@
+import contextlib
+import json
+import math
+import os
+import threading
+import time
+from collections import defaultdict
+
+
+@contextlib.contextmanager
+def quiet(enabled=True):
+    """Hide the print() output of the bot modules while measuring"""
+    if not enabled:
+        yield
+        return
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def percentile(sorted_values, p):
+    """p-th percentile (0-100) of an already sorted list, linear interpolation"""
+    if not sorted_values:
+        return float("nan")
+    k = (len(sorted_values) - 1) * p / 100
+    low = math.floor(k)
+    high = math.ceil(k)
+    if low == high:
+        return sorted_values[int(k)]
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (k - low)
+
+
+def summarize(scenario, method, samples, errors=0, wall=None):
+    """
+    One result row from latency samples in seconds
+
+    wall is the time the operations had, used for the throughput (completed
+    operations per second); without it the sum of the samples is used, which
+    is right for sequential runs.
+    """
+    values = sorted(samples)
+    wall = wall if wall else sum(values)
+    return {
+        "scenario": scenario,
+        "method": method,
+        "count": len(values),
+        "errors": errors,
+        "p50_ms": percentile(values, 50) * 1000,
+        "p95_ms": percentile(values, 95) * 1000,
+        "p99_ms": percentile(values, 99) * 1000,
+        "mean_ms": (sum(values) / len(values) * 1000) if values else float("nan"),
+        "max_ms": (values[-1] * 1000) if values else float("nan"),
+        "throughput": len(values) / wall if wall else 0.0,
+    }
+
+
+class Recorder:
+    """Thread safe collection of latency samples per (scenario, method)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.walls = {}
+
+    def add(self, scenario, method, seconds, ok=True):
+        with self._lock:
+            self.samples[(scenario, method)].append(seconds)
+            if not ok:
+                self.errors[(scenario, method)] += 1
+
+    def time(self, scenario, method, function, ok=None):
+        """Call function(), record how long it took; ok(result) decides if it counts as an error"""
+        start = time.perf_counter()
+        try:
+            result = function()
+        except Exception:
+            self.add(scenario, method, time.perf_counter() - start, ok=False)
+            return None
+        self.add(scenario, method, time.perf_counter() - start, ok=ok(result) if ok else True)
+        return result
+
+    def set_wall(self, scenario, method, seconds):
+        with self._lock:
+            self.walls[(scenario, method)] = seconds
+
+    def rows(self):
+        with self._lock:
+            keys = list(self.samples)
+        return [
+            summarize(scenario, method, self.samples[(scenario, method)],
+                      self.errors[(scenario, method)], self.walls.get((scenario, method)))
+            for scenario, method in keys
+        ]
+
+
+def print_table(rows, title=None):
+    if title:
+        print(title)
+    header = f"{'scenario':28} {'method':9} {'n':>5} {'err':>4} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'ops/s':>8}"
+    print(header)
+    print("-" * len(header))
+    for row in rows:
+        print(
+            f"{row['scenario']:28} {row['method']:9} {row['count']:5d} {row['errors']:4d} "
+            f"{row['p50_ms']:9.1f} {row['p95_ms']:9.1f} {row['p99_ms']:9.1f} {row['max_ms']:9.1f} "
+            f"{row['throughput']:8.1f}"
+        )
+
+
+def save(rows, path, meta=None):
+    with open(path, "w") as f:
+        json.dump({"meta": meta or {}, "results": rows}, f, indent=2)
+
+
+def compare(rows, baseline_path, tolerance=0.2, floor_ms=1.0):
+    """
+    Regressions of rows against a file written by save()
+
+    A scenario regresses when its p50 or p95 is more than tolerance (20%)
+    and more than floor_ms slower than in the baseline, or when it has
+    errors the baseline did not have. Returns a list of messages.
+    """
+    with open(baseline_path) as f:
+        baseline = {(r["scenario"], r["method"]): r for r in json.load(f)["results"]}
+    regressions = []
+    for row in rows:
+        old = baseline.get((row["scenario"], row["method"]))
+        if old is None:
+            continue
+        name = f"{row['scenario']} ({row['method']})"
+        for metric in ("p50_ms", "p95_ms"):
+            if row[metric] > old[metric] * (1 + tolerance) and row[metric] - old[metric] > floor_ms:
+                regressions.append(f"{name}: {metric} {old[metric]:.1f} -> {row[metric]:.1f}")
+        if row["errors"] > old["errors"]:
+            regressions.append(f"{name}: errors {old['errors']} -> {row['errors']}")
+    return regressions
@@ -0,0 +1,181 @@
+"""
+Checks of how the bot takes in Webex messages, against the fake Webex API
+
+Each check starts from an empty cursor file, drives ipa2024_final the way
+polling or webhook mode would and fails (exit code 1) when a command is
+lost or answered twice.
+
+Run from the repository root:
+    python benchmarks/check_intake.py [-v]
+"""
+import argparse
+import importlib
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import benchlib
+from bench_e2e import ROOM_ID, TOKEN
+from simulators import ROUTER_IPS, WebexSimulator
+
+REPO_DIR = os.path.dirname(BENCH_DIR)
+
+# A bot that queues the commands of one poll behind a long job on the router,
+# then stops at once like a killed process
+STOPPED_BOT = """
+import os, time
+import ipa2024_final as ipa
+ipa.dispatcher.submit(%r, lambda: time.sleep(60), lambda result: None)
+ipa.poll_once()
+os._exit(0)
+"""
+
+
+def answers(webex, text):
+    return [reply for reply in webex.replies if text in reply["text"]]
+
+
+def wait_until(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def check_lost_webhook_event(ipa, webex):
+    """A message whose webhook event got lost is found by the fallback poll"""
+    webex.post(ROOM_ID, "check started")
+    ipa.poll_once()
+
+    first = webex.post(ROOM_ID, "/66070077 netconf")
+    second = webex.post(ROOM_ID, "/66070077 restconf")
+    # only the event of the second message arrives
+    ipa.on_webhook_message(second["id"])
+    ipa.poll_once()
+
+    assert len(answers(webex, "Ok: Netconf")) == 1, f"{first['text']!r} was not answered once"
+    assert len(answers(webex, "Ok: Restconf")) == 1, f"{second['text']!r} was not answered once"
+
+
+def check_restart_replays_queued_command(ipa, webex):
+    """A command queued when the bot stopped is run after the restart"""
+    started = webex.post(ROOM_ID, "check started")
+    ipa.cursor.polled(started)
+
+    # no method is selected, so the command is answered without a router
+    command = webex.post(ROOM_ID, f"/66070077 {ROUTER_IPS[0]} create 1")
+    subprocess.run(
+        [sys.executable, "-c", STOPPED_BOT % ROUTER_IPS[0]],
+        cwd=REPO_DIR, env=dict(os.environ, MESSAGE_CURSOR_FILE=ipa.cursor.path),
+        stdout=subprocess.DEVNULL, check=True, timeout=60,
+    )
+    assert not answers(webex, "No method specified"), "the stopped bot answered"
+
+    ipa.cursor = ipa.MessageCursor(ipa.cursor.path)
+    assert ipa.cursor.pending == [command["id"]], f"pending after the stop: {ipa.cursor.pending}"
+    ipa.unreplayed.extend(ipa.cursor.pending)
+
+    # Webex cannot be reached at the restart: the command stays pending
+    api_url, ipa.WEBEX_API_URL = ipa.WEBEX_API_URL, "http://127.0.0.1:9/v1"
+    try:
+        ipa.replay_pending()
+    finally:
+        ipa.WEBEX_API_URL = api_url
+    assert ipa.cursor.pending == [command["id"]], f"pending after a failed replay: {ipa.cursor.pending}"
+
+    # the next poll replays it
+    ipa.poll_once()
+
+    # the reply reaches Webex just before the cursor finishes the message
+    assert wait_until(lambda: not ipa.cursor.pending), f"still pending after the answer: {ipa.cursor.pending}"
+    assert len(answers(webex, "No method specified")) == 1, f"{command['text']!r} was not answered once"
+
+
+def check_other_room_ignored(ipa, webex):
+    """A webhook event for a message of another room runs nothing"""
+    webex.post(ROOM_ID, "check started")
+    ipa.poll_once()
+
+    other = webex.post("other-room", "/66070077 netconf")
+    ipa.on_webhook_message(other["id"])
+
+    assert not answers(webex, "Ok: Netconf"), "a message of another room was answered"
+    assert ipa.selected_method is None, f"method changed to {ipa.selected_method}"
+
+
+def check_long_backlog(ipa, webex):
+    """Every command of a backlog over many pages is answered once, oldest first"""
+    webex.post(ROOM_ID, "check started")
+    ipa.poll_once()
+
+    texts = ["/66070077 netconf", "/66070077 restconf"] * 60
+    for text in texts:
+        webex.post(ROOM_ID, text)
+    page_size, ipa.PAGE_SIZE = ipa.PAGE_SIZE, 7
+    try:
+        ipa.poll_once()
+    finally:
+        ipa.PAGE_SIZE = page_size
+
+    got = [reply["text"] for reply in webex.replies if reply["text"].startswith("Ok: ")]
+    expected = [f"Ok: {text.split()[1].capitalize()}" for text in texts]
+    assert got == expected, f"{len(got)} of {len(texts)} commands answered in order"
+    ipa.poll_once()
+    assert len(webex.replies) == len(texts), "a command was answered again by the next poll"
+
+
+CHECKS = [
+    check_lost_webhook_event,
+    check_other_room_ignored,
+    check_restart_replays_queued_command,
+    check_long_backlog,
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("-v", "--verbose", action="store_true", help="show the output of the bot modules")
+    args = parser.parse_args()
+
+    webex = WebexSimulator(token=TOKEN)
+    webex.start()
+    workdir = tempfile.mkdtemp(prefix="ipa-check-")
+    os.environ.update({
+        "WEBEX_API_URL": webex.url,
+        "WEBEX_ACCESS_TOKEN": TOKEN,
+        "WEBEX_ROOM_ID": ROOM_ID,
+        "MESSAGE_CURSOR_FILE": os.path.join(workdir, "cursor.json"),
+    })
+
+    failed = 0
+    try:
+        with benchlib.quiet(not args.verbose):
+            ipa = importlib.import_module("ipa2024_final")
+        for check in CHECKS:
+            # every check starts with an empty room and a new cursor
+            webex.messages.clear()
+            webex.replies.clear()
+            ipa.cursor = ipa.MessageCursor(os.path.join(workdir, f"{check.__name__}.json"))
+            ipa.selected_method = None
+            ipa.unreplayed.clear()
+            try:
+                with benchlib.quiet(not args.verbose):
+                    check(ipa, webex)
+            except AssertionError as e:
+                failed += 1
+                print(f"FAIL {check.__name__}: {e}")
+            else:
+                print(f"ok   {check.__name__}")
+    finally:
+        webex.stop()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,383 @@
+"""
+Load test of the bot loop with synthetic or recorded command streams
+
+Posts "/66070077 <ip> <command>" messages into the simulated Webex room at a
+given rate and command mix while ipa2024_final reads the room (polling, or
+webhook events) and runs the commands against the simulated routers. Each
+message is followed through the bot with its trace hooks:
+
+    user post -> received -> start -> done -> reply posted
+        intake     queueing   execution  reply-post
+
+Every rate step reports these latencies, the completion rate, the backlog
+left in the dispatcher and dropped (never answered) or duplicated (run or
+answered twice) commands. --ramp runs several rates one after another and
+reports the first one the bot cannot keep up with (saturation point).
+
+Run from the repository root:
+    python benchmarks/loadgen.py --rate 120 --duration 30
+    python benchmarks/loadgen.py --ramp 60,120,240,480 --step-duration 20 --latency 20
+    python benchmarks/loadgen.py --rate 300 --duration 20 --record stream.jsonl
+    python benchmarks/loadgen.py --replay stream.jsonl --speed 2
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import benchlib
+from bench_e2e import ROOM_ID, TOKEN, load_bot, setup_environment
+from simulators import ROUTER_IPS, SimulatedNetwork, WebexSimulator
+
+COMMANDS = {
+    "create": "/66070077 {ip} create {n}",
+    "delete": "/66070077 {ip} delete {n}",
+    "enable": "/66070077 {ip} enable {n}",
+    "disable": "/66070077 {ip} disable {n}",
+    "status": "/66070077 {ip} status {n}",
+    "gigabit_status": "/66070077 {ip} gigabit_status",
+    "motd": "/66070077 {ip} motd",
+    "showrun": "/66070077 {ip} showrun",
+    "showrun_last": "/66070077 {ip} showrun last",
+    "fleet_status": "/66070077 all status {n}",
+    "restconf": "/66070077 restconf",
+    "netconf": "/66070077 netconf",
+}
+
+DEFAULT_MIX = "status=40,gigabit_status=20,create=10,delete=10,enable=5,disable=5,motd=5,showrun=5"
+
+# loopback numbers the commands pick from, so creates and deletes meet each other
+LOOPBACKS = [str(n) for n in range(100, 110)]
+
+
+def parse_mix(text):
+    """ "status=40,create=10" -> [("status", 40.0), ("create", 10.0)] """
+    mix = []
+    for part in text.split(","):
+        name, _, weight = part.strip().partition("=")
+        if name not in COMMANDS:
+            raise SystemExit(f"Unknown command {name!r} in mix, known: {', '.join(COMMANDS)}")
+        mix.append((name, float(weight or 1)))
+    return mix
+
+
+def synthetic_stream(rate, duration, mix, routers, arrival="poisson", seed=None):
+    """
+    (offset seconds, text) pairs for rate messages per minute during duration seconds
+
+    Arrivals are a Poisson process by default, or evenly spaced with
+    arrival="uniform". Commands are drawn from mix with its weights.
+    """
+    rng = random.Random(seed)
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+    interval = 60.0 / rate
+    stream = []
+    t = 0.0
+    while True:
+        t += rng.expovariate(1 / interval) if arrival == "poisson" else interval
+        if t >= duration:
+            return stream
+        command = rng.choices(names, weights)[0]
+        text = COMMANDS[command].format(ip=rng.choice(routers), n=rng.choice(LOOPBACKS))
+        stream.append((round(t, 4), text))
+
+
+def load_stream(path):
+    """Read a stream saved with --record (one {"t": offset, "text": ...} per line)"""
+    stream = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                event = json.loads(line)
+                stream.append((float(event["t"]), event["text"]))
+    return sorted(stream)
+
+
+def save_stream(stream, path):
+    with open(path, "w") as f:
+        for t, text in stream:
+            f.write(json.dumps({"t": t, "text": text}) + "\n")
+
+
+class Tracker:
+    """Timeline of every message the load generator posted, filled by ipa2024_final.trace_hooks"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.messages = {}  # message id -> {"text", "sent", "received": [...], ...}
+
+    def _entry(self, message_id):
+        return self.messages.setdefault(message_id, {
+            "text": None, "sent": None, "received": [], "start": [], "done": [], "posted": [], "post_failed": [],
+        })
+
+    def sent(self, message_id, text, timestamp):
+        with self._lock:
+            entry = self._entry(message_id)
+            entry["text"] = text
+            entry["sent"] = timestamp
+
+    def hook(self, event, message_id, message, timestamp):
+        if message_id is None:
+            return
+        with self._lock:
+            self._entry(message_id)[event].append(timestamp)
+
+    def pending(self, message_ids):
+        with self._lock:
+            return [i for i in message_ids if not self.messages[i]["posted"] and not self.messages[i]["post_failed"]]
+
+
+class Intake:
+    """Feeds the bot like production: a poll loop, or webhook events per message"""
+
+    def __init__(self, ipa, mode, poll_interval):
+        self.ipa = ipa
+        self.mode = mode
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+
+    def start(self, webex):
+        # the first poll places the cursor on the latest message
+        webex.post(ROOM_ID, "load test started")
+        self.ipa.poll_once()
+        if self.mode == "poll":
+            threading.Thread(target=self._poll_forever, daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _poll_forever(self):
+        # same order as run_polling: wait, then poll
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.ipa.poll_once()
+            except Exception as e:
+                print(f"Error in poll: {e}", file=sys.__stderr__)
+
+    def delivered(self, message):
+        if self.mode == "webhook":
+            # the webhook server handles every event on its own thread
+            threading.Thread(target=self.ipa.on_webhook_message, args=(message["id"],), daemon=True).start()
+
+
+def run_step(bot, webex, tracker, intake, stream, drain_timeout, speed=1.0):
+    """Send stream in real time, wait for the replies and summarize the step"""
+    ipa = bot["ipa2024_final"]
+    message_ids = []
+    backlog = []
+    sending = threading.Event()
+    sending.set()
+
+    def monitor():
+        while sending.is_set():
+            backlog.append(ipa.dispatcher.pending())
+            time.sleep(0.1)
+
+    threading.Thread(target=monitor, daemon=True).start()
+    replies_before = len(webex.replies)
+    start = time.monotonic()
+    for offset, text in stream:
+        delay = start + offset / speed - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        sent = time.monotonic()
+        message = webex.post(ROOM_ID, text)
+        tracker.sent(message["id"], text, sent)
+        message_ids.append(message["id"])
+        intake.delivered(message)
+    send_end = time.monotonic()
+    backlog_at_end = ipa.dispatcher.pending()
+
+    deadline = time.monotonic() + drain_timeout
+    while tracker.pending(message_ids) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    sending.clear()
+
+    replies = webex.replies[replies_before:]
+    return summarize_step(tracker, message_ids, stream, start, send_end, backlog, backlog_at_end, replies, speed)
+
+
+def _rate(timestamps):
+    """Events per minute from the spacing of timestamps (not biased by when the first one came)"""
+    if len(timestamps) < 2:
+        return 0.0
+    span = max(timestamps) - min(timestamps)
+    return (len(timestamps) - 1) / span * 60 if span > 0 else 0.0
+
+
+def summarize_step(tracker, message_ids, stream, start, send_end, backlog, backlog_at_end, replies, speed):
+    phases = {"intake": [], "queue": [], "execution": [], "reply_post": [], "end_to_end": []}
+    per_command = {}
+    dropped = []
+    duplicated = []
+    post_failed = 0
+    replies_at = []
+    for message_id in message_ids:
+        m = tracker.messages[message_id]
+        if len(m["received"]) > 1 or len(m["posted"]) > 1:
+            duplicated.append(m["text"])
+        if m["post_failed"]:
+            post_failed += 1
+        if not m["posted"]:
+            dropped.append(m["text"])
+            continue
+        if not (m["received"] and m["start"] and m["done"]):
+            continue
+        received, started, done, posted = m["received"][0], m["start"][0], m["done"][0], m["posted"][0]
+        replies_at.append(posted)
+        phases["intake"].append(received - m["sent"])
+        phases["queue"].append(started - received)
+        phases["execution"].append(done - started)
+        phases["reply_post"].append(posted - done)
+        phases["end_to_end"].append(posted - m["sent"])
+        command = m["text"].split()[2] if len(m["text"].split()) > 2 else m["text"].split()[1]
+        per_command.setdefault(command, []).append(posted - m["sent"])
+
+    completed = len(phases["end_to_end"])
+    return {
+        "offered_per_min": _rate([t / speed for t, _ in stream]),
+        "sent": len(message_ids),
+        "completed": completed,
+        "completed_per_min": _rate(replies_at),
+        "dropped": len(dropped),
+        "duplicated": len(duplicated),
+        "post_failed": post_failed,
+        "error_replies": sum(1 for r in replies if r["text"].startswith(("Error", "Cannot"))),
+        "backlog_max": max(backlog) if backlog else 0,
+        "backlog_at_end": backlog_at_end,
+        "send_seconds": send_end - start,
+        "phases": {name: sorted(values) for name, values in phases.items()},
+        "per_command": {name: sorted(values) for name, values in per_command.items()},
+        "dropped_texts": dropped[:10],
+        "duplicated_texts": duplicated[:10],
+    }
+
+
+def saturated(step, max_queue_delay):
+    """The bot did not keep up: too few replies, dropped commands or a growing queue"""
+    queue = step["phases"]["queue"]
+    return (
+        step["completed_per_min"] < 0.9 * step["offered_per_min"]
+        or step["dropped"] > 0
+        or (queue and benchlib.percentile(queue, 95) > max_queue_delay)
+    )
+
+
+def ms(values, p):
+    return benchlib.percentile(values, p) * 1000 if values else float("nan")
+
+
+def print_step(step, label):
+    print(f"\n== {label}: offered {step['offered_per_min']:.0f}/min, completed {step['completed_per_min']:.0f}/min "
+          f"({step['completed']}/{step['sent']}), dropped {step['dropped']}, duplicated {step['duplicated']}, "
+          f"failed posts {step['post_failed']}, error replies {step['error_replies']}, "
+          f"backlog max {step['backlog_max']} / at end of sending {step['backlog_at_end']}")
+    print(f"{'phase':16} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for name, values in list(step["phases"].items()) + [(f"  {c}", v) for c, v in sorted(step["per_command"].items())]:
+        print(f"{name:16} {ms(values, 50):9.1f} {ms(values, 95):9.1f} {ms(values, 99):9.1f} {ms(values, 100):9.1f}")
+    for text in step["dropped_texts"]:
+        print(f"  dropped: {text}")
+    for text in step["duplicated_texts"]:
+        print(f"  duplicated: {text}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test of the bot loop")
+    parser.add_argument("--rate", type=float, default=120, help="messages per minute")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of load per step")
+    parser.add_argument("--ramp", help="comma separated rates (messages per minute), one step each")
+    parser.add_argument("--step-duration", type=float, help="seconds per ramp step (default --duration)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="command=weight list, commands: " + ", ".join(COMMANDS))
+    parser.add_argument("--method", default="restconf", choices=["restconf", "netconf"], help="method selected first")
+    parser.add_argument("--arrival", default="poisson", choices=["poisson", "uniform"])
+    parser.add_argument("--seed", type=int, help="random seed for a repeatable stream")
+    parser.add_argument("--replay", help="replay a stream recorded with --record instead of generating one")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed factor")
+    parser.add_argument("--record", help="save the generated stream (JSON lines) for --replay")
+    parser.add_argument("--intake", default="poll", choices=["poll", "webhook"])
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="seconds between polls (bot default 1)")
+    parser.add_argument("--workers", type=int, help="DISPATCH_WORKERS of the bot")
+    parser.add_argument("--cache-ttl", type=float, help="STATUS_CACHE_TTL of the bot")
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated device latency per request in ms")
+    parser.add_argument("--webex-latency", type=float, default=0.0, help="simulated Webex API latency in ms")
+    parser.add_argument("--routers", type=int, default=len(ROUTER_IPS), help="number of simulated routers")
+    parser.add_argument("--drain-timeout", type=float, default=120, help="seconds to wait for replies after sending")
+    parser.add_argument("--max-queue-delay", type=float, default=5.0, help="p95 queueing delay (s) that counts as saturated")
+    parser.add_argument("--json", help="save the step summaries to this file")
+    parser.add_argument("-v", "--verbose", action="store_true", help="show the output of the bot modules")
+    args = parser.parse_args()
+
+    routers = ROUTER_IPS[:args.routers]
+    mix = parse_mix(args.mix)
+    if args.replay:
+        steps = [("replay " + os.path.basename(args.replay), load_stream(args.replay))]
+    else:
+        rates = [float(r) for r in args.ramp.split(",")] if args.ramp else [args.rate]
+        duration = args.step_duration or args.duration
+        steps = []
+        for i, rate in enumerate(rates):
+            seed = None if args.seed is None else args.seed + i
+            steps.append((f"{rate:g}/min", synthetic_stream(rate, duration, mix, routers, args.arrival, seed)))
+        if args.record:
+            save_stream([event for _, stream in steps for event in stream], args.record)
+
+    workdir = tempfile.mkdtemp(prefix="ipa-load-")
+    network = SimulatedNetwork(routers, latency=args.latency / 1000).start()
+    webex = WebexSimulator(token=TOKEN, latency=args.webex_latency / 1000)
+    webex.start()
+    setup_environment(network, webex, workdir, args.cache_ttl, args.workers)
+
+    tracker = Tracker()
+    results = []
+    try:
+        with benchlib.quiet(not args.verbose):
+            bot = load_bot(workdir)
+            ipa = bot["ipa2024_final"]
+            ipa.trace_hooks.append(tracker.hook)
+            intake = Intake(ipa, args.intake, args.poll_interval)
+            intake.start(webex)
+            # select the method like a user would before sending commands
+            run_step(bot, webex, tracker, intake, [(0.0, COMMANDS[args.method])], args.drain_timeout)
+            for label, stream in steps:
+                print(f"running {label}: {len(stream)} messages", file=sys.__stderr__)
+                step = run_step(bot, webex, tracker, intake, stream, args.drain_timeout, args.speed)
+                step["label"] = label
+                results.append(step)
+            intake.stop()
+    finally:
+        webex.stop()
+        network.stop()
+
+    print(f"{len(routers)} routers, intake {args.intake}, device latency {args.latency} ms, "
+          f"Webex latency {args.webex_latency} ms, mix {args.mix}")
+    saturation = None
+    for step in results:
+        print_step(step, step["label"])
+        if saturation is None and saturated(step, args.max_queue_delay):
+            saturation = step
+    print()
+    if saturation is None:
+        print("No saturation: the bot kept up with every step")
+    else:
+        healthy = results[:results.index(saturation)]
+        last_ok = f", last healthy step {healthy[-1]['label']}" if healthy else ""
+        print(f"Saturation at {saturation['label']} (offered {saturation['offered_per_min']:.0f}/min, "
+              f"completed {saturation['completed_per_min']:.0f}/min){last_ok}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"meta": vars(args), "steps": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
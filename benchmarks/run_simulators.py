@@ -0,0 +1,54 @@
+"""
+Run the router and Webex simulators until Ctrl+C, for trying the bot by hand
+
+    python benchmarks/run_simulators.py [--latency 5]
+
+Copy the printed exports into the shell that starts ipa2024_final.py, then
+type commands (e.g. "/66070077 10.0.15.61 gigabit_status") here; they are
+posted into the simulated room and the bot's replies are printed.
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from simulators import SimulatedNetwork, WebexSimulator
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the router and Webex simulators")
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated device latency per request in ms")
+    parser.add_argument("--webex-port", type=int, default=8900)
+    parser.add_argument("--token", default="sim-token")
+    parser.add_argument("--room", default="sim-room")
+    args = parser.parse_args()
+
+    network = SimulatedNetwork(latency=args.latency / 1000).start()
+    webex = WebexSimulator(port=args.webex_port, token=args.token)
+    webex.start()
+    webex.post(args.room, "simulated room created")
+
+    env = dict(network.env(), WEBEX_API_URL=webex.url, WEBEX_ACCESS_TOKEN=args.token, WEBEX_ROOM_ID=args.room)
+    for name, value in env.items():
+        print(f"export {name}='{value}'")
+    print("\nType commands for the room, Ctrl+D or Ctrl+C to stop")
+
+    def show(message):
+        print(f"reply: {message['text']}")
+
+    webex.on_reply.append(show)
+    try:
+        # commands typed here are posted into the room as a user
+        for line in sys.stdin:
+            if line.strip():
+                webex.post(args.room, line.strip())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        webex.stop()
+        network.stop()
+
+
+if __name__ == "__main__":
+    main()
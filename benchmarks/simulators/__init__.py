@@ -0,0 +1,11 @@
+"""
+Local stand-ins for the CSR1kv routers and the Webex API
+
+    network = SimulatedNetwork(latency=0.005).start()
+    webex = WebexSimulator(token="sim-token")
+    webex.start()
+    os.environ.update(network.env())   # before importing the bot modules
+"""
+from .device import SimulatedRouter
+from .network import ROUTER_IPS, SimulatedNetwork, simulator_address
+from .webex import WebexSimulator
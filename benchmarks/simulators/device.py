@@ -0,0 +1,163 @@
+import copy
+import threading
+import time
+
+
+class SimulatedRouter:
+    """
+    In-memory state of one CSR1kv, shared by its RESTCONF, NETCONF and CLI simulators
+
+    Interfaces are kept as ietf-interfaces style dicts:
+    {"name", "description", "type", "enabled", "ip", "netmask", "link"}
+    where link is the physical state (oper-status is up when the interface is
+    enabled and the link is up). latency seconds are added to every request
+    to stand in for the time a real device needs.
+    """
+
+    def __init__(self, router_ip, hostname, latency=0.0, config_lines=400):
+        self.router_ip = router_ip
+        self.hostname = hostname
+        self.latency = latency
+        self.config_lines = config_lines
+        self.motd = "Authorized users only! Managed by 66070077"
+        self.lock = threading.RLock()
+        self.running = {}
+        self.candidate = None  # None: candidate is the same as running
+        self.locks = {}        # datastore -> owner session id
+        self.pending_commit = None  # confirmed commit waiting for its confirmation
+        last = int(router_ip.split(".")[-1])
+        gigabit = [
+            ("GigabitEthernet1", f"10.0.15.{last}", True, True),
+            ("GigabitEthernet2", None, True, True),
+            ("GigabitEthernet3", None, True, False),
+            ("GigabitEthernet4", None, False, False),
+        ]
+        for name, ip, enabled, link in gigabit:
+            self.running[name] = {
+                "name": name,
+                "description": "",
+                "type": "iana-if-type:ethernetCsmacd",
+                "enabled": enabled,
+                "ip": ip,
+                "netmask": "255.255.255.0" if ip else None,
+                "link": link,
+            }
+
+    def delay(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    # datastore edits, all of them work on a dict of interfaces
+
+    @staticmethod
+    def new_interface(name, fields):
+        interface = {
+            "name": name,
+            "description": "",
+            "type": "iana-if-type:softwareLoopback",
+            "enabled": True,
+            "ip": None,
+            "netmask": None,
+            # loopbacks and newly created interfaces have no physical link to lose
+            "link": True,
+        }
+        interface.update(fields)
+        return interface
+
+    @staticmethod
+    def merge(interfaces, name, fields):
+        if name in interfaces:
+            interfaces[name].update(fields)
+        else:
+            interfaces[name] = SimulatedRouter.new_interface(name, fields)
+
+    def datastore(self, target):
+        """Interfaces of the running or candidate datastore (call with lock held)"""
+        if target == "candidate":
+            if self.candidate is None:
+                self.candidate = copy.deepcopy(self.running)
+            return self.candidate
+        return self.running
+
+    def commit(self):
+        with self.lock:
+            if self.candidate is not None:
+                self.running = self.candidate
+                self.candidate = None
+
+    def discard(self):
+        with self.lock:
+            self.candidate = None
+
+    # operational data
+
+    @staticmethod
+    def state(interface):
+        admin = "up" if interface["enabled"] else "down"
+        oper = "up" if interface["enabled"] and interface["link"] else "down"
+        return {"name": interface["name"], "admin-status": admin, "oper-status": oper}
+
+    def states(self, name=None):
+        with self.lock:
+            interfaces = list(self.running.values())
+        return [self.state(i) for i in interfaces if name is None or i["name"] == name]
+
+    def interface_brief(self):
+        """Output of "show ip interface brief" """
+        lines = ["Interface              IP-Address      OK? Method Status                Protocol"]
+        with self.lock:
+            interfaces = list(self.running.values())
+        for interface in interfaces:
+            state = self.state(interface)
+            status = "administratively down" if state["admin-status"] == "down" else state["oper-status"]
+            ip = interface["ip"] or "unassigned"
+            method = "NVRAM" if interface["ip"] else "unset"
+            lines.append(f"{interface['name']:<23}{ip:<16}YES {method:<6} {status:<22}{state['oper-status']}")
+        return "\n".join(lines)
+
+    def running_config(self):
+        """Output of "show running-config", padded to about config_lines lines"""
+        lines = [
+            "Building configuration...",
+            "",
+            "Current configuration : 0 bytes",
+            "!",
+            "version 17.9",
+            "service timestamps debug datetime msec",
+            "service timestamps log datetime msec",
+            "platform qfp utilization monitor load 80",
+            "platform punt-keepalive disable-kernel-core",
+            "platform console virtual",
+            "!",
+            f"hostname {self.hostname}",
+            "!",
+            "boot-start-marker",
+            "boot-end-marker",
+            "!",
+        ]
+        with self.lock:
+            interfaces = [dict(i) for i in self.running.values()]
+            motd = self.motd
+        for interface in interfaces:
+            lines.append(f"interface {interface['name']}")
+            if interface["description"]:
+                lines.append(f" description {interface['description']}")
+            if interface["ip"]:
+                lines.append(f" ip address {interface['ip']} {interface['netmask']}")
+            else:
+                lines.append(" no ip address")
+            if not interface["enabled"]:
+                lines.append(" shutdown")
+            lines.append("!")
+        # access lists stand in for the rest of a real configuration
+        number = 0
+        while len(lines) < self.config_lines - 8:
+            number += 1
+            lines.append(f"access-list 100 permit tcp any host 192.0.2.{number % 250 + 1} eq {1024 + number}")
+        lines.append("!")
+        if motd:
+            lines.append("banner motd ^C")
+            lines.extend(motd.split("\n"))
+            lines.append("^C")
+        lines.extend(["!", "line vty 0 4", " login local", " transport input ssh", "!", "end"])
+        return "\n".join(lines)
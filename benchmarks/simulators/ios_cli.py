@@ -0,0 +1,111 @@
+from .sshserver import SSHSimulator
+
+
+class CLISession:
+    """
+    Line based IOS exec shell on an SSH channel
+
+    Every line is echoed back followed by the command output and the prompt,
+    which is what Netmiko expects from a real device.
+    """
+
+    def __init__(self, router, channel):
+        self.router = router
+        self.channel = channel
+
+    @property
+    def prompt(self):
+        return f"{self.router.hostname}#"
+
+    def write(self, text):
+        self.channel.sendall(text.replace("\n", "\r\n").encode())
+
+    def run(self):
+        self.write(f"\n{self.prompt}")
+        buffer = ""
+        last = ""
+        try:
+            while True:
+                data = self.channel.recv(4096)
+                if not data:
+                    return
+                for char in data.decode(errors="replace"):
+                    if char == "\n" and last == "\r":
+                        # second half of a \r\n line ending
+                        last = char
+                        continue
+                    last = char
+                    if char in "\r\n":
+                        if not self.execute(buffer):
+                            return
+                        buffer = ""
+                    else:
+                        buffer += char
+        finally:
+            self.channel.close()
+
+    def execute(self, line):
+        """Run one command line, returns False when the session should end"""
+        command = " ".join(line.split())
+        if command in ("exit", "logout", "quit"):
+            self.write(line + "\n")
+            return False
+        output = self.output(command)
+        self.write(line + "\n" + (output + "\n" if output else "") + self.prompt)
+        return True
+
+    def output(self, command):
+        router = self.router
+        if not command or command.startswith("terminal "):
+            return ""
+        router.delay()
+        if command in ("show ip interface brief", "sh ip int br"):
+            return router.interface_brief()
+        if command == "show banner motd":
+            return router.motd or ""
+        if command.startswith("show running-config"):
+            config = router.running_config()
+            _, pipe, rest = command.partition("|")
+            if not pipe:
+                return config
+            action, _, pattern = rest.strip().partition(" ")
+            if action == "include":
+                return "\n".join(line for line in config.split("\n") if pattern in line)
+            if action == "section":
+                return self._section(config, pattern)
+        if command.startswith("show version"):
+            return f"Cisco IOS XE Software, Version 17.09.01a\n{router.hostname} uptime is 1 hour"
+        return "                ^\n% Invalid input detected at '^' marker.\n"
+
+    @staticmethod
+    def _section(config, pattern):
+        """Lines of "| section <pattern>": matching lines and the lines that belong to them"""
+        out = []
+        capture = False
+        delimiter = False
+        for line in config.split("\n"):
+            if delimiter:
+                out.append(line)
+                delimiter = line.strip() != "^C"
+                continue
+            if pattern in line and not line.startswith(" "):
+                out.append(line)
+                capture = True
+                # a banner runs until its closing delimiter
+                delimiter = line.startswith("banner ") and line.count("^C") == 1
+            elif capture and line.startswith(" "):
+                out.append(line)
+            else:
+                capture = False
+        return "\n".join(out)
+
+
+class CLISimulator(SSHSimulator):
+    """IOS-like SSH CLI for one SimulatedRouter (show commands used by the bot)"""
+
+    def __init__(self, router, host, port, username="admin", password="cisco"):
+        self.router = router
+        super().__init__(host, port, self._session, subsystem=None, username=username, password=password)
+
+    def _session(self, channel):
+        CLISession(self.router, channel).run()
@@ -0,0 +1,305 @@
+import copy
+import itertools
+from xml.sax.saxutils import escape
+from lxml import etree
+from .sshserver import SSHSimulator
+
+BASE_NS = "urn:ietf:params:xml:ns:netconf:base:1.0"
+IF_NS = "urn:ietf:params:xml:ns:yang:ietf-interfaces"
+IP_NS = "urn:ietf:params:xml:ns:yang:ietf-ip"
+EOM = b"]]>]]>"
+
+CAPABILITIES = [
+    "urn:ietf:params:netconf:base:1.0",
+    "urn:ietf:params:netconf:capability:candidate:1.0",
+    "urn:ietf:params:netconf:capability:validate:1.0",
+    "urn:ietf:params:netconf:capability:confirmed-commit:1.1",
+    "urn:ietf:params:xml:ns:yang:ietf-interfaces?module=ietf-interfaces&revision=2014-05-08",
+]
+
+_session_ids = itertools.count(1)
+
+
+class RPCFailure(Exception):
+    def __init__(self, tag, message):
+        super().__init__(message)
+        self.tag = tag
+        self.message = message
+
+
+def _local(element):
+    return etree.QName(element).localname
+
+
+def _child(element, name):
+    if element is None:
+        return None
+    for child in element:
+        if isinstance(child.tag, str) and _local(child) == name:
+            return child
+    return None
+
+
+def _text(element, name):
+    child = _child(element, name)
+    return child.text.strip() if child is not None and child.text else None
+
+
+def _hello(session_id):
+    capabilities = "".join(f"<capability>{c}</capability>" for c in CAPABILITIES).replace("&", "&amp;")
+    return (
+        f'<?xml version="1.0" encoding="UTF-8"?><hello xmlns="{BASE_NS}">'
+        f"<capabilities>{capabilities}</capabilities><session-id>{session_id}</session-id></hello>"
+    ).encode()
+
+
+def _state_xml(states):
+    interfaces = "".join(
+        f"<interface><name>{s['name']}</name><admin-status>{s['admin-status']}</admin-status>"
+        f"<oper-status>{s['oper-status']}</oper-status></interface>"
+        for s in states
+    )
+    return f'<interfaces-state xmlns="{IF_NS}">{interfaces}</interfaces-state>'
+
+
+def _config_xml(interfaces):
+    out = []
+    for i in interfaces:
+        ipv4 = ""
+        if i["ip"]:
+            ipv4 = (f'<ipv4 xmlns="{IP_NS}"><address><ip>{i["ip"]}</ip>'
+                    f'<netmask>{i["netmask"]}</netmask></address></ipv4>')
+        out.append(
+            f"<interface><name>{i['name']}</name><description>{escape(i['description'])}</description>"
+            f"<type>{i['type']}</type><enabled>{'true' if i['enabled'] else 'false'}</enabled>{ipv4}</interface>"
+        )
+    return f'<interfaces xmlns="{IF_NS}">{"".join(out)}</interfaces>'
+
+
+class NetconfSession:
+    """One NETCONF session over an SSH channel, base:1.0 (]]>]]>) framing"""
+
+    def __init__(self, router, channel):
+        self.router = router
+        self.channel = channel
+        self.session_id = next(_session_ids)
+        self.buffer = b""
+
+    def send(self, data):
+        self.channel.sendall(data + EOM)
+
+    def receive(self):
+        while EOM not in self.buffer:
+            chunk = self.channel.recv(65536)
+            if not chunk:
+                return None
+            self.buffer += chunk
+        message, _, self.buffer = self.buffer.partition(EOM)
+        return message
+
+    def run(self):
+        self.send(_hello(self.session_id))
+        if self.receive() is None:  # client <hello>
+            return
+        try:
+            while True:
+                message = self.receive()
+                if message is None:
+                    return
+                rpc = etree.fromstring(message.strip())
+                reply, close = self.handle(rpc)
+                self.send(reply.encode())
+                if close:
+                    return
+        finally:
+            self._release_locks()
+            self.channel.close()
+
+    def _release_locks(self):
+        with self.router.lock:
+            for target in [t for t, owner in self.router.locks.items() if owner == self.session_id]:
+                del self.router.locks[target]
+                if target == "candidate":
+                    self.router.candidate = None
+
+    def handle(self, rpc):
+        message_id = rpc.get("message-id", "")
+        operation = next((c for c in rpc if isinstance(c.tag, str)), None)
+        name = _local(operation) if operation is not None else ""
+        self.router.delay()
+        try:
+            handler = getattr(self, "rpc_" + name.replace("-", "_"), None)
+            if handler is None:
+                raise RPCFailure("operation-not-supported", f"{name} is not supported")
+            body = handler(operation)
+        except RPCFailure as e:
+            body = (f"<rpc-error><error-type>application</error-type><error-tag>{e.tag}</error-tag>"
+                    f"<error-severity>error</error-severity><error-message>{e.message}</error-message></rpc-error>")
+        return f'<rpc-reply xmlns="{BASE_NS}" message-id="{message_id}">{body}</rpc-reply>', name == "close-session"
+
+    def _target(self, operation, element="target"):
+        target = _child(operation, element)
+        if target is None or len(target) == 0:
+            raise RPCFailure("missing-element", f"{element} is missing")
+        return _local(target[0])
+
+    def _check_lock(self, target):
+        owner = self.router.locks.get(target)
+        if owner is not None and owner != self.session_id:
+            raise RPCFailure("in-use", f"{target} is locked by session {owner}")
+
+    def rpc_get(self, operation):
+        # a <name> in the subtree filter selects one interface
+        subtree = _child(operation, "filter")
+        name = _text(_child(_child(subtree, "interfaces-state"), "interface"), "name")
+        return f"<data>{_state_xml(self.router.states(name))}</data>"
+
+    def rpc_get_config(self, operation):
+        source = self._target(operation, "source")
+        with self.router.lock:
+            interfaces = [dict(i) for i in self.router.datastore(source).values()]
+        return f"<data>{_config_xml(interfaces)}</data>"
+
+    def rpc_edit_config(self, operation):
+        target = self._target(operation)
+        config = _child(operation, "config")
+        if config is None:
+            raise RPCFailure("missing-element", "config is missing")
+        router = self.router
+        with router.lock:
+            self._check_lock(target)
+            # the edit applies completely or not at all
+            interfaces = copy.deepcopy(router.datastore(target))
+            for container in config:
+                if not isinstance(container.tag, str) or _local(container) != "interfaces":
+                    continue
+                for interface in container:
+                    if not isinstance(interface.tag, str) or _local(interface) != "interface":
+                        continue
+                    self._edit_interface(interfaces, interface)
+            if target == "candidate":
+                router.candidate = interfaces
+            else:
+                router.running = interfaces
+        return "<ok/>"
+
+    def _edit_interface(self, interfaces, interface):
+        name = _text(interface, "name")
+        if not name:
+            raise RPCFailure("missing-element", "interface name is missing")
+        edit = interface.get("operation") or interface.get(f"{{{BASE_NS}}}operation") or "merge"
+        if edit in ("delete", "remove"):
+            if name not in interfaces:
+                if edit == "delete":
+                    raise RPCFailure("data-missing", f"interface {name} does not exist")
+                return
+            del interfaces[name]
+            return
+        if edit == "create" and name in interfaces:
+            raise RPCFailure("data-exists", f"interface {name} already exists")
+        fields = {}
+        description = _text(interface, "description")
+        if description is not None:
+            fields["description"] = description
+        interface_type = _text(interface, "type")
+        if interface_type is not None:
+            fields["type"] = interface_type.replace("ianaift:", "iana-if-type:")
+        enabled = _text(interface, "enabled")
+        if enabled is not None:
+            fields["enabled"] = enabled == "true"
+        address = _child(_child(interface, "ipv4"), "address")
+        if address is not None:
+            fields["ip"] = _text(address, "ip")
+            fields["netmask"] = _text(address, "netmask")
+        if edit == "replace":
+            interfaces[name] = self.router.new_interface(name, fields)
+        else:
+            self.router.merge(interfaces, name, fields)
+
+    def rpc_lock(self, operation):
+        target = self._target(operation)
+        with self.router.lock:
+            self._check_lock(target)
+            if target == "candidate" and self.router.candidate is not None:
+                raise RPCFailure("lock-denied", "candidate has uncommitted changes")
+            self.router.locks[target] = self.session_id
+        return "<ok/>"
+
+    def rpc_unlock(self, operation):
+        target = self._target(operation)
+        with self.router.lock:
+            if self.router.locks.get(target) != self.session_id:
+                raise RPCFailure("operation-failed", f"{target} is not locked by this session")
+            del self.router.locks[target]
+        return "<ok/>"
+
+    def rpc_validate(self, operation):
+        return "<ok/>"
+
+    def rpc_commit(self, operation):
+        confirmed = _child(operation, "confirmed") is not None
+        router = self.router
+        with router.lock:
+            self._check_lock("running")
+            pending = router.pending_commit
+            if pending is not None:
+                self._check_confirming(pending, _text(operation, "persist-id"))
+            elif _text(operation, "persist-id") is not None:
+                raise RPCFailure("invalid-value", "no confirmed commit with this persist-id")
+            rollback = pending["rollback"] if pending else copy.deepcopy(router.running)
+            router.commit()
+            if confirmed:
+                router.pending_commit = {
+                    "persist": _text(operation, "persist"),
+                    "session": self.session_id,
+                    "rollback": rollback,
+                }
+            else:
+                router.pending_commit = None
+        return "<ok/>"
+
+    def rpc_cancel_commit(self, operation):
+        router = self.router
+        with router.lock:
+            pending = router.pending_commit
+            if pending is None:
+                raise RPCFailure("operation-failed", "no confirmed commit in progress")
+            self._check_confirming(pending, _text(operation, "persist-id"))
+            router.running = pending["rollback"]
+            router.pending_commit = None
+        return "<ok/>"
+
+    def _check_confirming(self, pending, persist_id):
+        # RFC 6241 8.4: with <persist> only its id may confirm or cancel,
+        # without it only the session that issued the confirmed commit
+        if pending["persist"] is not None:
+            if persist_id != pending["persist"]:
+                raise RPCFailure("invalid-value", "persist-id does not match the confirmed commit")
+        elif pending["session"] != self.session_id:
+            raise RPCFailure("operation-failed", "confirmed commit was issued by another session")
+
+    def rpc_discard_changes(self, operation):
+        self.router.discard()
+        return "<ok/>"
+
+    def rpc_close_session(self, operation):
+        return "<ok/>"
+
+
+class NetconfSimulator(SSHSimulator):
+    """
+    NETCONF over SSH for one SimulatedRouter
+
+    Advertises base:1.0, :candidate, :validate and :confirmed-commit:1.1,
+    and implements get (with an interfaces-state subtree filter), get-config,
+    edit-config on running or candidate, lock/unlock, validate, commit
+    (also confirmed, without the rollback timer), cancel-commit,
+    discard-changes and close-session for ietf-interfaces.
+    """
+
+    def __init__(self, router, host, port, username="admin", password="cisco"):
+        self.router = router
+        super().__init__(host, port, self._session, subsystem="netconf", username=username, password=password)
+
+    def _session(self, channel):
+        NetconfSession(self.router, channel).run()
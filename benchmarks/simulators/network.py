@@ -0,0 +1,74 @@
+import shutil
+import tempfile
+from .device import SimulatedRouter
+from .ios_cli import CLISimulator
+from .netconf import NetconfSimulator
+from .restconf import RestconfSimulator
+from .tls import self_signed_cert, server_context
+
+ROUTER_IPS = [f"10.0.15.{i}" for i in range(61, 66)]
+
+
+def simulator_address(router_ip):
+    """Loopback address a router is simulated on: 10.0.15.61 -> 127.0.15.61"""
+    return "127." + router_ip.split(".", 1)[1]
+
+
+class SimulatedNetwork:
+    """
+    RESTCONF, NETCONF and CLI simulators for a set of routers
+
+    Every router listens on its own loopback address (see simulator_address)
+    so the three services can use the same ports on all routers, like real
+    devices. env() returns the settings that point the bot at the simulators.
+    """
+
+    def __init__(self, router_ips=ROUTER_IPS, latency=0.0, restconf_port=8443, netconf_port=8830,
+                 ssh_port=8022, config_lines=400):
+        self.restconf_port = restconf_port
+        self.netconf_port = netconf_port
+        self.ssh_port = ssh_port
+        self.routers = {
+            router_ip: SimulatedRouter(router_ip, f"R{router_ip.split('.')[-1]}", latency, config_lines)
+            for router_ip in router_ips
+        }
+        self._servers = []
+        self._tmpdir = None
+
+    @property
+    def address_map(self):
+        return {router_ip: simulator_address(router_ip) for router_ip in self.routers}
+
+    def env(self):
+        return {
+            "DEVICE_ADDRESS_MAP": ",".join(f"{ip}={address}" for ip, address in self.address_map.items()),
+            "RESTCONF_PORT": str(self.restconf_port),
+            "NETCONF_PORT": str(self.netconf_port),
+            "NETMIKO_PORT": str(self.ssh_port),
+        }
+
+    def set_latency(self, latency):
+        for router in self.routers.values():
+            router.latency = latency
+
+    def start(self):
+        self._tmpdir = tempfile.mkdtemp(prefix="ipa-sim-")
+        context = server_context(*self_signed_cert(self._tmpdir))
+        for router_ip, router in self.routers.items():
+            address = simulator_address(router_ip)
+            self._servers.extend([
+                RestconfSimulator(router, address, self.restconf_port, context),
+                NetconfSimulator(router, address, self.netconf_port),
+                CLISimulator(router, address, self.ssh_port),
+            ])
+        for server in self._servers:
+            server.start()
+        return self
+
+    def stop(self):
+        for server in self._servers:
+            server.stop()
+        self._servers = []
+        if self._tmpdir:
+            shutil.rmtree(self._tmpdir, ignore_errors=True)
+            self._tmpdir = None
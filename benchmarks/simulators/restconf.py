@@ -0,0 +1,267 @@
+import base64
+import copy
+import json
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+DATA = "/restconf/data"
+INTERFACES = DATA + "/ietf-interfaces:interfaces"
+INTERFACES_STATE = DATA + "/ietf-interfaces:interfaces-state"
+
+
+def to_yang(interface):
+    """Simulator interface dict -> ietf-interfaces:interface JSON"""
+    value = {
+        "name": interface["name"],
+        "description": interface["description"],
+        "type": interface["type"],
+        "enabled": interface["enabled"],
+    }
+    if interface["ip"]:
+        value["ietf-ip:ipv4"] = {"address": [{"ip": interface["ip"], "netmask": interface["netmask"]}]}
+    return value
+
+
+def from_yang(value):
+    """ietf-interfaces:interface JSON -> fields for SimulatedRouter.merge"""
+    fields = {}
+    for leaf in ("description", "type", "enabled"):
+        if leaf in value:
+            fields[leaf] = value[leaf]
+    addresses = value.get("ietf-ip:ipv4", {}).get("address", [])
+    if addresses:
+        fields["ip"] = addresses[0].get("ip")
+        fields["netmask"] = addresses[0].get("netmask")
+    return fields
+
+
+def _error(tag, message):
+    return {"ietf-restconf:errors": {"error": [
+        {"error-type": "application", "error-tag": tag, "error-message": message}
+    ]}}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the IOS-XE web server
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def router(self):
+        return self.server.router
+
+    def _reply(self, status, body=None, content_type="application/yang-data+json"):
+        data = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        if data:
+            self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        data = self.rfile.read(length) if length else b""
+        return json.loads(data) if data else {}
+
+    def _authorized(self):
+        expected = "Basic " + base64.b64encode(f"{self.server.username}:{self.server.password}".encode()).decode()
+        if self.headers.get("Authorization") == expected:
+            return True
+        self._reply(401, _error("access-denied", "authentication failed"))
+        return False
+
+    def _route(self):
+        """(collection, interface name or None) of the request path"""
+        path = unquote(urlsplit(self.path).path).rstrip("/")
+        for collection in (INTERFACES, INTERFACES_STATE):
+            if path == collection:
+                return collection, None
+            if path.startswith(collection + "/interface="):
+                return collection, path[len(collection) + len("/interface="):]
+        return None, None
+
+    def _handle(self, method):
+        if not self._authorized():
+            return
+        self.router.delay()
+        collection, name = self._route()
+        if collection is None:
+            self._reply(404, _error("invalid-value", "unknown resource"))
+            return
+        try:
+            getattr(self, f"_{method}")(collection, name)
+        except (ValueError, KeyError) as e:
+            self._reply(400, _error("malformed-message", str(e)))
+
+    def do_GET(self):
+        self._handle("get")
+
+    def do_POST(self):
+        self._handle("post")
+
+    def do_PATCH(self):
+        self._handle("patch")
+
+    def do_PUT(self):
+        self._handle("put")
+
+    def do_DELETE(self):
+        self._handle("delete")
+
+    def _get(self, collection, name):
+        router = self.router
+        if collection == INTERFACES_STATE:
+            states = router.states(name)
+            if name is None:
+                self._reply(200, {"ietf-interfaces:interfaces-state": {"interface": states}})
+            elif states:
+                self._reply(200, {"ietf-interfaces:interface": states[0]})
+            else:
+                self._reply(404, _error("invalid-value", "uri keypath not found"))
+            return
+        with router.lock:
+            interfaces = [to_yang(i) for i in router.running.values() if name is None or i["name"] == name]
+        if name is None:
+            self._reply(200, {"ietf-interfaces:interfaces": {"interface": interfaces}})
+        elif interfaces:
+            self._reply(200, {"ietf-interfaces:interface": interfaces[0]})
+        else:
+            self._reply(404, _error("invalid-value", "uri keypath not found"))
+
+    def _post(self, collection, name):
+        if collection != INTERFACES or name is not None:
+            self._reply(405, _error("operation-not-supported", "POST not supported here"))
+            return
+        value = self._body()["ietf-interfaces:interface"]
+        router = self.router
+        with router.lock:
+            if value["name"] in router.running:
+                self._reply(409, _error("data-exists", "object already exists"))
+                return
+            router.merge(router.running, value["name"], from_yang(value))
+        self._reply(201)
+
+    def _put(self, collection, name):
+        if collection != INTERFACES or name is None:
+            self._reply(405, _error("operation-not-supported", "PUT not supported here"))
+            return
+        value = self._body()["ietf-interfaces:interface"]
+        router = self.router
+        with router.lock:
+            existed = name in router.running
+            router.running[name] = router.new_interface(name, from_yang(value))
+        self._reply(204 if existed else 201)
+
+    def _patch(self, collection, name):
+        if collection != INTERFACES:
+            self._reply(405, _error("operation-not-supported", "PATCH not supported here"))
+            return
+        if name is None:
+            if self.headers.get("Content-Type", "").startswith("application/yang-patch"):
+                self._yang_patch(self._body())
+            else:
+                self._reply(405, _error("operation-not-supported", "plain PATCH needs an interface"))
+            return
+        value = self._body()["ietf-interfaces:interface"]
+        router = self.router
+        with router.lock:
+            if name not in router.running:
+                self._reply(404, _error("invalid-value", "uri keypath not found"))
+                return
+            router.merge(router.running, name, from_yang(value))
+        self._reply(204)
+
+    def _delete(self, collection, name):
+        if collection != INTERFACES or name is None:
+            self._reply(405, _error("operation-not-supported", "DELETE not supported here"))
+            return
+        router = self.router
+        with router.lock:
+            if name not in router.running:
+                self._reply(404, _error("invalid-value", "uri keypath not found"))
+                return
+            del router.running[name]
+        self._reply(204)
+
+    def _yang_patch(self, body):
+        """RFC 8072 YANG-Patch on the interfaces list, applied all-or-nothing"""
+        patch = body["ietf-yang-patch:yang-patch"]
+        router = self.router
+        with router.lock:
+            interfaces = copy.deepcopy(router.running)
+            for edit in patch.get("edit", []):
+                operation = edit["operation"]
+                name = unquote(edit["target"]).split("/interface=", 1)[-1]
+                values = edit.get("value", {}).get("ietf-interfaces:interface", [{}])
+                error = None
+                if operation == "create" and name in interfaces:
+                    error = ("data-exists", "object already exists")
+                elif operation == "delete" and name not in interfaces:
+                    error = ("data-missing", "object does not exist")
+                elif operation in ("delete", "remove"):
+                    interfaces.pop(name, None)
+                elif operation == "replace":
+                    interfaces[name] = router.new_interface(name, from_yang(values[0]))
+                elif operation in ("create", "merge"):
+                    router.merge(interfaces, name, from_yang(values[0]))
+                else:
+                    error = ("operation-not-supported", f"operation {operation} not supported")
+                if error is not None:
+                    tag, message = error
+                    self._reply(409, {"ietf-yang-patch:yang-patch-status": {
+                        "patch-id": patch.get("patch-id"),
+                        "edit-status": {"edit": [{
+                            "edit-id": edit.get("edit-id"),
+                            "errors": {"error": [
+                                {"error-type": "application", "error-tag": tag, "error-message": message}
+                            ]},
+                        }]},
+                    }}, content_type="application/yang-data+json")
+                    return
+            router.running = interfaces
+        self._reply(204)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def finish_request(self, request, client_address):
+        # headers and body are separate writes, do not let Nagle delay the body
+        request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        # TLS handshake in the connection thread, not in the accept loop
+        request = self.ssl_context.wrap_socket(request, server_side=True)
+        super().finish_request(request, client_address)
+
+
+class RestconfSimulator:
+    """
+    RESTCONF over HTTPS for one SimulatedRouter
+
+    Serves the ietf-interfaces paths used by restconf_final: POST on the
+    interfaces list (409 when the interface exists), PATCH/PUT/DELETE/GET on
+    interface=<name>, GET on interfaces-state and YANG-Patch on the list.
+    """
+
+    def __init__(self, router, host, port, ssl_context, username="admin", password="cisco"):
+        self.server = _Server((host, port), _Handler)
+        self.server.router = router
+        self.server.ssl_context = ssl_context
+        self.server.username = username
+        self.server.password = password
+        self._thread = None
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
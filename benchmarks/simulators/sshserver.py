@@ -0,0 +1,119 @@
+import socket
+import threading
+import paramiko
+
+_host_key = None
+_host_key_lock = threading.Lock()
+
+
+def host_key():
+    """One RSA host key shared by every simulator (generating one is slow)"""
+    global _host_key
+    with _host_key_lock:
+        if _host_key is None:
+            _host_key = paramiko.RSAKey.generate(2048)
+        return _host_key
+
+
+class _ServerInterface(paramiko.ServerInterface):
+    def __init__(self, username, password, subsystem):
+        self.username = username
+        self.password = password
+        self.subsystem = subsystem
+        self.ready = threading.Event()
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_auth_password(self, username, password):
+        if username == self.username and password == self.password:
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def check_channel_request(self, kind, chanid):
+        if kind == "session":
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_subsystem_request(self, channel, name):
+        if self.subsystem is not None and name == self.subsystem:
+            self.ready.set()
+            return True
+        return False
+
+    def check_channel_pty_request(self, channel, term, width, height, pixelwidth, pixelheight, modes):
+        return self.subsystem is None
+
+    def check_channel_shell_request(self, channel):
+        if self.subsystem is None:
+            self.ready.set()
+            return True
+        return False
+
+
+class SSHSimulator:
+    """
+    SSH server that hands every session channel to session(channel)
+
+    subsystem="netconf" accepts only that subsystem (NETCONF over SSH);
+    subsystem=None accepts an interactive shell with a pty (device CLI).
+    Every connection runs in its own thread.
+    """
+
+    def __init__(self, host, port, session, subsystem=None, username="admin", password="cisco"):
+        self.session = session
+        self.subsystem = subsystem
+        self.username = username
+        self.password = password
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, port))
+        self.sock.listen(64)
+        self._stopped = threading.Event()
+        self._transports = set()
+        self._lock = threading.Lock()
+
+    @property
+    def port(self):
+        return self.sock.getsockname()[1]
+
+    def start(self):
+        threading.Thread(target=self._accept_forever, daemon=True).start()
+
+    def stop(self):
+        self._stopped.set()
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+        with self._lock:
+            transports = list(self._transports)
+        for transport in transports:
+            transport.close()
+
+    def _accept_forever(self):
+        while not self._stopped.is_set():
+            try:
+                client, _ = self.sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(client,), daemon=True).start()
+
+    def _serve(self, client):
+        transport = paramiko.Transport(client)
+        transport.add_server_key(host_key())
+        with self._lock:
+            self._transports.add(transport)
+        try:
+            server = _ServerInterface(self.username, self.password, self.subsystem)
+            transport.start_server(server=server)
+            channel = transport.accept(timeout=30)
+            if channel is None or not server.ready.wait(timeout=30):
+                return
+            self.session(channel)
+        except (paramiko.SSHException, EOFError, OSError):
+            pass
+        finally:
+            with self._lock:
+                self._transports.discard(transport)
+            transport.close()
@@ -0,0 +1,193 @@
+import email.parser
+import email.policy
+import itertools
+import json
+import socket
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body=None):
+        data = json.dumps(body).encode() if body is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _authorized(self):
+        token = self.server.simulator.token
+        if token is None or self.headers.get("Authorization") == f"Bearer {token}":
+            return True
+        self._reply(401, {"message": "The request requires a valid access token."})
+        return False
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+        simulator = self.server.simulator
+        simulator.delay()
+        url = urlsplit(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        if url.path == "/v1/messages":
+            items = simulator.list_messages(
+                query.get("roomId"), int(query.get("max", 50)), query.get("beforeMessage")
+            )
+            self._reply(200, {"items": items})
+        elif url.path.startswith("/v1/messages/"):
+            message = simulator.get_message(url.path.rsplit("/", 1)[1])
+            self._reply(200, message) if message else self._reply(404, {"message": "not found"})
+        elif url.path == "/v1/webhooks":
+            self._reply(200, {"items": list(simulator.webhooks.values())})
+        else:
+            self._reply(404, {"message": "not found"})
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        simulator = self.server.simulator
+        simulator.delay()
+        url = urlsplit(self.path)
+        body = self._body()
+        content_type = self.headers.get("Content-Type", "")
+        if url.path == "/v1/messages":
+            if content_type.startswith("multipart/form-data"):
+                fields, files = _parse_multipart(content_type, body)
+            else:
+                fields, files = json.loads(body or b"{}"), []
+            message = simulator.add_message(
+                fields.get("roomId"), fields.get("text", ""), simulator.bot_email, files=files, reply=True
+            )
+            self._reply(200, message)
+        elif url.path == "/v1/webhooks":
+            self._reply(200, simulator.add_webhook(json.loads(body or b"{}")))
+        else:
+            self._reply(404, {"message": "not found"})
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def finish_request(self, request, client_address):
+        # headers and body are separate writes, do not let Nagle delay the body
+        request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        super().finish_request(request, client_address)
+
+
+def _parse_multipart(content_type, body):
+    """Form fields and (filename, size) of uploaded files of a multipart/form-data body"""
+    message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode() + body
+    )
+    fields = {}
+    files = []
+    for part in message.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        filename = part.get_filename()
+        payload = part.get_payload(decode=True) or b""
+        if filename:
+            files.append((filename, len(payload)))
+        elif name:
+            fields[name] = payload.decode()
+    return fields, files
+
+
+class WebexSimulator:
+    """
+    Stand-in for the /v1/messages and /v1/webhooks endpoints of webexapis.com
+
+    Messages live in memory per room and are listed newest first with
+    "max" and "beforeMessage" paging like the real API. post() adds a user
+    message; everything the bot POSTs is recorded in replies with the time it
+    arrived, and on_reply callbacks are called for each one.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, token=None, latency=0.0, bot_email="bot@webex.bot"):
+        self.token = token
+        self.latency = latency
+        self.bot_email = bot_email
+        self.messages = []  # oldest first
+        self.replies = []
+        self.webhooks = {}
+        self.on_reply = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.server = _Server((host, port), _Handler)
+        self.server.simulator = self
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def delay(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def add_message(self, room_id, text, person_email, files=(), reply=False):
+        message = {
+            "id": f"sim-message-{next(self._ids)}",
+            "roomId": room_id,
+            "roomType": "group",
+            "text": text,
+            "personEmail": person_email,
+            "created": datetime.now(timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z"),
+        }
+        if files:
+            message["files"] = [f"file://{name}" for name, _ in files]
+        with self._lock:
+            self.messages.append(message)
+            if reply:
+                self.replies.append(dict(message, received=time.monotonic()))
+        if reply:
+            for callback in list(self.on_reply):
+                callback(message)
+        return message
+
+    def post(self, room_id, text, person_email="user@example.com"):
+        """A user writes text into the room"""
+        return self.add_message(room_id, text, person_email)
+
+    def list_messages(self, room_id, max_items=50, before=None):
+        with self._lock:
+            messages = [m for m in self.messages if room_id is None or m["roomId"] == room_id]
+        if before is not None:
+            ids = [m["id"] for m in messages]
+            messages = messages[:ids.index(before)] if before in ids else []
+        return list(reversed(messages[-max_items:])) if max_items > 0 else []
+
+    def get_message(self, message_id):
+        with self._lock:
+            for message in self.messages:
+                if message["id"] == message_id:
+                    return message
+        return None
+
+    def add_webhook(self, fields):
+        hook = dict(fields, id=f"sim-webhook-{next(self._ids)}", status="active")
+        self.webhooks[hook["id"]] = hook
+        return hook
@@ -0,0 +1,81 @@
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class CommandDispatcher:
+    """
+    Run bot commands on a bounded worker pool
+
+    Commands for different routers run in parallel, commands for the same
+    router run one after another in the order they were submitted, so two
+    changes to one box never interleave. A router waiting for its turn does
+    not hold a worker thread; its next job is only handed to the pool when
+    the previous one has finished.
+    """
+
+    def __init__(self, max_workers=5):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="dispatch")
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._queues = {}        # router_ip -> deque of (operation, on_done)
+        self._router_locks = {}  # router_ip -> lock held while a job runs
+
+    def router_lock(self, router_ip):
+        """Lock that is held while any job for router_ip runs"""
+        with self._lock:
+            if router_ip not in self._router_locks:
+                self._router_locks[router_ip] = threading.Lock()
+            return self._router_locks[router_ip]
+
+    def submit(self, router_ip, operation, on_done):
+        """
+        Queue operation() for router_ip and call on_done(result) when it finishes
+
+        If operation raises, on_done gets the exception object instead.
+        """
+        with self._lock:
+            queue = self._queues.setdefault(router_ip, deque())
+            queue.append((operation, on_done))
+            if len(queue) > 1:
+                # the running job of this router starts this one when it is done
+                return
+        self._executor.submit(self._run_next, router_ip)
+
+    def _run_next(self, router_ip):
+        with self._lock:
+            operation, on_done = self._queues[router_ip][0]
+
+        try:
+            with self.router_lock(router_ip):
+                result = operation()
+        except Exception as e:
+            print(f"Error running command for {router_ip}: {e}")
+            result = e
+
+        try:
+            on_done(result)
+        except Exception as e:
+            print(f"Error delivering result for {router_ip}: {e}")
+        finally:
+            with self._lock:
+                queue = self._queues[router_ip]
+                queue.popleft()
+                more = len(queue) > 0
+                if not more:
+                    del self._queues[router_ip]
+                    self._idle.notify_all()
+            if more:
+                self._executor.submit(self._run_next, router_ip)
+
+    def pending(self):
+        """Number of jobs queued or running"""
+        with self._lock:
+            return sum(len(queue) for queue in self._queues.values())
+
+    def shutdown(self, wait=True):
+        """Stop the workers, by default after every queued job has run"""
+        if wait:
+            with self._idle:
+                self._idle.wait_for(lambda: not self._queues)
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,68 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# How many routers are contacted at the same time, and how long one may take
+FANOUT_LIMIT = int(os.environ.get("FANOUT_LIMIT", 5))
+DEVICE_TIMEOUT = float(os.environ.get("FANOUT_DEVICE_TIMEOUT", 60))
+
+
+def _run_with_timeout(operation, router_ip, timeout, lock=None):
+    """
+    Run operation(router_ip), raising TimeoutError if it takes too long
+
+    lock (already acquired) is released when operation really finishes, so a
+    router stays locked while a timed out operation is still talking to it.
+    """
+    result = {}
+
+    def target():
+        try:
+            result["value"] = operation(router_ip)
+        except Exception as e:
+            result["error"] = e
+        finally:
+            if lock is not None:
+                lock.release()
+
+    # the worker is a daemon thread: a hung device cannot be interrupted,
+    # but it no longer holds up the reply or a fan-out slot
+    worker = threading.Thread(target=target, daemon=True)
+    worker.start()
+    worker.join(timeout)
+    if worker.is_alive():
+        raise TimeoutError(f"no answer within {timeout:g}s")
+    if "error" in result:
+        raise result["error"]
+    return result["value"]
+
+
+def run_fleet(router_ips, operation, limit=FANOUT_LIMIT, timeout=DEVICE_TIMEOUT, lock_for=None):
+    """
+    Run operation(router_ip) against every router concurrently
+
+    At most limit routers are worked on at once and each one gets timeout
+    seconds. lock_for(router_ip), if given, returns a lock held while that
+    router is being worked on (to stay serialized with other commands).
+
+    Returns a list of (router_ip, result, error) in the order of router_ips,
+    where error is None on success.
+    """
+
+    def one(router_ip):
+        try:
+            if lock_for is None:
+                value = _run_with_timeout(operation, router_ip, timeout)
+            else:
+                lock = lock_for(router_ip)
+                if not lock.acquire(timeout=timeout):
+                    raise TimeoutError(f"router busy for more than {timeout:g}s")
+                value = _run_with_timeout(operation, router_ip, timeout, lock)
+            return (router_ip, value, None)
+        except Exception as e:
+            return (router_ip, None, e)
+
+    if not router_ips:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(limit, len(router_ips)))) as executor:
+        return list(executor.map(one, router_ips))
@@ -0,0 +1,86 @@
+import os
+
+# Same inventory file Ansible uses (see ansible.cfg)
+HOSTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "hosts")
+
+
+def parse_address_map(text):
+    """Parse "10.0.15.61=127.0.15.61,10.0.15.62=127.0.15.62" into a dict"""
+    mapping = {}
+    for pair in text.split(","):
+        router_ip, _, address = pair.strip().partition("=")
+        if router_ip and address:
+            mapping[router_ip.strip()] = address.strip()
+    return mapping
+
+
+# Connect somewhere else than the router IP, e.g. to local simulators
+# (DEVICE_ADDRESS_MAP="10.0.15.61=127.0.15.61,..."); commands still name the router IP
+address_map = parse_address_map(os.environ.get("DEVICE_ADDRESS_MAP", ""))
+
+
+def device_address(router_ip):
+    """Address to open connections to for router_ip"""
+    return address_map.get(router_ip, router_ip)
+
+
+def load_groups(path=HOSTS_FILE):
+    """
+    Read the groups of an Ansible INI inventory
+
+    Returns a dict of group name -> list of hosts. [group:vars] sections are
+    skipped and [group:children] sections are expanded into their members.
+    """
+    groups = {}
+    children = {}
+    section = None
+    kind = None
+
+    with open(path) as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            if line.startswith("[") and line.endswith("]"):
+                section, _, kind = line[1:-1].partition(":")
+                if kind == "":
+                    groups.setdefault(section, [])
+                elif kind == "children":
+                    children.setdefault(section, [])
+                continue
+            if section is None or kind == "":
+                host = line.split()[0]
+                groups.setdefault(section or "ungrouped", []).append(host)
+            elif kind == "children":
+                children[section].append(line.split()[0])
+
+    def members(group, seen=()):
+        hosts = list(groups.get(group, []))
+        for child in children.get(group, []):
+            if child not in seen:
+                hosts.extend(members(child, seen + (group,)))
+        return hosts
+
+    result = {}
+    for group in set(groups) | set(children):
+        # keep inventory order, drop duplicates
+        result[group] = list(dict.fromkeys(members(group)))
+    result["all"] = list(dict.fromkeys(h for hosts in groups.values() for h in hosts))
+    return result
+
+
+def resolve_targets(target, path=HOSTS_FILE):
+    """
+    Turn a target name into a list of hosts
+
+    "all" and group names expand to their members; anything else is returned
+    as a single host. Returns an empty list for an unknown or empty group.
+    """
+    groups = load_groups(path)
+    if target in groups:
+        return groups[target]
+    return [target]
+
+
+def is_group(target, path=HOSTS_FILE):
+    return target in load_groups(path)
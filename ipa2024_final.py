@@ -6,16 +6,30 @@
 #######################################################################################
 # 1. Import libraries for API requests, JSON formatting, time, os, (restconf_final or netconf_final), netmiko_final, and ansible_final.
 
+import time
+STARTED_AT = time.perf_counter()
+
 import requests
 import json
-import time
 import os
 from dotenv import load_dotenv
-import restconf_final
-import netconf_final
-import netmiko_final
-import ansible_final
-from requests_toolbelt.multipart.encoder import MultipartEncoder
+import backends
+import webex_webhook
+from message_cursor import MessageCursor
+from dispatcher import CommandDispatcher
+import inventory
+import fleet
+import metrics
+import profiling
+
+# The device backends (ncclient, paramiko, netmiko, textfsm, ...) and the
+# multipart encoder are imported the first time a command needs them
+restconf_final = backends.lazy("restconf_final")
+netconf_final = backends.lazy("netconf_final")
+netmiko_final = backends.lazy("netmiko_final")
+ansible_final = backends.lazy("ansible_final")
+backup_final = backends.lazy("backup_final")
+multipart = backends.lazy("requests_toolbelt.multipart.encoder")
 
 # Load environment variables from .env file
 load_dotenv()
@@ -31,210 +45,594 @@ ACCESS_TOKEN = os.environ.get("WEBEX_ACCESS_TOKEN")
 # Defines a variable that will hold the roomId
 roomIdToGetMessages = os.environ.get("WEBEX_ROOM_ID")
 
+# Base URL of the Webex API, can point to a local stand-in for testing
+WEBEX_API_URL = os.environ.get("WEBEX_API_URL", "https://webexapis.com/v1")
+
+# "poll" reads new messages every second, "webhook" waits for Webex events
+BOT_MODE = os.environ.get("BOT_MODE", "poll")
+WEBHOOK_PORT = int(os.environ.get("WEBHOOK_PORT", 8080))
+WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET")
+# Address of the webhook listener. Events are only signed when a secret is
+# set, so without one the listener accepts local connections only (from a
+# tunnel or reverse proxy) unless WEBHOOK_HOST says otherwise.
+WEBHOOK_HOST = os.environ.get("WEBHOOK_HOST", "0.0.0.0" if WEBHOOK_SECRET else "127.0.0.1")
+# Public URL Webex should POST events to (registered on startup when set)
+WEBHOOK_TARGET_URL = os.environ.get("WEBHOOK_TARGET_URL")
+
+# Seconds between safety polls while in webhook mode (catches missed events)
+WEBHOOK_FALLBACK_POLL = float(os.environ.get("WEBHOOK_FALLBACK_POLL", 30))
+
+# Remember the last processed message so nothing runs twice or gets lost
+MESSAGE_CURSOR_FILE = os.environ.get(
+    "MESSAGE_CURSOR_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".webex_cursor.json"),
+)
+# Messages fetched per page when catching up after a restart; the poll pages
+# back as far as needed, so no command of a long backlog is skipped
+PAGE_SIZE = int(os.environ.get("WEBEX_PAGE_SIZE", 50))
+cursor = MessageCursor(MESSAGE_CURSOR_FILE)
+
+# Worker threads running device commands (commands for one router stay in order)
+DISPATCH_WORKERS = int(os.environ.get("DISPATCH_WORKERS", 5))
+dispatcher = CommandDispatcher(max_workers=DISPATCH_WORKERS)
+
+# Valid router IPs (10.0.15.61-65)
+valid_ips = [f"10.0.15.{i}" for i in range(61, 66)]
+
 # Variable to store selected method (restconf or netconf)
 selected_method = None
 
-while True:
-    try:
-        # always add 1 second of delay to the loop to not go over a rate limit of API calls
-        time.sleep(1)
+# Callbacks hook(event, message_id, message, timestamp) following a message
+# through the bot: "received", "start" and "done" of its command, then
+# "posted" or "post_failed" for the reply (timestamps from time.monotonic)
+trace_hooks = []
 
-        # the Webex Teams GET parameters
-        #  "roomId" is the ID of the selected room
-        #  "max": 1  limits to get only the very last message in the room
-        getParameters = {"roomId": roomIdToGetMessages, "max": 1}
 
-        # the Webex Teams HTTP header, including the Authoriztion
-        getHTTPHeader = {"Authorization": "Bearer " + ACCESS_TOKEN}
+def trace(event, message_id, message):
+    if trace_hooks:
+        now = time.monotonic()
+        for hook in trace_hooks:
+            hook(event, message_id, message, now)
 
-# 4. Provide the URL to the Webex Teams messages API, and extract location from the received message.
-        
-        # Send a GET request to the Webex Teams messages API.
-        # - Use the GetParameters to get only the latest message.
-        # - Store the message in the "r" variable.
-        r = requests.get(
-            "https://webexapis.com/v1/messages",
-            params=getParameters,
-            headers=getHTTPHeader,
-        )
-        # verify if the retuned HTTP status code is 200/OK
-        if not r.status_code == 200:
-            print(f"Error getting messages. Status code: {r.status_code}")
-            continue
 
-        # get the JSON formatted returned data
-        json_data = r.json()
+def command_labels(message, method):
+    """(command, method) labels of a message for the metrics, from a fixed set of values"""
+    parts = message.split()
+    if len(parts) == 2 and parts[1].lower() in ["restconf", "netconf"]:
+        return "select_method", parts[1].lower()
+    if len(parts) < 3:
+        return "invalid", "none"
+    command = parts[2]
+    if command in ["create", "delete", "enable", "disable", "status"]:
+        return command, method or "none"
+    if command == "gigabit_status":
+        return command, netmiko_final.GIGABIT_STATUS_BACKEND
+    if command == "motd":
+        return command, "cli" if len(parts) < 4 else "ansible"
+    if command == "showrun":
+        return command, backup_final.SHOWRUN_ENGINE if len(parts) < 4 else "catalog"
+    return "unknown", "none"
 
-        # check if there are any messages in the "items" array
-        if len(json_data["items"]) == 0:
-            continue
 
-        # store the array of messages
-        messages = json_data["items"]
-        
-        # store the text of the first message in the array
-        message = messages[0]["text"]
-        print("Received message: " + message)
+def command_result(responseMessage):
+    """"ok" or "error" for an answer of handle_command"""
+    if isinstance(responseMessage, tuple):
+        return "ok" if responseMessage[0] == 'ok' else "error"
+    return "error" if str(responseMessage).startswith(("Error", "Cannot")) else "ok"
 
-        # check if the text of the message starts with the magic character "/" followed by your studentID and a space and followed by a command name
-        #  e.g.  "/66070077 restconf" or "/66070077 10.0.15.61 create"
-        if message.startswith("/66070077"):
 
-            # extract the command and IP with error handling
-            try:
-                parts = message.split()
-                if len(parts) < 2:
-                    responseMessage = "Error: No command specified. Please use format: /66070077 <method> or /66070077 <IP> <command>"
-                # Check if selecting method (restconf/netconf)
-                elif len(parts) == 2 and parts[1].lower() in ["restconf", "netconf"]:
-                    selected_method = parts[1].lower()
-                    responseMessage = f"Ok: {selected_method.capitalize()}"
-                    print(f"Method selected: {selected_method}")
-                elif len(parts) == 2:
-                    # Only one argument and it's not restconf/netconf
-                    # Check if method is selected first
-                    if selected_method is None:
-                        responseMessage = "Error: No method specified"
-                    # Check if it's an IP address
-                    elif parts[1].startswith("10.0.15."):
-                        responseMessage = "Error: No command found."
-                    else:
-                        responseMessage = "Error: No IP specified"
-                elif len(parts) < 3:
-                    # Two arguments but still less than 3
-                    if selected_method is None:
-                        responseMessage = "Error: No method specified"
-                    elif parts[1].startswith("10.0.15."):
-                        responseMessage = "Error: No command found."
-                    else:
-                        responseMessage = "Error: No IP specified"
-                else:
-                    router_ip = parts[1]
-                    command = parts[2]
+def profile_key(message, method=None):
+    """(command, method, router) a profile of handle_command is saved under"""
+    command, method = command_labels(message, method or selected_method)
+    parts = message.split()
+    return command, method, parts[1] if len(parts) > 1 else "none"
+
+
+# IPA_PROFILE=all (or e.g. showrun,status) saves a cProfile of each command
+@profiling.profiled(profile_key)
+def handle_command(message, method=None):
+    """
+    Run the command in a "/66070077 ..." message
+
+    method is the restconf/netconf selection to use, by default the one
+    currently selected. Returns the text to post back, or a
+    (status, filepath) tuple for showrun.
+    """
+    global selected_method
+    if method is None:
+        method = selected_method
+    start = time.perf_counter()
+
+    # extract the command and IP with error handling
+    try:
+        parts = message.split()
+        if len(parts) < 2:
+            responseMessage = "Error: No command specified. Please use format: /66070077 <method> or /66070077 <IP> <command>"
+        # Check if selecting method (restconf/netconf)
+        elif len(parts) == 2 and parts[1].lower() in ["restconf", "netconf"]:
+            selected_method = method = parts[1].lower()
+            responseMessage = f"Ok: {method.capitalize()}"
+            print(f"Method selected: {method}")
+        elif len(parts) == 2:
+            # Only one argument and it's not restconf/netconf
+            # Check if method is selected first
+            if method is None:
+                responseMessage = "Error: No method specified"
+            # Check if it's an IP address
+            elif parts[1].startswith("10.0.15."):
+                responseMessage = "Error: No command found."
+            else:
+                responseMessage = "Error: No IP specified"
+        elif len(parts) < 3:
+            # Two arguments but still less than 3
+            if method is None:
+                responseMessage = "Error: No method specified"
+            elif parts[1].startswith("10.0.15."):
+                responseMessage = "Error: No command found."
+            else:
+                responseMessage = "Error: No IP specified"
+        else:
+            router_ip = parts[1]
+            command = parts[2]
+            
+            # Validate IP address (10.0.15.61-65)
+            if router_ip not in valid_ips:
+                responseMessage = f"Error: Invalid IP. Valid IPs are 10.0.15.61 to 10.0.15.65, all or an inventory group"
+            else:
+                # Commands that don't require method selection
+                if command in ["gigabit_status", "showrun", "motd"]:
+                    print(f"Router IP: {router_ip}, Command: {command} (no method required)")
                     
-                    # Validate IP address (10.0.15.61-65)
-                    valid_ips = [f"10.0.15.{i}" for i in range(61, 66)]
-                    if router_ip not in valid_ips:
-                        responseMessage = f"Error: Invalid IP. Valid IPs are 10.0.15.61 to 10.0.15.65"
+                    # Execute commands immediately
+                    if command == "gigabit_status":
+                        responseMessage = netmiko_final.gigabit_status(router_ip)
+                    elif command == "showrun":
+                        if len(parts) >= 4 and parts[3] == "last":
+                            # latest saved backup, looked up in the backup catalog
+                            responseMessage = backup_final.last_backup(router_ip)
+                        elif len(parts) >= 4 and parts[3] == "diff":
+                            # "showrun diff [old] [new]" compares stored versions
+                            versions = [int(v) for v in parts[4:6]]
+                            responseMessage = backup_final.diff_backups(router_ip, *versions)
+                        else:
+                            responseMessage = backup_final.showrun(router_ip)
+                    elif command == "motd":
+                        # Extract MOTD message from parts[3:]
+                        if len(parts) < 4:
+                            # No message provided - read current MOTD using Netmiko + TextFSM
+                            responseMessage = netmiko_final.motd_read(router_ip)
+                        else:
+                            # Message provided - configure MOTD using Ansible
+                            motd_message = " ".join(parts[3:])
+                            responseMessage = ansible_final.motd(router_ip, motd_message)
+                
+                # Commands that require method selection
+                elif command in ["create", "delete", "enable", "disable", "status"]:
+                    if method is None:
+                        responseMessage = "Error: No method specified"
+                    elif len(parts) >= 4 and not parts[3].isdigit():
+                        responseMessage = "Error: Loopback number must be digits"
                     else:
-                        # Commands that don't require method selection
-                        if command in ["gigabit_status", "showrun", "motd"]:
-                            print(f"Router IP: {router_ip}, Command: {command} (no method required)")
-                            
-                            # Execute commands immediately
-                            if command == "gigabit_status":
-                                responseMessage = netmiko_final.gigabit_status(router_ip)
-                            elif command == "showrun":
-                                responseMessage = ansible_final.showrun(router_ip)
-                            elif command == "motd":
-                                # Extract MOTD message from parts[3:]
-                                if len(parts) < 4:
-                                    # No message provided - read current MOTD using Netmiko + TextFSM
-                                    responseMessage = netmiko_final.motd_read(router_ip)
-                                else:
-                                    # Message provided - configure MOTD using Ansible
-                                    motd_message = " ".join(parts[3:])
-                                    responseMessage = ansible_final.motd(router_ip, motd_message)
-                        
-                        # Commands that require method selection
-                        elif command in ["create", "delete", "enable", "disable", "status"]:
-                            if selected_method is None:
-                                responseMessage = "Error: No method specified"
-                            else:
-                                print(f"Router IP: {router_ip}, Command: {command}, Method: {selected_method}")
+                        print(f"Router IP: {router_ip}, Command: {command}, Method: {method}")
+
+                        # optional "<loopback number> [ip] [netmask]" after the command
+                        # (create only), default is loopback 66070077 / 172.0.77.1
+                        loopback_args = parts[3:6] if command == "create" else parts[3:4]
 
 # 5. Complete the logic for each command
 
-                                if command == "create":
-                                    if selected_method == "restconf":
-                                        responseMessage = restconf_final.create(router_ip)
-                                    else:  # netconf
-                                        responseMessage = netconf_final.create(router_ip)
-                                elif command == "delete":
-                                    if selected_method == "restconf":
-                                        responseMessage = restconf_final.delete(router_ip)
-                                    else:  # netconf
-                                        responseMessage = netconf_final.delete(router_ip)
-                                elif command == "enable":
-                                    if selected_method == "restconf":
-                                        responseMessage = restconf_final.enable(router_ip)
-                                    else:  # netconf
-                                        responseMessage = netconf_final.enable(router_ip)
-                                elif command == "disable":
-                                    if selected_method == "restconf":
-                                        responseMessage = restconf_final.disable(router_ip)
-                                    else:  # netconf
-                                        responseMessage = netconf_final.disable(router_ip)
-                                elif command == "status":
-                                    if selected_method == "restconf":
-                                        responseMessage = restconf_final.status(router_ip)
-                                    else:  # netconf
-                                        responseMessage = netconf_final.status(router_ip)
-                        else:
-                            responseMessage = "Error: Unknown command. Valid commands: create, delete, enable, disable, status, gigabit_status, showrun, motd"
-            except Exception as e:
-                print(f"Error processing command: {e}")
-                responseMessage = "Error: Failed to process command"
-            
+                        if command == "create":
+                            if method == "restconf":
+                                responseMessage = restconf_final.create(router_ip, *loopback_args)
+                            else:  # netconf
+                                responseMessage = netconf_final.create(router_ip, *loopback_args)
+                        elif command == "delete":
+                            if method == "restconf":
+                                responseMessage = restconf_final.delete(router_ip, *loopback_args)
+                            else:  # netconf
+                                responseMessage = netconf_final.delete(router_ip, *loopback_args)
+                        elif command == "enable":
+                            if method == "restconf":
+                                responseMessage = restconf_final.enable(router_ip, *loopback_args)
+                            else:  # netconf
+                                responseMessage = netconf_final.enable(router_ip, *loopback_args)
+                        elif command == "disable":
+                            if method == "restconf":
+                                responseMessage = restconf_final.disable(router_ip, *loopback_args)
+                            else:  # netconf
+                                responseMessage = netconf_final.disable(router_ip, *loopback_args)
+                        elif command == "status":
+                            if method == "restconf":
+                                responseMessage = restconf_final.status(router_ip, *loopback_args)
+                            else:  # netconf
+                                responseMessage = netconf_final.status(router_ip, *loopback_args)
+                else:
+                    responseMessage = "Error: Unknown command. Valid commands: create, delete, enable, disable, status, gigabit_status, showrun, motd"
+    except Exception as e:
+        print(f"Error processing command: {e}")
+        responseMessage = "Error: Failed to process command"
+
+    command, method = command_labels(message, method)
+    metrics.command_seconds.observe(time.perf_counter() - start, command=command, method=method)
+    metrics.commands_total.inc(command=command, method=method, result=command_result(responseMessage))
+    return responseMessage
+
+
+def format_fleet_result(result):
+    # showrun answers with a (status, filepath) tuple
+    if isinstance(result, tuple) and len(result) == 2:
+        status, filepath = result
+        if status == 'ok' and filepath:
+            return f"saved {os.path.basename(filepath)}"
+        return str(status)
+    return str(result)
+
+
+def handle_fleet_command(message, method=None):
+    """
+    Run "/66070077 <all|group> <command>" against every router of the target
+
+    Each router runs the normal single-router command concurrently (see
+    fleet.run_fleet) and the answers are joined into one reply, one line per
+    router, with failures reported per router.
+    """
+    if method is None:
+        method = selected_method
+    parts = message.split()
+    target = parts[1]
+    rest = " ".join(parts[2:])
+    router_ips = [ip for ip in inventory.resolve_targets(target) if ip in valid_ips]
+    if not router_ips:
+        return f"Error: No routers in {target}"
+
+    print(f"Fleet target: {target} ({len(router_ips)} routers), Command: {rest}")
+    results = fleet.run_fleet(
+        router_ips,
+        lambda router_ip: handle_command(f"/66070077 {router_ip} {rest}", method),
+        lock_for=dispatcher.router_lock,
+    )
+
+    lines = []
+    failed = 0
+    for router_ip, result, error in results:
+        if error is not None:
+            failed += 1
+            lines.append(f"{router_ip}: Error: {error}")
+        else:
+            text = format_fleet_result(result)
+            if text.startswith("Error"):
+                failed += 1
+            lines.append(f"{router_ip}: {text}")
+    lines.append(f"-> {len(results) - failed} ok, {failed} failed")
+    return "\n".join(lines)
+
+
 # 6. Complete the code to post the message to the Webex Teams room.
 
-            try:
-                # Check if responseMessage is a tuple (for showrun command with file)
-                if isinstance(responseMessage, tuple) and len(responseMessage) == 2:
-                    status, filepath = responseMessage
-                    
-                    if status == 'ok' and filepath and os.path.exists(filepath):
-                        # Send message with file attachment
-                        # Extract only filename without path
-                        filename = os.path.basename(filepath)
-                        
-                        with open(filepath, 'rb') as fileobject:
-                            postData = MultipartEncoder({
-                                "roomId": roomIdToGetMessages,
-                                "text": "show running config",
-                                "files": (filename, fileobject, "text/plain")
-                            })
-                            HTTPHeaders = {
-                                "Authorization": "Bearer " + ACCESS_TOKEN,
-                                "Content-Type": postData.content_type
-                            }
-                            r = requests.post(
-                                "https://webexapis.com/v1/messages",
-                                data=postData,
-                                headers=HTTPHeaders,
-                            )
-                    else:
-                        # Send error message without file
-                        postData = {"roomId": roomIdToGetMessages, "text": "Error: Ansible"}
-                        postData = json.dumps(postData)
-                        HTTPHeaders = {"Authorization": "Bearer " + ACCESS_TOKEN, "Content-Type": "application/json"}
-                        r = requests.post(
-                            "https://webexapis.com/v1/messages",
-                            data=postData,
-                            headers=HTTPHeaders,
-                        )
-                else:
-                    # Send regular text message (for other commands)
-                    postData = {"roomId": roomIdToGetMessages, "text": str(responseMessage)}
-                    postData = json.dumps(postData)
-                    HTTPHeaders = {"Authorization": "Bearer " + ACCESS_TOKEN, "Content-Type": "application/json"}   
+def post_response(responseMessage):
+    try:
+        # Check if responseMessage is a tuple (for showrun command with file)
+        if isinstance(responseMessage, tuple) and len(responseMessage) == 2:
+            status, filepath = responseMessage
+            
+            if status == 'ok' and filepath and os.path.exists(filepath):
+                # Send message with file attachment
+                # Extract only filename without path
+                filename = os.path.basename(filepath)
+                
+                with open(filepath, 'rb') as fileobject:
+                    postData = multipart.MultipartEncoder({
+                        "roomId": roomIdToGetMessages,
+                        "text": "show running config",
+                        "files": (filename, fileobject, "text/plain")
+                    })
+                    HTTPHeaders = {
+                        "Authorization": "Bearer " + ACCESS_TOKEN,
+                        "Content-Type": postData.content_type
+                    }
                     r = requests.post(
-                        "https://webexapis.com/v1/messages",
+                        f"{WEBEX_API_URL}/messages",
                         data=postData,
                         headers=HTTPHeaders,
                     )
-                
-                if not r.status_code == 200:
-                    print(f"Error sending message to Webex. Status code: {r.status_code}")
-                    print(f"Response: {r.text}")
+            else:
+                # Send the error of the backup (native, Ansible or "showrun last") without file
+                postData = {"roomId": roomIdToGetMessages, "text": str(status)}
+                postData = json.dumps(postData)
+                HTTPHeaders = {"Authorization": "Bearer " + ACCESS_TOKEN, "Content-Type": "application/json"}
+                r = requests.post(
+                    f"{WEBEX_API_URL}/messages",
+                    data=postData,
+                    headers=HTTPHeaders,
+                )
+        else:
+            # Send regular text message (for other commands)
+            postData = {"roomId": roomIdToGetMessages, "text": str(responseMessage)}
+            postData = json.dumps(postData)
+            HTTPHeaders = {"Authorization": "Bearer " + ACCESS_TOKEN, "Content-Type": "application/json"}   
+            r = requests.post(
+                f"{WEBEX_API_URL}/messages",
+                data=postData,
+                headers=HTTPHeaders,
+            )
+        
+        if not r.status_code == 200:
+            print(f"Error sending message to Webex. Status code: {r.status_code}")
+            print(f"Response: {r.text}")
+            return False
+        return True
+    except Exception as e:
+        print(f"Error sending message to Webex: {e}")
+        return False
+
+
+def traced(message_id, message, operation):
+    """Run the command of a message between its "start" and "done" trace events"""
+    trace("start", message_id, message)
+    try:
+        return operation()
+    finally:
+        trace("done", message_id, message)
+
+
+def reply(message_id, message, responseMessage):
+    """Post the answer to a message, which finishes the message in the cursor"""
+    try:
+        with metrics.timed("post", "webex"):
+            ok = post_response(responseMessage)
+        if not ok:
+            metrics.webex_errors_total.inc(operation="post")
+        trace("posted" if ok else "post_failed", message_id, message)
+    finally:
+        if message_id is not None:
+            cursor.finish(message_id)
+
+
+def process_message(message, message_id=None):
+    """Handle the text of a message, returns True if the reply is posted later by the dispatcher"""
+    print("Received message: " + message)
+    trace("received", message_id, message)
+
+    # check if the text of the message starts with the magic character "/" followed by your studentID and a space and followed by a command name
+    #  e.g.  "/66070077 restconf" or "/66070077 10.0.15.61 create"
+    if message.startswith("/66070077"):
+        parts = message.split()
+        if len(parts) >= 3 and parts[1] in valid_ips:
+            # Device commands run on the dispatcher with the method selected
+            # right now, the reply is posted as soon as the command finishes
+            method = selected_method
+            dispatcher.submit(
+                parts[1],
+                lambda: traced(message_id, message, lambda: handle_command(message, method)),
+                lambda responseMessage: reply(message_id, message, responseMessage),
+            )
+            return True
+        elif len(parts) >= 3 and inventory.is_group(parts[1]):
+            # "all" or an inventory group: fan out to every member
+            method = selected_method
+            dispatcher.submit(
+                f"fleet:{parts[1]}",
+                lambda: traced(message_id, message, lambda: handle_fleet_command(message, method)),
+                lambda responseMessage: reply(message_id, message, responseMessage),
+            )
+            return True
+        else:
+            # method selection and input errors are answered right away
+            responseMessage = traced(message_id, message, lambda: handle_command(message))
+            reply(message_id, message, responseMessage)
+    return False
+
+
+def process_item(item):
+    """
+    Process one message from the messages API
+
+    The message stays pending in the cursor file until its reply is posted,
+    a command that was queued or running when the bot stopped is run again
+    by replay_pending() after the restart. Every command is answered at
+    least once; one that was running at the stop can run twice.
+    """
+    if item.get("roomId") != roomIdToGetMessages:
+        # e.g. a forged webhook event pointing at a message of another room
+        print(f"Ignoring message {item['id']} from another room")
+        return
+    if not cursor.claim(item["id"]):
+        return
+    run_item(item)
+
+
+def run_item(item):
+    reply_later = False
+    try:
+        if item.get("text"):
+            reply_later = process_message(item["text"], item["id"])
+    finally:
+        cursor.advance(item)
+        if not reply_later:
+            cursor.finish(item["id"])
+
+
+# Pending messages from before the last stop that were not replayed yet
+unreplayed = []
+
+
+def replay_pending():
+    """
+    Run the commands that were not answered before the last stop again
+
+    A message that cannot be read right now (Webex unreachable, server
+    error) stays pending and is tried again by the next poll.
+    """
+    for message_id in list(unreplayed):
+        try:
+            message = get_message(message_id)
+        except requests.RequestException as e:
+            print(f"Error reading message {message_id} to replay it ({e}), trying again later")
+            continue
+        unreplayed.remove(message_id)
+        if message is None:
+            print(f"Not replaying message {message_id}, it no longer exists")
+            cursor.finish(message_id)
+            continue
+        print(f"Replaying {message.get('text')!r}, it was not answered before the last stop")
+        try:
+            run_item(message)
+        except Exception as e:
+            print(f"Error replaying message {message_id}: {e}")
+
+
+def get_message(message_id):
+    """
+    Fetch one message by id (used for webhook events and the replay)
+
+    Returns None if the message does not exist (any more); other failures
+    raise requests.RequestException so the caller can try again.
+    """
+    getHTTPHeader = {"Authorization": "Bearer " + ACCESS_TOKEN}
+    with metrics.timed("poll", "webex"):
+        r = requests.get(f"{WEBEX_API_URL}/messages/{message_id}", headers=getHTTPHeader)
+    if r.status_code == 404:
+        print(f"Message {message_id} not found")
+        return None
+    if not r.status_code == 200:
+        print(f"Error getting message {message_id}. Status code: {r.status_code}")
+        metrics.webex_errors_total.inc(operation="get")
+        raise requests.HTTPError(f"Status code: {r.status_code}", response=r)
+    with metrics.timed("parse", "webex"):
+        return r.json()
+
+
+def on_webhook_message(message_id):
+    message = get_message(message_id)
+    if message:
+        process_item(message)
+
+
+def poll_once():
+    if unreplayed:
+        replay_pending()
+
+    # the Webex Teams GET parameters
+    #  "roomId" is the ID of the selected room
+    #  "max" is the page size; on the very first start only the latest message
+    #  is needed to place the cursor, the room history is not replayed
+    getParameters = {"roomId": roomIdToGetMessages, "max": 1 if cursor.is_new else PAGE_SIZE}
+
+    # the Webex Teams HTTP header, including the Authoriztion
+    getHTTPHeader = {"Authorization": "Bearer " + ACCESS_TOKEN}
+
+# 4. Provide the URL to the Webex Teams messages API, and extract location from the received message.
+
+    # Messages come newest first, so page backwards ("beforeMessage") until
+    # the poll position is reached, then process what was collected oldest
+    # first. Messages already handled from a webhook event are skipped by id.
+    new_messages = []
+    while True:
+        with metrics.timed("poll", "webex"):
+            r = requests.get(
+                f"{WEBEX_API_URL}/messages",
+                params=getParameters,
+                headers=getHTTPHeader,
+            )
+        # verify if the retuned HTTP status code is 200/OK
+        if not r.status_code == 200:
+            # do not process a partial catch-up, the next poll starts again
+            print(f"Error getting messages. Status code: {r.status_code}")
+            metrics.webex_errors_total.inc(operation="poll")
+            return
+
+        with metrics.timed("parse", "webex"):
+            # get the JSON formatted returned data
+            items = r.json()["items"]
+
+            reached = False
+            for item in items:
+                if cursor.reached(item):
+                    reached = True
+                    break
+                new_messages.append(item)
+
+        if reached or cursor.is_new or len(items) < getParameters["max"]:
+            break
+        getParameters["beforeMessage"] = items[-1]["id"]
+
+    if len(new_messages) > PAGE_SIZE:
+        print(f"Catching up on {len(new_messages)} messages")
+
+    # check if there are any new messages
+    if len(new_messages) == 0:
+        return
+
+    if cursor.is_new:
+        cursor.polled(new_messages[0])
+        return
+
+    for item in reversed(new_messages):
+        process_item(item)
+    cursor.polled(new_messages[0])
+
+
+def run_polling():
+    while True:
+        try:
+            # always add 1 second of delay to the loop to not go over a rate limit of API calls
+            time.sleep(1)
+            poll_once()
+        except KeyboardInterrupt:
+            print("\nProgram stopped by user")
+            break
+        except Exception as e:
+            print(f"Error in main loop: {e}")
+            # Continue running even if there's an error
+            time.sleep(1)
+            continue
+
+
+def run_webhook():
+    try:
+        server = webex_webhook.WebhookServer(
+            on_webhook_message, host=WEBHOOK_HOST, port=WEBHOOK_PORT, secret=WEBHOOK_SECRET
+        )
+    except OSError as e:
+        # polling stays available when the listener cannot be started
+        print(f"Error starting webhook listener ({e}), falling back to polling")
+        run_polling()
+        return
+
+    if WEBHOOK_TARGET_URL:
+        hook_id = webex_webhook.register_webhook(
+            WEBEX_API_URL, ACCESS_TOKEN, WEBHOOK_TARGET_URL, roomIdToGetMessages, WEBHOOK_SECRET
+        )
+        if hook_id is None:
+            print("Error: webhook not registered, falling back to polling")
+            server.stop()
+            run_polling()
+            return
+
+    server.start()
+    try:
+        # a slow poll pages back to where the previous poll got to and
+        # picks up anything whose webhook event got lost
+        while True:
+            time.sleep(WEBHOOK_FALLBACK_POLL)
+            try:
+                poll_once()
             except Exception as e:
-                print(f"Error sending message to Webex: {e}")
-    
+                print(f"Error in fallback poll: {e}")
     except KeyboardInterrupt:
         print("\nProgram stopped by user")
-        break
-    except Exception as e:
-        print(f"Error in main loop: {e}")
-        # Continue running even if there's an error
-        time.sleep(1)
-        continue
+        server.stop()
+
+
+if __name__ == "__main__":
+    print(backends.report(STARTED_AT))
+    if backends.WARMUP:
+        backends.start_warm_up()
+    # Prometheus style /metrics endpoint, only when METRICS_PORT is set
+    metrics.start_server()
+    unreplayed.extend(cursor.pending)
+    replay_pending()
+    if BOT_MODE == "webhook":
+        run_webhook()
+    else:
+        run_polling()
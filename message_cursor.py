@@ -0,0 +1,143 @@
+import json
+import os
+import threading
+from collections import deque
+
+
+class MessageCursor:
+    """
+    Remember which Webex messages were already processed
+
+    The cursor keeps the id and "created" timestamp of the newest processed
+    message plus the ids of the last few hundred processed messages, and
+    writes them to a JSON file after every change so that a restarted bot
+    continues where it stopped instead of running the last command again.
+
+    The poll has its own position (poll_id/poll_created): the newest message
+    up to which a poll has seen every message. Messages handled out of order
+    (webhook events) only go into the recent ids, so a later poll still pages
+    back to its own position and picks up whatever an event missed.
+
+    Claimed messages stay in the pending list until finish() is called for
+    them, which the bot does once the answer is posted, so commands still
+    queued or running when the bot stops can be run again after a restart.
+    """
+
+    def __init__(self, path, remember=500):
+        self.path = path
+        self.last_id = None
+        self.last_created = None
+        self.poll_id = None
+        self.poll_created = None
+        self._recent = deque(maxlen=remember)
+        self._recent_set = set()
+        self._pending = {}  # message id -> None, in claim order
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Error reading message cursor {self.path}: {e}")
+            return
+        self.last_id = data.get("last_id")
+        self.last_created = data.get("last_created")
+        # files written before the poll position existed: start from last_id
+        self.poll_id = data.get("poll_id", self.last_id)
+        self.poll_created = data.get("poll_created", self.last_created)
+        for message_id in data.get("recent", []):
+            self._remember(message_id)
+        self._pending = dict.fromkeys(data.get("pending", []))
+
+    def _save(self):
+        data = {
+            "last_id": self.last_id,
+            "last_created": self.last_created,
+            "poll_id": self.poll_id,
+            "poll_created": self.poll_created,
+            "recent": list(self._recent),
+            "pending": list(self._pending),
+        }
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def _remember(self, message_id):
+        if len(self._recent) == self._recent.maxlen:
+            self._recent_set.discard(self._recent[0])
+        self._recent.append(message_id)
+        self._recent_set.add(message_id)
+
+    @property
+    def is_new(self):
+        """True until the first poll placed the poll position"""
+        return self.poll_id is None
+
+    def reached(self, message):
+        """
+        True if message is at or before the poll position
+
+        Messages after it that were already processed (e.g. from a webhook
+        event) are not "reached"; claim() skips them instead, so the poll
+        does not stop at them and miss older ones.
+        """
+        if message["id"] == self.poll_id:
+            return True
+        # "created" has millisecond resolution, a message from the same
+        # millisecond as the poll position is not reached unless it is that one
+        return self.poll_created is not None and message.get("created", "") < self.poll_created
+
+    def polled(self, message):
+        """Every message up to message has been seen by a poll, move the poll position there"""
+        with self._lock:
+            created = message.get("created")
+            if self.poll_created is None or (created and created >= self.poll_created):
+                self.poll_id = message["id"]
+                self.poll_created = created
+            self._save()
+
+    def claim(self, message_id):
+        """
+        Mark message_id as being processed
+
+        Returns False if it was already claimed, so the same message coming in
+        twice (e.g. from a webhook event and a poll) only runs once.
+        """
+        with self._lock:
+            if message_id in self._recent_set:
+                return False
+            self._remember(message_id)
+            self._pending[message_id] = None
+            return True
+
+    def finish(self, message_id):
+        """The message was handled completely, drop it from the pending list"""
+        with self._lock:
+            if message_id in self._pending:
+                del self._pending[message_id]
+                self._save()
+
+    @property
+    def pending(self):
+        """Ids of claimed messages not finished yet, oldest first"""
+        with self._lock:
+            return list(self._pending)
+
+    def advance(self, message):
+        """Move the cursor forward to message (never backwards) and save it"""
+        with self._lock:
+            self._remember_once(message["id"])
+            created = message.get("created")
+            if self.last_created is None or (created and created >= self.last_created):
+                self.last_id = message["id"]
+                self.last_created = created
+            self._save()
+
+    def _remember_once(self, message_id):
+        if message_id not in self._recent_set:
+            self._remember(message_id)
@@ -0,0 +1,235 @@
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Port of the /metrics endpoint (0 keeps it off) and the address it listens on
+METRICS_PORT = int(os.environ.get("METRICS_PORT", 0))
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")
+
+# Histogram bucket upper bounds in seconds, from fast parses to slow playbooks
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic count per label combination"""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}  # label values -> count
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, count in values:
+            yield self.name, _label_text(self.labelnames, key), count
+
+
+class Histogram:
+    """
+    Distribution of observed values per label combination
+
+    Keeps a count per bucket plus sum and count, like a Prometheus histogram,
+    so quantiles can be computed by the scraper over any time window.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._values = {}  # label values -> [bucket counts..., sum, count]
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                entry[index] += 1
+            entry[-2] += value
+            entry[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe how long the with block took"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            values = sorted((key, list(entry)) for key, entry in self._values.items())
+        for key, entry in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets, entry):
+                cumulative += count
+                yield self.name + "_bucket", _label_text(self.labelnames, key, [("le", _number(bound))]), cumulative
+            yield self.name + "_bucket", _label_text(self.labelnames, key, [("le", "+Inf")]), entry[-1]
+            yield self.name + "_sum", _label_text(self.labelnames, key), entry[-2]
+            yield self.name + "_count", _label_text(self.labelnames, key), entry[-1]
+
+
+class MetricsRegistry:
+    """The metrics of the bot, rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _add(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._add(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+# Where the time of a command goes. phase is one of
+#   poll         reading messages from Webex
+#   parse        decoding the Webex reply into messages
+#   connect      opening a device connection (SSH, TCP+TLS) or session
+#   rpc          the RESTCONF request, NETCONF RPC, CLI command or playbook run
+#   reply_parse  reading the device reply (JSON, XPath, TextFSM, Ansible report)
+#   post         posting the answer to Webex
+# and backend is webex, restconf, netconf, cli or ansible.
+phase_seconds = registry.histogram(
+    "ipa_phase_seconds", "Time spent per phase of command handling", ("phase", "backend"))
+command_seconds = registry.histogram(
+    "ipa_command_seconds", "Time from the start of a command to its answer", ("command", "method"))
+commands_total = registry.counter(
+    "ipa_commands_total", "Commands handled, result is ok or error", ("command", "method", "result"))
+connections_total = registry.counter(
+    "ipa_device_connections_total", "Device connections needed per command, outcome is reused or opened",
+    ("backend", "outcome"))
+device_errors_total = registry.counter(
+    "ipa_device_errors_total", "Errors returned by or while talking to a device", ("backend", "reason"))
+webex_errors_total = registry.counter(
+    "ipa_webex_errors_total", "Failed Webex API calls", ("operation",))
+
+
+def timed(phase, backend):
+    """with timed("rpc", "netconf"): ... observes the block in ipa_phase_seconds"""
+    return phase_seconds.time(phase=phase, backend=backend)
+
+
+class MetricsServer:
+    """
+    HTTP listener serving the registry at /metrics
+
+    Listens on localhost by default (METRICS_HOST), a Prometheus server or
+    curl on the same host can scrape it.
+    """
+
+    def __init__(self, host=METRICS_HOST, port=METRICS_PORT, metrics_registry=registry):
+        self.metrics_registry = metrics_registry
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def port(self):
+        return self.httpd.server_address[1]
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                body = server.metrics_registry.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        print(f"Metrics endpoint started on port {self.port}")
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def start_server(port=METRICS_PORT):
+    """Start the /metrics endpoint when a port is configured, returns the server or None"""
+    if not port:
+        return None
+    try:
+        server = MetricsServer(port=port)
+    except OSError as e:
+        print(f"Error starting metrics endpoint ({e})")
+        return None
+    server.start()
+    return server
@@ -1,194 +1,478 @@
 from ncclient import manager
-import xmltodict
-
-
-def create(router_ip):
-    # Connect to the router
-    m = manager.connect(
-        host=router_ip,
-        port=830,
-        username="admin",
-        password="cisco",
-        hostkey_verify=False
-    )
-    
-    netconf_config = """
-    <config>
-        <interfaces xmlns="urn:ietf:params:xml:ns:yang:ietf-interfaces">
-            <interface>
-                <name>Loopback66070077</name>
-                <description>Loopback Interface 66070077</description>
-                <type xmlns:ianaift="urn:ietf:params:xml:ns:yang:iana-if-type">ianaift:softwareLoopback</type>
-                <enabled>true</enabled>
-                <ipv4 xmlns="urn:ietf:params:xml:ns:yang:ietf-ip">
-                    <address>
-                        <ip>172.0.77.1</ip>
-                        <netmask>255.255.255.0</netmask>
-                    </address>
-                </ipv4>
-            </interface>
-        </interfaces>
-    </config>
+from ncclient.operations import MissingCapabilityError, OperationError, RPCError
+from ncclient.transport import TransportError
+from contextlib import contextmanager
+from lxml import etree
+import threading
+import time
+import os
+import uuid
+import status_cache
+import inventory
+import metrics
+from payload_templates import (
+    DEFAULT_LOOPBACK, loopback_params,
+    NETCONF_CREATE, NETCONF_DELETE, NETCONF_SET_ENABLED, NETCONF_STATUS_FILTER,
+    NETCONF_ALL_STATES_FILTER,
+)
+
+username = "admin"
+password = "cisco"
+
+# NETCONF session pool settings (can be overridden with environment variables)
+NETCONF_PORT = int(os.environ.get("NETCONF_PORT", 830))
+# Seconds to wait for the TCP connect and SSH handshake of a new session
+CONNECT_TIMEOUT = float(os.environ.get("NETCONF_CONNECT_TIMEOUT", 10))
+POOL_MAX_SESSIONS = int(os.environ.get("NETCONF_POOL_MAX_SESSIONS", 2))
+POOL_IDLE_TIMEOUT = float(os.environ.get("NETCONF_POOL_IDLE_TIMEOUT", 300))
+POOL_ACQUIRE_TIMEOUT = float(os.environ.get("NETCONF_POOL_ACQUIRE_TIMEOUT", 30))
+
+
+class NetconfSessionPool:
+    """
+    Keep NETCONF sessions open per router and reuse them between commands
+
+    Opening a session costs a full SSH handshake plus the capability exchange,
+    so idle sessions are kept and handed out again. A session is checked before
+    reuse, replaced when it went stale, and closed after being idle for
+    idle_timeout seconds. At most max_sessions sessions per router are in use
+    at the same time.
     """
 
+    def __init__(self, max_sessions=POOL_MAX_SESSIONS, idle_timeout=POOL_IDLE_TIMEOUT,
+                 acquire_timeout=POOL_ACQUIRE_TIMEOUT):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.acquire_timeout = acquire_timeout
+        self._lock = threading.Lock()
+        self._idle = {}   # router_ip -> list of (session, last_used)
+        self._slots = {}  # router_ip -> semaphore limiting sessions in use
+        self._reaper = None
+
+    def _slot(self, router_ip):
+        with self._lock:
+            if router_ip not in self._slots:
+                self._slots[router_ip] = threading.BoundedSemaphore(self.max_sessions)
+            return self._slots[router_ip]
+
+    def _connect(self, router_ip):
+        print(f"Opening NETCONF session to {router_ip}")
+        try:
+            with metrics.timed("connect", "netconf"):
+                m = manager.connect(
+                    host=inventory.device_address(router_ip),
+                    port=NETCONF_PORT,
+                    username=username,
+                    password=password,
+                    hostkey_verify=False,
+                    timeout=CONNECT_TIMEOUT,
+                )
+        except Exception:
+            metrics.device_errors_total.inc(backend="netconf", reason="connect")
+            raise
+        metrics.connections_total.inc(backend="netconf", outcome="opened")
+        return m
+
+    def _close(self, m):
+        try:
+            if m.connected:
+                m.close_session()
+        except Exception as e:
+            print(f"Error closing NETCONF session: {e}")
+
+    def _checkout(self, router_ip):
+        """A session for router_ip and whether it was reused from the pool"""
+        # Reuse the most recently used session that is still connected
+        while True:
+            with self._lock:
+                idle = self._idle.get(router_ip)
+                if not idle:
+                    break
+                m, last_used = idle.pop()
+            if m.connected and time.monotonic() - last_used < self.idle_timeout:
+                metrics.connections_total.inc(backend="netconf", outcome="reused")
+                return m, True
+            self._close(m)
+        return self._connect(router_ip), False
+
+    def _checkin(self, router_ip, m):
+        with self._lock:
+            self._idle.setdefault(router_ip, []).append((m, time.monotonic()))
+        self._start_reaper()
+
+    def _start_reaper(self):
+        with self._lock:
+            if self._reaper is not None:
+                return
+            self._reaper = threading.Thread(target=self._reap_forever, daemon=True)
+        self._reaper.start()
+
+    def _reap_forever(self):
+        while True:
+            time.sleep(max(self.idle_timeout / 2, 1))
+            self.evict_idle()
+
+    def evict_idle(self):
+        """Close every session that has been idle longer than idle_timeout"""
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            for router_ip, idle in self._idle.items():
+                keep = []
+                for m, last_used in idle:
+                    if now - last_used >= self.idle_timeout or not m.connected:
+                        expired.append(m)
+                    else:
+                        keep.append((m, last_used))
+                self._idle[router_ip] = keep
+        for m in expired:
+            self._close(m)
+
+    @contextmanager
+    def session(self, router_ip):
+        """Borrow a connected session for router_ip and give it back afterwards"""
+        with self._borrow(router_ip) as (m, reused):
+            yield m
+
+    @contextmanager
+    def _borrow(self, router_ip):
+        slot = self._slot(router_ip)
+        if not slot.acquire(timeout=self.acquire_timeout):
+            raise TimeoutError(f"No free NETCONF session for {router_ip}")
+        m = None
+        healthy = True
+        try:
+            m, reused = self._checkout(router_ip)
+            yield m, reused
+        except (OperationError, MissingCapabilityError):
+            # The device answered with <rpc-error> (RPCError) or ncclient
+            # refused the operation before sending it, the session itself is fine
+            raise
+        except Exception:
+            healthy = False
+            raise
+        finally:
+            if m is not None:
+                if healthy and m.connected:
+                    self._checkin(router_ip, m)
+                else:
+                    self._close(m)
+            slot.release()
+
+    def run(self, router_ip, operation):
+        """
+        Run operation(m) on a pooled session of router_ip
+
+        If a reused session turns out to be stale (transport closed by the
+        router) the operation is retried once on a freshly opened session.
+        A new session that cannot be opened or fails is not retried.
+        """
+        reused = False
+        try:
+            with self._borrow(router_ip) as (m, reused):
+                return self._timed(operation, m)
+        except (TransportError, OSError) as e:
+            if not reused or isinstance(e, TimeoutError):
+                raise
+            print(f"NETCONF session to {router_ip} failed ({e}), reconnecting")
+            metrics.device_errors_total.inc(backend="netconf", reason="transport")
+            with self.session(router_ip) as m:
+                return self._timed(operation, m)
+
+    def _timed(self, operation, m):
+        try:
+            with metrics.timed("rpc", "netconf"):
+                return operation(m)
+        except RPCError as e:
+            metrics.device_errors_total.inc(backend="netconf", reason=e.tag or "rpc-error")
+            raise
+
+    def close_all(self):
+        with self._lock:
+            sessions = [m for idle in self._idle.values() for m, _ in idle]
+            self._idle = {}
+        for m in sessions:
+            self._close(m)
+
+
+session_pool = NetconfSessionPool()
+
+
+# Compiled once: XPath expressions for the leaves we read from replies
+IF_NS = {"if": "urn:ietf:params:xml:ns:yang:ietf-interfaces"}
+XPATH_STATE_INTERFACES = etree.XPath("//if:interfaces-state/if:interface", namespaces=IF_NS)
+XPATH_NAME = etree.XPath("string(if:name)", namespaces=IF_NS)
+XPATH_ADMIN_STATUS = etree.XPath("string(if:admin-status)", namespaces=IF_NS)
+XPATH_OPER_STATUS = etree.XPath("string(if:oper-status)", namespaces=IF_NS)
+
+
+def reply_errors(reply):
+    """
+    <rpc-error>s of a reply (or of a raised RPCError) as a list of dicts
+
+    Each dict has "type", "tag", "severity", "path" and "message". ncclient
+    has already parsed them from the reply tree, so nothing is re-parsed.
+    """
+    if isinstance(reply, RPCError):
+        errors = getattr(reply, "errors", None) or [reply]
+    else:
+        errors = getattr(reply, "errors", [])
+    return [
+        {
+            "type": error.type,
+            "tag": error.tag,
+            "severity": error.severity,
+            "path": error.path,
+            "message": error.message,
+        }
+        for error in errors
+    ]
+
+
+def interface_states(reply):
+    """
+    Read name, admin-status and oper-status of every interface in a get reply
+
+    Works on the element tree ncclient already built (reply.data_ele), only
+    the three leaves are extracted. Returns a list of dicts.
+    """
+    with metrics.timed("reply_parse", "netconf"):
+        return [
+            {
+                "name": XPATH_NAME(interface),
+                "admin-status": XPATH_ADMIN_STATUS(interface) or "down",
+                "oper-status": XPATH_OPER_STATUS(interface) or "down",
+            }
+            for interface in XPATH_STATE_INTERFACES(reply.data_ele)
+        ]
+
+
+def _print_errors(error):
+    for e in reply_errors(error):
+        print(f"Error: {e['tag']} ({e['severity']}): {e['message']} {e['path'] or ''}".rstrip())
+
+
+@status_cache.invalidates
+def create(router_ip, number=DEFAULT_LOOPBACK, ip=None, netmask="255.255.255.0"):
+    loopback = loopback_params(number, ip, netmask)
+    netconf_config = NETCONF_CREATE.render(enabled=True, **loopback)
+
     try:
-        netconf_reply = m.edit_config(target="running", config=netconf_config)
-        xml_data = netconf_reply.xml
-        print(xml_data)
-        m.close_session()
-        if '<ok/>' in xml_data:
-            return "Interface loopback 66070077 is created successfully using Netconf"
+        netconf_reply = session_pool.run(
+            router_ip, lambda m: m.edit_config(target="running", config=netconf_config)
+        )
+        if netconf_reply.ok:
+            return f"Interface loopback {number} is created successfully using Netconf"
         else:
-            return "Cannot create: Interface loopback 66070077 (checked by Netconf)"
+            _print_errors(netconf_reply)
+            return f"Cannot create: Interface loopback {number} (checked by Netconf)"
+    except RPCError as e:
+        _print_errors(e)
+        return f"Cannot create: Interface loopback {number} (checked by Netconf)"
     except Exception as e:
         print(f"Error: {e}")
-        return "Cannot create: Interface loopback 66070077 (checked by Netconf)"
-
-
-def delete(router_ip):
-    # Connect to the router
-    m = manager.connect(
-        host=router_ip,
-        port=830,
-        username="admin",
-        password="cisco",
-        hostkey_verify=False
-    )
-    
-    netconf_config = """
-    <config>
-        <interfaces xmlns="urn:ietf:params:xml:ns:yang:ietf-interfaces">
-            <interface operation="delete">
-                <name>Loopback66070077</name>
-            </interface>
-        </interfaces>
-    </config>
-    """
+        return f"Cannot create: Interface loopback {number} (checked by Netconf)"
+
+
+@status_cache.invalidates
+def delete(router_ip, number=DEFAULT_LOOPBACK):
+    netconf_config = NETCONF_DELETE.render(**loopback_params(number))
 
     try:
-        netconf_reply = m.edit_config(target="running", config=netconf_config)
-        xml_data = netconf_reply.xml
-        print(xml_data)
-        m.close_session()
-        if '<ok/>' in xml_data:
-            return "Interface loopback 66070077 is deleted successfully using Netconf"
+        netconf_reply = session_pool.run(
+            router_ip, lambda m: m.edit_config(target="running", config=netconf_config)
+        )
+        if netconf_reply.ok:
+            return f"Interface loopback {number} is deleted successfully using Netconf"
         else:
-            return "Cannot delete: Interface loopback 66070077 (checked by Netconf)"
+            _print_errors(netconf_reply)
+            return f"Cannot delete: Interface loopback {number} (checked by Netconf)"
+    except RPCError as e:
+        _print_errors(e)
+        return f"Cannot delete: Interface loopback {number} (checked by Netconf)"
     except Exception as e:
         print(f"Error: {e}")
-        return "Cannot delete: Interface loopback 66070077 (checked by Netconf)"
-
-
-def enable(router_ip):
-    # Connect to the router
-    m = manager.connect(
-        host=router_ip,
-        port=830,
-        username="admin",
-        password="cisco",
-        hostkey_verify=False
-    )
-    
-    netconf_config = """
-    <config>
-        <interfaces xmlns="urn:ietf:params:xml:ns:yang:ietf-interfaces">
-            <interface>
-                <name>Loopback66070077</name>
-                <enabled>true</enabled>
-            </interface>
-        </interfaces>
-    </config>
-    """
+        return f"Cannot delete: Interface loopback {number} (checked by Netconf)"
+
+
+@status_cache.invalidates
+def enable(router_ip, number=DEFAULT_LOOPBACK):
+    netconf_config = NETCONF_SET_ENABLED.render(enabled=True, **loopback_params(number))
 
     try:
-        netconf_reply = m.edit_config(target="running", config=netconf_config)
-        xml_data = netconf_reply.xml
-        print(xml_data)
-        m.close_session()
-        if '<ok/>' in xml_data:
-            return "Interface loopback 66070077 is enabled successfully using Netconf"
+        netconf_reply = session_pool.run(
+            router_ip, lambda m: m.edit_config(target="running", config=netconf_config)
+        )
+        if netconf_reply.ok:
+            return f"Interface loopback {number} is enabled successfully using Netconf"
         else:
-            return "Cannot enable: Interface loopback 66070077 (checked by Netconf)"
+            _print_errors(netconf_reply)
+            return f"Cannot enable: Interface loopback {number} (checked by Netconf)"
+    except RPCError as e:
+        _print_errors(e)
+        return f"Cannot enable: Interface loopback {number} (checked by Netconf)"
     except Exception as e:
         print(f"Error: {e}")
-        return "Cannot enable: Interface loopback 66070077 (checked by Netconf)"
-
-
-def disable(router_ip):
-    # Connect to the router
-    m = manager.connect(
-        host=router_ip,
-        port=830,
-        username="admin",
-        password="cisco",
-        hostkey_verify=False
-    )
-    
-    netconf_config = """
-    <config>
-        <interfaces xmlns="urn:ietf:params:xml:ns:yang:ietf-interfaces">
-            <interface>
-                <name>Loopback66070077</name>
-                <enabled>false</enabled>
-            </interface>
-        </interfaces>
-    </config>
-    """
+        return f"Cannot enable: Interface loopback {number} (checked by Netconf)"
+
+
+@status_cache.invalidates
+def disable(router_ip, number=DEFAULT_LOOPBACK):
+    netconf_config = NETCONF_SET_ENABLED.render(enabled=False, **loopback_params(number))
 
     try:
-        netconf_reply = m.edit_config(target="running", config=netconf_config)
-        xml_data = netconf_reply.xml
-        print(xml_data)
-        m.close_session()
-        if '<ok/>' in xml_data:
-            return "Interface loopback 66070077 is shutdowned successfully using Netconf"
+        netconf_reply = session_pool.run(
+            router_ip, lambda m: m.edit_config(target="running", config=netconf_config)
+        )
+        if netconf_reply.ok:
+            return f"Interface loopback {number} is shutdowned successfully using Netconf"
         else:
-            return "Cannot shutdown: Interface loopback 66070077 (checked by Netconf)"
+            _print_errors(netconf_reply)
+            return f"Cannot shutdown: Interface loopback {number} (checked by Netconf)"
+    except RPCError as e:
+        _print_errors(e)
+        return f"Cannot shutdown: Interface loopback {number} (checked by Netconf)"
     except Exception as e:
         print(f"Error: {e}")
-        return "Cannot shutdown: Interface loopback 66070077 (checked by Netconf)"
-
-
-def status(router_ip):
-    # Connect to the router
-    m = manager.connect(
-        host=router_ip,
-        port=830,
-        username="admin",
-        password="cisco",
-        hostkey_verify=False
-    )
-    
-    netconf_filter = """
-    <filter>
-        <interfaces-state xmlns="urn:ietf:params:xml:ns:yang:ietf-interfaces">
-            <interface>
-                <name>Loopback66070077</name>
-            </interface>
-        </interfaces-state>
-    </filter>
+        return f"Cannot shutdown: Interface loopback {number} (checked by Netconf)"
+
+
+def status(router_ip, number=DEFAULT_LOOPBACK):
+    try:
+        return _status(router_ip, number)
+    except Exception as e:
+        # errors are not cached, the next status asks the router again
+        print(f"Error: {e}")
+        return f"No Interface loopback {number} (checked by Netconf)"
+
+
+@status_cache.cached("netconf_status")
+def _status(router_ip, number):
+    netconf_filter = NETCONF_STATUS_FILTER.render(**loopback_params(number))
+
+    # Use Netconf get operation to get interfaces-state information
+    netconf_reply = session_pool.run(router_ip, lambda m: m.get(filter=netconf_filter))
+    interfaces = interface_states(netconf_reply)
+
+    # if the reply has the interface, the operation-state of interface loopback is returned
+    if interfaces:
+        admin_status = interfaces[0]['admin-status']
+        oper_status = interfaces[0]['oper-status']
+
+        if admin_status == 'up' and oper_status == 'up':
+            return f"Interface loopback {number} is enabled (checked by Netconf)"
+        elif admin_status == 'down' and oper_status == 'down':
+            return f"Interface loopback {number} is disabled (checked by Netconf)"
+    else: # no operation-state data
+        return f"No Interface loopback {number} (checked by Netconf)"
+
+
+def all_interface_states(router_ip):
+    """
+    Name, admin-status and oper-status of every interface in one <get>
+
+    The subtree filter selects only these three leaves. Returns a list of
+    dicts like interface_states(); raises on errors so callers can fall back.
     """
+    netconf_reply = session_pool.run(router_ip, lambda m: m.get(filter=NETCONF_ALL_STATES_FILTER.render()))
+    return interface_states(netconf_reply)
+
+
+@status_cache.invalidates
+def transaction(router_ip, configs, confirmed=False, confirm_timeout=120, persist=None):
+    """
+    Apply several <config> fragments as one all-or-nothing change
+
+    On devices with :candidate the candidate datastore is locked, every
+    fragment is edited into it, the result is validated (when :validate is
+    supported) and committed once, optionally as a confirmed commit that the
+    device rolls back unless confirm_commit() follows within confirm_timeout
+    seconds. Devices without :candidate get the edits on a locked running
+    datastore instead, which is not all-or-nothing.
+
+    A confirmed commit always carries a persist id. Without one the device
+    only accepts the confirming commit on the same session and rolls back
+    when that session closes, and pooled sessions are neither pinned nor
+    kept open.
+
+    Args:
+        router_ip: IP address of the router
+        configs: list of <config> XML strings
+        confirmed: use a confirmed commit
+        confirm_timeout: seconds before an unconfirmed commit is rolled back
+        persist: persist id of the confirmed commit (default: a new random id)
+
+    Returns:
+        Dict {"ok": bool, "target": datastore, "confirmed": bool,
+        "persist": persist id to pass to confirm_commit()/cancel_commit(),
+        "error": str or None, "errors": list from reply_errors()}
+    """
+    if confirmed and persist is None:
+        persist = uuid.uuid4().hex
+    result = {"ok": False, "target": None, "confirmed": False, "persist": persist if confirmed else None,
+              "error": None, "errors": []}
+
+    def run(m):
+        has_candidate = ":candidate" in m.server_capabilities
+        target = "candidate" if has_candidate else "running"
+        result["target"] = target
+        if confirmed and not (has_candidate and ":confirmed-commit:1.1" in m.server_capabilities):
+            # checked before anything is locked or edited; <persist> needs 1.1
+            result["error"] = f"{router_ip} does not support confirmed commits (:candidate and :confirmed-commit:1.1)"
+            print(f"Error: {result['error']}")
+            return
+
+        with m.locked(target):
+            try:
+                for config in configs:
+                    m.edit_config(target=target, config=config)
+                if has_candidate:
+                    if ":validate" in m.server_capabilities:
+                        m.validate(source="candidate")
+                    if confirmed:
+                        m.commit(confirmed=True, timeout=str(confirm_timeout), persist=persist)
+                        result["confirmed"] = True
+                    else:
+                        m.commit()
+            except Exception:
+                # leave nothing half done in the shared candidate datastore
+                if has_candidate:
+                    try:
+                        m.discard_changes()
+                    except Exception as e:
+                        print(f"Error discarding candidate changes: {e}")
+                raise
+        result["ok"] = True
+
+    try:
+        session_pool.run(router_ip, run)
+    except RPCError as e:
+        _print_errors(e)
+        result["error"] = str(e)
+        result["errors"] = reply_errors(e)
+    except Exception as e:
+        print(f"Error: {e}")
+        result["error"] = str(e)
+    return result
+
+
+@status_cache.invalidates
+def confirm_commit(router_ip, persist):
+    """Confirm a pending confirmed commit (persist: the "persist" of the transaction result)"""
+    try:
+        reply = session_pool.run(router_ip, lambda m: m.commit(persist_id=persist))
+        return reply.ok
+    except Exception as e:
+        print(f"Error: {e}")
+        return False
+
 
+@status_cache.invalidates
+def cancel_commit(router_ip, persist):
+    """Roll back a pending confirmed commit right away (persist as for confirm_commit)"""
     try:
-        # Use Netconf get operation to get interfaces-state information
-        netconf_reply = m.get(filter=netconf_filter)
-        print(netconf_reply)
-        netconf_reply_dict = xmltodict.parse(netconf_reply.xml)
-        m.close_session()
-
-        # if there data return from netconf_reply_dict is not null, the operation-state of interface loopback is returned
-        if netconf_reply_dict.get('rpc-reply', {}).get('data', {}).get('interfaces-state', {}).get('interface'):
-            # extract admin_status and oper_status from netconf_reply_dict
-            interface_data = netconf_reply_dict['rpc-reply']['data']['interfaces-state']['interface']
-            admin_status = interface_data.get('admin-status', 'down')
-            oper_status = interface_data.get('oper-status', 'down')
-            
-            if admin_status == 'up' and oper_status == 'up':
-                return "Interface loopback 66070077 is enabled (checked by Netconf)"
-            elif admin_status == 'down' and oper_status == 'down':
-                return "Interface loopback 66070077 is disabled (checked by Netconf)"
-        else: # no operation-state data
-            return "No Interface loopback 66070077 (checked by Netconf)"
+        reply = session_pool.run(router_ip, lambda m: m.cancel_commit(persist_id=persist))
+        return reply.ok
     except Exception as e:
         print(f"Error: {e}")
-        return "No Interface loopback 66070077 (checked by Netconf)"
+        return False
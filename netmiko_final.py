@@ -1,51 +1,239 @@
-from netmiko import ConnectHandler
 from pprint import pprint
-from textfsm import TextFSM
+from contextlib import contextmanager
+import threading
+import time
 import re
 import os
-import io
+import status_cache
+import inventory
+import metrics
+import parsers
+import backends
+
+# netmiko is loaded with the first SSH channel, the model-driven backends
+# when gigabit_status first reads over them
+netmiko = backends.lazy("netmiko")
+restconf_final = backends.lazy("restconf_final")
+netconf_final = backends.lazy("netconf_final")
 
 username = "admin"
 password = "cisco"
 
+# Close SSH channels that were not used for this many seconds
+IDLE_TIMEOUT = float(os.environ.get("NETMIKO_IDLE_TIMEOUT", 120))
+SSH_PORT = int(os.environ.get("NETMIKO_PORT", 22))
 
-def gigabit_status(router_ip):
-    device_params = {
-        "device_type": "cisco_ios",
-        "ip": router_ip,
-        "username": username,
-        "password": password,
-    }
-    
-    ans = ""
+# Banner delimiters tried when TextFSM finds no MOTD (compiled once)
+MOTD_PATTERNS = [
+    re.compile(r'banner motd\s+\^C(.*?)\^C', re.DOTALL),  # ^C delimiter
+    re.compile(r'banner motd\s+@(.*?)@', re.DOTALL),       # @ delimiter
+    re.compile(r'banner motd\s+\$(.*?)\$', re.DOTALL),     # $ delimiter
+]
+
+# Where gigabit_status reads interface states: restconf, netconf or cli
+GIGABIT_STATUS_BACKEND = os.environ.get("GIGABIT_STATUS_BACKEND", "restconf")
+
+
+class NetmikoConnectionManager:
+    """
+    Keep one authenticated Netmiko channel per router
+
+    Login, prompt discovery and paging setup are done once per router. A
+    channel is validated with a prompt check before reuse, only one command
+    runs on a channel at a time, and channels idle for longer than
+    idle_timeout seconds are disconnected.
+    """
+
+    def __init__(self, idle_timeout=IDLE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._channels = {}  # router_ip -> {"conn", "lock", "last_used"}
+        self._reaper = None
+
+    def _device_params(self, router_ip):
+        return {
+            "device_type": "cisco_ios",
+            "ip": inventory.device_address(router_ip),
+            "port": SSH_PORT,
+            "username": username,
+            "password": password,
+        }
+
+    def _channel(self, router_ip):
+        with self._lock:
+            if router_ip not in self._channels:
+                self._channels[router_ip] = {"conn": None, "lock": threading.Lock(), "last_used": 0}
+            return self._channels[router_ip]
+
+    def _is_alive(self, conn):
+        try:
+            return conn.is_alive() and bool(conn.find_prompt())
+        except Exception:
+            return False
+
+    def _disconnect(self, channel):
+        conn = channel["conn"]
+        channel["conn"] = None
+        if conn is not None:
+            try:
+                conn.disconnect()
+            except Exception as e:
+                print(f"Error closing SSH channel: {e}")
+
+    @contextmanager
+    def connection(self, router_ip):
+        """Borrow the SSH channel of router_ip, opening or replacing it when needed"""
+        channel = self._channel(router_ip)
+        with channel["lock"]:
+            conn = channel["conn"]
+            if conn is not None:
+                idle = time.monotonic() - channel["last_used"]
+                if idle >= self.idle_timeout or not self._is_alive(conn):
+                    self._disconnect(channel)
+            if channel["conn"] is None:
+                print(f"Opening SSH channel to {router_ip}")
+                try:
+                    with metrics.timed("connect", "cli"):
+                        channel["conn"] = netmiko.ConnectHandler(**self._device_params(router_ip))
+                except Exception:
+                    metrics.device_errors_total.inc(backend="cli", reason="connect")
+                    raise
+                metrics.connections_total.inc(backend="cli", outcome="opened")
+            else:
+                metrics.connections_total.inc(backend="cli", outcome="reused")
+            try:
+                yield channel["conn"]
+            except Exception:
+                # The channel may be left in an unknown state, do not reuse it
+                metrics.device_errors_total.inc(backend="cli", reason="channel")
+                self._disconnect(channel)
+                raise
+            finally:
+                channel["last_used"] = time.monotonic()
+        self._start_reaper()
+
+    def _start_reaper(self):
+        with self._lock:
+            if self._reaper is not None:
+                return
+            self._reaper = threading.Thread(target=self._reap_forever, daemon=True)
+        self._reaper.start()
+
+    def _reap_forever(self):
+        while True:
+            time.sleep(max(self.idle_timeout / 2, 1))
+            self.evict_idle()
+
+    def evict_idle(self):
+        """Disconnect channels idle for longer than idle_timeout"""
+        with self._lock:
+            channels = list(self._channels.values())
+        for channel in channels:
+            # skip channels that are busy right now
+            if not channel["lock"].acquire(blocking=False):
+                continue
+            try:
+                if channel["conn"] is not None and time.monotonic() - channel["last_used"] >= self.idle_timeout:
+                    self._disconnect(channel)
+            finally:
+                channel["lock"].release()
+
+    def close_all(self):
+        with self._lock:
+            channels = list(self._channels.values())
+        for channel in channels:
+            with channel["lock"]:
+                self._disconnect(channel)
+
+
+connections = NetmikoConnectionManager()
+
+
+def send_command(ssh, command, **kwargs):
+    """ssh.send_command(), timed as the rpc phase of the cli backend"""
+    with metrics.timed("rpc", "cli"):
+        return ssh.send_command(command, **kwargs)
+
+
+def gigabit_summary(interfaces):
+    """
+    Build the gigabit_status reply from (interface name, status) pairs
+
+    e.g. "GigabitEthernet1 up, GigabitEthernet2 down -> 1 up, 1 down, 0 administratively down"
+    """
     interface_list = []
-    with ConnectHandler(**device_params) as ssh:
-        up = 0
-        down = 0
-        admin_down = 0
-        result = ssh.send_command("show ip interface brief", use_textfsm=True)
-        
-        # Debug: print first item to see the keys
-        if result and len(result) > 0:
-            print("Available keys:", result[0].keys() if isinstance(result[0], dict) else "Not a dict")
-        
+    up = 0
+    down = 0
+    admin_down = 0
+    for interface_name, status in interfaces:
+        if interface_name.startswith("GigabitEthernet"):
+            interface_list.append(f"{interface_name} {status}")
+            if status == "up":
+                up += 1
+            elif status == "down":
+                down += 1
+            elif status == "administratively down":
+                admin_down += 1
+
+    return ", ".join(interface_list) + f" -> {up} up, {down} down, {admin_down} administratively down"
+
+
+def _cli_status(admin_status, oper_status):
+    # same wording as the Status column of "show ip interface brief"
+    if admin_status == "down":
+        return "administratively down"
+    return "up" if oper_status == "up" else "down"
+
+
+def _gigabit_interfaces_model(router_ip, backend):
+    """(name, status) pairs from ietf-interfaces oper data in one RESTCONF/NETCONF request"""
+    if backend == "restconf":
+        states = restconf_final.all_interface_states(router_ip)
+    else:
+        states = netconf_final.all_interface_states(router_ip)
+    return [(s["name"], _cli_status(s["admin-status"], s["oper-status"])) for s in states]
+
+
+def _gigabit_interfaces_cli(router_ip):
+    """(name, status) pairs scraped from "show ip interface brief" over SSH"""
+    interfaces = []
+    with connections.connection(router_ip) as ssh:
+        output = send_command(ssh, "show ip interface brief")
+        if parsers.registry.has("cisco_ios_show_ip_interface_brief"):
+            result = parsers.registry.parse("cisco_ios_show_ip_interface_brief", output)
+        else:
+            # ntc-templates not installed where expected, let Netmiko find a template
+            result = send_command(ssh, "show ip interface brief", use_textfsm=True)
+
         for interface in result:
             # Try different possible key names
             interface_name = interface.get("intf") or interface.get("interface") or interface.get("name") or ""
             status = interface.get("status") or interface.get("proto") or ""
-            
-            if interface_name.startswith("GigabitEthernet"):
-                interface_list.append(f"{interface_name} {status}")
-                if status == "up":
-                    up += 1
-                elif status == "down":
-                    down += 1
-                elif status == "administratively down":
-                    admin_down += 1
-        
-        ans = ", ".join(interface_list) + f" -> {up} up, {down} down, {admin_down} administratively down"
-        pprint(ans)
-        return ans
+            interfaces.append((interface_name, status))
+    return interfaces
+
+
+@status_cache.cached("gigabit_status")
+def gigabit_status(router_ip):
+    """
+    Summarize the GigabitEthernet interfaces of a router
+
+    The model-driven backend (GIGABIT_STATUS_BACKEND: restconf or netconf)
+    is tried first, the CLI/TextFSM path is the fallback.
+    """
+    interfaces = None
+    if GIGABIT_STATUS_BACKEND in ("restconf", "netconf"):
+        try:
+            interfaces = _gigabit_interfaces_model(router_ip, GIGABIT_STATUS_BACKEND)
+        except Exception as e:
+            print(f"Error reading interfaces over {GIGABIT_STATUS_BACKEND} ({e}), falling back to CLI")
+
+    if interfaces is None:
+        interfaces = _gigabit_interfaces_cli(router_ip)
+
+    ans = gigabit_summary(interfaces)
+    pprint(ans)
+    return ans
 
 
 def motd_read(router_ip):
@@ -58,39 +246,27 @@ def motd_read(router_ip):
     Returns:
         MOTD banner text or error message
     """
-    device_params = {
-        "device_type": "cisco_ios",
-        "ip": router_ip,
-        "username": username,
-        "password": password,
-    }
-    
     try:
-        with ConnectHandler(**device_params) as ssh:
+        with connections.connection(router_ip) as ssh:
             # Get MOTD using 'show banner motd' command
-            output = ssh.send_command("show banner motd")
+            output = send_command(ssh, "show banner motd")
             
             # Check if output exists
             if not output or not output.strip():
                 return "No MOTD banner configured"
             
-            # Use TextFSM to parse the MOTD
-            template_path = os.path.join(os.path.dirname(__file__), 'cisco_ios_show_banner_motd.textfsm')
-            
-            # Check if template file exists
-            if os.path.exists(template_path):
-                with open(template_path) as template_file:
-                    fsm = TextFSM(template_file)
-                    result = fsm.ParseText(output)
-                    
-                    # Extract MOTD from parsed result
-                    if result and len(result) > 0 and len(result[0]) > 0:
-                        motd_text = result[0][0].strip()
-                        if motd_text:
-                            return motd_text
+            # Use the precompiled TextFSM template to parse the MOTD
+            if parsers.registry.has("cisco_ios_show_banner_motd"):
+                result = parsers.registry.parse_rows("cisco_ios_show_banner_motd", output)
+
+                # Extract MOTD from parsed result
+                if result and len(result) > 0 and len(result[0]) > 0:
+                    motd_text = result[0][0].strip()
+                    if motd_text:
+                        return motd_text
             else:
                 # Fallback: if template doesn't exist, use simple text parsing
-                print(f"TextFSM template not found at {template_path}, using fallback")
+                print("TextFSM template cisco_ios_show_banner_motd.textfsm not found, using fallback")
                 motd_text = output.strip()
                 # Clean up and preserve spaces between words
                 motd_text = ' '.join(motd_text.split())
@@ -98,20 +274,14 @@ def motd_read(router_ip):
                     return motd_text
             
             # If TextFSM parsing fails, try fallback with running-config
-            output = ssh.send_command("show running-config | section banner motd")
+            output = send_command(ssh, "show running-config | section banner motd")
             
             if not output or "banner motd" not in output:
                 return "No MOTD banner configured"
             
             # Parse MOTD content between delimiters using regex as fallback
-            patterns = [
-                r'banner motd\s+\^C(.*?)\^C',  # ^C delimiter
-                r'banner motd\s+@(.*?)@',       # @ delimiter
-                r'banner motd\s+\$(.*?)\$',     # $ delimiter
-            ]
-            
-            for pattern in patterns:
-                match = re.search(pattern, output, re.DOTALL)
+            for pattern in MOTD_PATTERNS:
+                match = pattern.search(output)
                 if match:
                     motd_text = match.group(1).strip()
                     motd_text = ' '.join(motd_text.split())
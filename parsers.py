@@ -0,0 +1,76 @@
+import io
+import os
+import threading
+from textfsm import TextFSM
+import metrics
+
+TEMPLATE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _ntc_template(name):
+    """Path of a template shipped with ntc-templates, or None if not installed"""
+    try:
+        import ntc_templates
+    except ImportError:
+        return None
+    path = os.path.join(os.path.dirname(ntc_templates.__file__), "templates", name + ".textfsm")
+    return path if os.path.exists(path) else None
+
+
+class ParserRegistry:
+    """
+    TextFSM templates that are read and compiled once
+
+    Template files are read into memory when registered. The first parse on
+    a thread compiles a TextFSM object for that thread; later parses only
+    Reset() it, which gives fresh FSM state without compiling the template
+    again. TextFSM objects hold their state while parsing, so they are never
+    shared between threads.
+    """
+
+    def __init__(self):
+        self._sources = {}  # name -> template text
+        self._local = threading.local()
+
+    def register(self, name, path):
+        if path is None or not os.path.exists(path):
+            return False
+        with open(path) as template_file:
+            self._sources[name] = template_file.read()
+        return True
+
+    def has(self, name):
+        return name in self._sources
+
+    def _fsm(self, name):
+        fsms = getattr(self._local, "fsms", None)
+        if fsms is None:
+            fsms = self._local.fsms = {}
+        fsm = fsms.get(name)
+        if fsm is None:
+            fsm = fsms[name] = TextFSM(io.StringIO(self._sources[name]))
+        else:
+            fsm.Reset()
+        return fsm
+
+    def parse_rows(self, name, text):
+        """Parse text with template name, returns a list of value lists"""
+        with metrics.timed("reply_parse", "cli"):
+            return self._fsm(name).ParseText(text)
+
+    def parse(self, name, text):
+        """Parse text with template name, returns a list of dicts with lower-case keys"""
+        with metrics.timed("reply_parse", "cli"):
+            fsm = self._fsm(name)
+            header = [h.lower() for h in fsm.header]
+            return [dict(zip(header, row)) for row in fsm.ParseText(text)]
+
+    def warm_up(self):
+        """Compile every registered template on the calling thread"""
+        for name in self._sources:
+            self._fsm(name)
+
+
+registry = ParserRegistry()
+registry.register("cisco_ios_show_banner_motd", os.path.join(TEMPLATE_DIR, "cisco_ios_show_banner_motd.textfsm"))
+registry.register("cisco_ios_show_ip_interface_brief", _ntc_template("cisco_ios_show_ip_interface_brief"))
@@ -0,0 +1,161 @@
+import json
+import re
+from xml.sax.saxutils import escape
+
+# Student ID loopback used when a command does not name another one
+DEFAULT_LOOPBACK = "66070077"
+
+SLOT = re.compile(r"\$\{(\w+)\}")
+
+
+def xml_value(value):
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return escape(str(value))
+
+
+def json_value(value):
+    return json.dumps(value)
+
+
+class CompiledTemplate:
+    """
+    Payload skeleton with ${name} slots, parsed once
+
+    The text is split into literal pieces and slot names when the template is
+    created; render() only joins the pieces with the escaped values, so
+    generating many payloads never parses the template again.
+    """
+
+    def __init__(self, text, quote):
+        pieces = SLOT.split(text)
+        # SLOT.split alternates literal, slot name, literal, slot name, ...
+        self.literals = pieces[0::2]
+        self.slots = pieces[1::2]
+        self.quote = quote
+
+    def render(self, **values):
+        out = [self.literals[0]]
+        for slot, literal in zip(self.slots, self.literals[1:]):
+            out.append(self.quote(values[slot]))
+            out.append(literal)
+        return "".join(out)
+
+
+def xml_template(text):
+    return CompiledTemplate(text, xml_value)
+
+
+def json_template(text):
+    return CompiledTemplate(text, json_value)
+
+
+def loopback_params(number=DEFAULT_LOOPBACK, ip=None, netmask="255.255.255.0", description=None):
+    """
+    Fill in the values of a loopback interface
+
+    The default address follows the 172.x.y.1 rule of the assignment: x is
+    the third last digit of the loopback number and y the last two digits,
+    e.g. Loopback66070077 -> 172.0.77.1.
+    """
+    number = str(number)
+    if ip is None:
+        digits = number.zfill(3)[-3:]
+        ip = f"172.{int(digits[0])}.{int(digits[1:])}.1"
+    return {
+        "number": number,
+        "name": f"Loopback{number}",
+        "ip": ip,
+        "netmask": netmask,
+        "description": description or f"Loopback Interface {number}",
+    }
+
+
+# NETCONF <config> and <filter> payloads
+NETCONF_CREATE = xml_template("""
+    <config>
+        <interfaces xmlns="urn:ietf:params:xml:ns:yang:ietf-interfaces">
+            <interface>
+                <name>${name}</name>
+                <description>${description}</description>
+                <type xmlns:ianaift="urn:ietf:params:xml:ns:yang:iana-if-type">ianaift:softwareLoopback</type>
+                <enabled>${enabled}</enabled>
+                <ipv4 xmlns="urn:ietf:params:xml:ns:yang:ietf-ip">
+                    <address>
+                        <ip>${ip}</ip>
+                        <netmask>${netmask}</netmask>
+                    </address>
+                </ipv4>
+            </interface>
+        </interfaces>
+    </config>
+    """)
+
+NETCONF_DELETE = xml_template("""
+    <config>
+        <interfaces xmlns="urn:ietf:params:xml:ns:yang:ietf-interfaces">
+            <interface operation="delete">
+                <name>${name}</name>
+            </interface>
+        </interfaces>
+    </config>
+    """)
+
+NETCONF_SET_ENABLED = xml_template("""
+    <config>
+        <interfaces xmlns="urn:ietf:params:xml:ns:yang:ietf-interfaces">
+            <interface>
+                <name>${name}</name>
+                <enabled>${enabled}</enabled>
+            </interface>
+        </interfaces>
+    </config>
+    """)
+
+NETCONF_STATUS_FILTER = xml_template("""
+    <filter>
+        <interfaces-state xmlns="urn:ietf:params:xml:ns:yang:ietf-interfaces">
+            <interface>
+                <name>${name}</name>
+            </interface>
+        </interfaces-state>
+    </filter>
+    """)
+
+NETCONF_ALL_STATES_FILTER = xml_template("""
+    <filter>
+        <interfaces-state xmlns="urn:ietf:params:xml:ns:yang:ietf-interfaces">
+            <interface>
+                <name/>
+                <admin-status/>
+                <oper-status/>
+            </interface>
+        </interfaces-state>
+    </filter>
+    """)
+
+# RESTCONF yang-data+json bodies
+RESTCONF_CREATE = json_template("""{
+    "ietf-interfaces:interface": {
+        "name": ${name},
+        "description": ${description},
+        "type": "iana-if-type:softwareLoopback",
+        "enabled": ${enabled},
+        "ietf-ip:ipv4": {
+            "address": [
+                {
+                    "ip": ${ip},
+                    "netmask": ${netmask}
+                }
+            ]
+        }
+    }
+}""")
+
+RESTCONF_SET_ENABLED = json_template("""{
+    "ietf-interfaces:interface": {
+        "name": ${name},
+        "type": "iana-if-type:softwareLoopback",
+        "enabled": ${enabled}
+    }
+}""")
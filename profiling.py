@@ -0,0 +1,174 @@
+"""
+Opt-in cProfile of bot commands
+
+IPA_PROFILE=all profiles every command, IPA_PROFILE=showrun,status only
+those commands. Each run is saved as profiles/<command>-<method>-<router>-<time>.prof
+and profiles/summary.txt keeps the top IPA_PROFILE_TOP functions of every
+command over all its runs. Without IPA_PROFILE nothing is wrapped.
+
+Saved profiles can be summarized again later, also across restarts:
+
+    python profiling.py [--top 30] [--sort tottime] [--command showrun] [profiles]
+"""
+import argparse
+import cProfile
+import functools
+import glob
+import io
+import itertools
+import os
+import pstats
+import re
+import threading
+import time
+
+# "all", or comma separated command names to profile (empty: profiling off)
+PROFILE_COMMANDS = os.environ.get("IPA_PROFILE", "").strip()
+PROFILE_DIR = os.environ.get(
+    "IPA_PROFILE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "profiles"),
+)
+# Functions listed per command in summary.txt, and how they are sorted
+PROFILE_TOP = int(os.environ.get("IPA_PROFILE_TOP", 25))
+PROFILE_SORT = os.environ.get("IPA_PROFILE_SORT", "cumulative")
+
+ENABLED = PROFILE_COMMANDS.lower() not in ("", "0", "false", "no", "off")
+
+
+def _wanted(command):
+    if PROFILE_COMMANDS.lower() in ("1", "all", "true", "yes"):
+        return True
+    return command in [c.strip() for c in PROFILE_COMMANDS.split(",")]
+
+
+def _safe(text):
+    return re.sub(r"[^\w.-]", "_", str(text))
+
+
+class CommandProfiler:
+    """
+    Run calls under cProfile and keep their stats per (command, method)
+
+    cProfile only sees the thread it runs in, so the time a command spends
+    waiting for a transport thread (e.g. ncclient's SSH reader) shows up as
+    the wait in the command thread.
+    """
+
+    def __init__(self, directory=PROFILE_DIR, top=PROFILE_TOP, sort=PROFILE_SORT):
+        self.directory = directory
+        self.top = top
+        self.sort = sort
+        self._lock = threading.Lock()
+        self._stats = {}  # (command, method) -> pstats.Stats over all runs
+        self._runs = {}   # (command, method) -> [number of runs, total seconds]
+        self._ids = itertools.count(1)
+
+    def run(self, command, method, router_ip, function, *args, **kwargs):
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as e:
+            # Python 3.12+ allows one active profiler, another command has it
+            print(f"Not profiling {command} on {router_ip}: {e}")
+            return function(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            profiler.disable()
+            self._save(command, method, router_ip, profiler, time.perf_counter() - start)
+
+    def _save(self, command, method, router_ip, profiler, seconds):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            stamp = time.strftime("%Y%m%d-%H%M%S")
+            filename = f"{_safe(command)}-{_safe(method)}-{_safe(router_ip)}-{stamp}-{next(self._ids)}.prof"
+            path = os.path.join(self.directory, filename)
+            profiler.dump_stats(path)
+            print(f"Profiled {command} ({method}) on {router_ip}: {seconds * 1000:.1f} ms -> {path}")
+
+            key = (command, method)
+            with self._lock:
+                if key in self._stats:
+                    self._stats[key].add(profiler)
+                else:
+                    self._stats[key] = pstats.Stats(profiler)
+                runs = self._runs.setdefault(key, [0, 0.0])
+                runs[0] += 1
+                runs[1] += seconds
+                self._write_summary()
+        except Exception as e:
+            print(f"Error saving profile of {command}: {e}")
+
+    def _write_summary(self):
+        sections = []
+        for (command, method), stats in sorted(self._stats.items()):
+            count, total = self._runs[(command, method)]
+            title = f"{command} ({method}): {count} runs, {total / count * 1000:.1f} ms average"
+            sections.append(top_functions(stats, title, self.top, self.sort))
+        tmp_path = os.path.join(self.directory, "summary.txt.tmp")
+        with open(tmp_path, "w") as f:
+            f.write("\n".join(sections))
+        os.replace(tmp_path, os.path.join(self.directory, "summary.txt"))
+
+
+def top_functions(stats, title, top=PROFILE_TOP, sort=PROFILE_SORT):
+    """The top functions of a pstats.Stats as text, under a title line"""
+    stream = io.StringIO()
+    stats.stream = stream
+    # the title already says how many runs, not every file name
+    stats.files = []
+    stats.sort_stats(sort).print_stats(top)
+    return f"== {title}\n{stream.getvalue()}"
+
+
+profiler = CommandProfiler()
+
+
+def profiled(key):
+    """
+    Decorator profiling each call when profiling is enabled
+
+    key(*args, **kwargs) returns (command, method, router_ip) of the call;
+    only commands selected by IPA_PROFILE are profiled. With profiling off
+    the function is returned unchanged.
+    """
+    def decorator(function):
+        if not ENABLED:
+            return function
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            command, method, router_ip = key(*args, **kwargs)
+            if not _wanted(command):
+                return function(*args, **kwargs)
+            return profiler.run(command, method, router_ip, function, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Top functions of saved command profiles")
+    parser.add_argument("directory", nargs="?", default=PROFILE_DIR)
+    parser.add_argument("--top", type=int, default=PROFILE_TOP)
+    parser.add_argument("--sort", default=PROFILE_SORT, help="pstats sort key, e.g. cumulative or tottime")
+    parser.add_argument("--command", help="only profiles of this command")
+    args = parser.parse_args()
+
+    # file names are <command>-<method>-<router>-<time>.prof
+    groups = {}
+    for path in sorted(glob.glob(os.path.join(args.directory, "*.prof"))):
+        command, method = os.path.basename(path).split("-")[:2]
+        if args.command is None or command == args.command:
+            groups.setdefault((command, method), []).append(path)
+    if not groups:
+        print(f"No profiles in {args.directory}")
+        return
+
+    for (command, method), paths in sorted(groups.items()):
+        stats = pstats.Stats(*paths)
+        print(top_functions(stats, f"{command} ({method}): {len(paths)} runs", args.top, args.sort))
+
+
+if __name__ == "__main__":
+    main()
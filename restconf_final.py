@@ -1,5 +1,16 @@
 import json
+import os
+import status_cache
+import inventory
+import metrics
+import threading
+import time
 import requests
+from urllib.parse import quote
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPSConnection
+from urllib3.connectionpool import HTTPSConnectionPool
+from payload_templates import DEFAULT_LOOPBACK, loopback_params, RESTCONF_CREATE, RESTCONF_SET_ENABLED
 requests.packages.urllib3.disable_warnings()
 
 # the RESTCONF HTTP headers, including the Accept and Content-Type
@@ -10,151 +21,349 @@ headers = {
 }
 basicauth = ("admin", "cisco")
 
+# HTTP connection pool settings (can be overridden with environment variables)
+POOL_CONNECTIONS = int(os.environ.get("RESTCONF_POOL_CONNECTIONS", 1))
+POOL_MAXSIZE = int(os.environ.get("RESTCONF_POOL_MAXSIZE", 4))
+CONNECT_TIMEOUT = float(os.environ.get("RESTCONF_CONNECT_TIMEOUT", 5))
+READ_TIMEOUT = float(os.environ.get("RESTCONF_READ_TIMEOUT", 30))
+RESTCONF_PORT = int(os.environ.get("RESTCONF_PORT", 443))
 
-def create(router_ip):
-    api_url = f"https://{router_ip}/restconf/data/ietf-interfaces:interfaces/interface=Loopback66070077"
-    
-    # Check if interface already exists
-    check_resp = requests.get(
-        api_url,
-        auth=basicauth,
-        headers=headers,
-        verify=False
-    )
-    
-    # If interface exists (status 200), return error message
-    if check_resp.status_code == 200:
-        print("Interface already exists. Status Code: {}".format(check_resp.status_code))
-        return "Cannot create: Interface loopback 66070077 (checked by Restconf)"
-    
-    # If interface doesn't exist (status 404), proceed to create
-    yangConfig = {
-        "ietf-interfaces:interface": {
-            "name": "Loopback66070077",
-            "description": "Loopback Interface 66070077",
-            "type": "iana-if-type:softwareLoopback",
-            "enabled": True,
-            "ietf-ip:ipv4": {
-                "address": [
-                    {
-                        "ip": "172.0.77.1",
-                        "netmask": "255.255.255.0"
-                    }
-                ]
-            }
+# one keep-alive session per router so TCP+TLS connections are reused
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+# seconds the current request of this thread spent opening connections
+_connect_time = threading.local()
+
+
+class _MeasuredHTTPSConnection(HTTPSConnection):
+    """HTTPS connection that records how long its TCP and TLS handshakes took"""
+
+    def connect(self):
+        start = time.perf_counter()
+        super().connect()
+        _connect_time.seconds = getattr(_connect_time, "seconds", 0.0) + time.perf_counter() - start
+
+
+class _MeasuredHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _MeasuredHTTPSConnection
+
+
+class _MeasuredHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose connections report new handshakes (see _request)"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            **self.poolmanager.pool_classes_by_scheme, "https": _MeasuredHTTPSConnectionPool,
         }
-    }
 
-    resp = requests.put(
-        api_url, 
-        data=json.dumps(yangConfig), 
-        auth=basicauth, 
-        headers=headers, 
-        verify=False
+
+def get_session(router_ip):
+    """
+    Get the shared requests.Session for a router
+
+    The session keeps its connections alive, so following requests to the
+    same router skip the TCP and TLS handshakes.
+    """
+    with _sessions_lock:
+        session = _sessions.get(router_ip)
+        if session is None:
+            session = requests.Session()
+            adapter = _MeasuredHTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE)
+            session.mount("https://", adapter)
+            session.auth = basicauth
+            session.headers.update(headers)
+            session.verify = False
+            _sessions[router_ip] = session
+        return session
+
+
+def close_sessions():
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+def base_url(router_ip):
+    return f"https://{inventory.device_address(router_ip)}:{RESTCONF_PORT}/restconf"
+
+
+def _request(method, router_ip, url, **kwargs):
+    kwargs.setdefault("timeout", (CONNECT_TIMEOUT, READ_TIMEOUT))
+    # per request: REQUESTS_CA_BUNDLE/CURL_CA_BUNDLE would override session.verify
+    kwargs.setdefault("verify", False)
+    _connect_time.seconds = 0.0
+    start = time.perf_counter()
+    try:
+        resp = get_session(router_ip).request(method, url, **kwargs)
+    except requests.RequestException as e:
+        reason = "timeout" if isinstance(e, requests.Timeout) else "connection"
+        metrics.device_errors_total.inc(backend="restconf", reason=reason)
+        raise
+    elapsed = time.perf_counter() - start
+
+    # the handshakes of a new connection count as connect, the rest as rpc
+    connect = _connect_time.seconds
+    if connect:
+        metrics.phase_seconds.observe(connect, phase="connect", backend="restconf")
+    metrics.connections_total.inc(backend="restconf", outcome="opened" if connect else "reused")
+    metrics.phase_seconds.observe(elapsed - connect, phase="rpc", backend="restconf")
+    if resp.status_code >= 400:
+        metrics.device_errors_total.inc(backend="restconf", reason=str(resp.status_code))
+    return resp
+
+
+@status_cache.invalidates
+def create(router_ip, number=DEFAULT_LOOPBACK, ip=None, netmask="255.255.255.0"):
+    # POST to the parent list creates the interface only if it does not exist
+    # yet (RFC 8040 4.4.1), so the existence check and the create are one
+    # request and nothing can sneak in between them
+    api_url = f"{base_url(router_ip)}/data/ietf-interfaces:interfaces"
+
+    loopback = loopback_params(number, ip, netmask)
+    yangConfig = RESTCONF_CREATE.render(enabled=True, **loopback)
+
+    resp = _request(
+        "POST", router_ip, api_url,
+        data=yangConfig
         )
 
     if(resp.status_code >= 200 and resp.status_code <= 299):
         print("STATUS OK: {}".format(resp.status_code))
-        return "Interface loopback 66070077 is created successfully using Restconf"
+        return f"Interface loopback {number} is created successfully using Restconf"
+    elif(resp.status_code == 409):
+        # 409 Conflict (data-exists): the interface is already there
+        print("Interface already exists. Status Code: {}".format(resp.status_code))
+        return f"Cannot create: Interface loopback {number} (checked by Restconf)"
     else:
         print('Error. Status Code: {}'.format(resp.status_code))
-        return "Cannot create: Interface loopback 66070077 (checked by Restconf)"
+        return f"Cannot create: Interface loopback {number} (checked by Restconf)"
 
 
-def delete(router_ip):
-    api_url = f"https://{router_ip}/restconf/data/ietf-interfaces:interfaces/interface=Loopback66070077"
+@status_cache.invalidates
+def delete(router_ip, number=DEFAULT_LOOPBACK):
+    api_url = f"{base_url(router_ip)}/data/ietf-interfaces:interfaces/interface=Loopback{number}"
     
-    resp = requests.delete(
-        api_url, 
-        auth=basicauth, 
-        headers=headers, 
-        verify=False
-        )
+    resp = _request("DELETE", router_ip, api_url)
 
     if(resp.status_code >= 200 and resp.status_code <= 299):
         print("STATUS OK: {}".format(resp.status_code))
-        return "Interface loopback 66070077 is deleted successfully using Restconf"
+        return f"Interface loopback {number} is deleted successfully using Restconf"
     else:
         print('Error. Status Code: {}'.format(resp.status_code))
-        return "Cannot delete: Interface loopback 66070077 (checked by Restconf)"
+        return f"Cannot delete: Interface loopback {number} (checked by Restconf)"
 
 
-def enable(router_ip):
-    api_url = f"https://{router_ip}/restconf/data/ietf-interfaces:interfaces/interface=Loopback66070077"
+@status_cache.invalidates
+def enable(router_ip, number=DEFAULT_LOOPBACK):
+    api_url = f"{base_url(router_ip)}/data/ietf-interfaces:interfaces/interface=Loopback{number}"
     
-    yangConfig = {
-        "ietf-interfaces:interface": {
-            "name": "Loopback66070077",
-            "type": "iana-if-type:softwareLoopback",
-            "enabled": True
-        }
-    }
+    yangConfig = RESTCONF_SET_ENABLED.render(enabled=True, **loopback_params(number))
 
-    resp = requests.patch(
-        api_url, 
-        data=json.dumps(yangConfig), 
-        auth=basicauth, 
-        headers=headers, 
-        verify=False
+    resp = _request(
+        "PATCH", router_ip, api_url,
+        data=yangConfig
         )
 
     if(resp.status_code >= 200 and resp.status_code <= 299):
         print("STATUS OK: {}".format(resp.status_code))
-        return "Interface loopback 66070077 is enabled successfully using Restconf"
+        return f"Interface loopback {number} is enabled successfully using Restconf"
     else:
         print('Error. Status Code: {}'.format(resp.status_code))
-        return "Cannot enable: Interface loopback 66070077 (checked by Restconf)"
+        return f"Cannot enable: Interface loopback {number} (checked by Restconf)"
 
 
-def disable(router_ip):
-    api_url = f"https://{router_ip}/restconf/data/ietf-interfaces:interfaces/interface=Loopback66070077"
+@status_cache.invalidates
+def disable(router_ip, number=DEFAULT_LOOPBACK):
+    api_url = f"{base_url(router_ip)}/data/ietf-interfaces:interfaces/interface=Loopback{number}"
     
-    yangConfig = {
-        "ietf-interfaces:interface": {
-            "name": "Loopback66070077",
-            "type": "iana-if-type:softwareLoopback",
-            "enabled": False
-        }
-    }
+    yangConfig = RESTCONF_SET_ENABLED.render(enabled=False, **loopback_params(number))
 
-    resp = requests.patch(
-        api_url, 
-        data=json.dumps(yangConfig), 
-        auth=basicauth, 
-        headers=headers, 
-        verify=False
+    resp = _request(
+        "PATCH", router_ip, api_url,
+        data=yangConfig
         )
 
     if(resp.status_code >= 200 and resp.status_code <= 299):
         print("STATUS OK: {}".format(resp.status_code))
-        return "Interface loopback 66070077 is shutdowned successfully using Restconf"
+        return f"Interface loopback {number} is shutdowned successfully using Restconf"
     else:
         print('Error. Status Code: {}'.format(resp.status_code))
-        return "Cannot shutdown: Interface loopback 66070077 (checked by Restconf)"
+        return f"Cannot shutdown: Interface loopback {number} (checked by Restconf)"
 
 
-def status(router_ip):
-    api_url_status = f"https://{router_ip}/restconf/data/ietf-interfaces:interfaces-state/interface=Loopback66070077"
+def status(router_ip, number=DEFAULT_LOOPBACK):
+    try:
+        return _status(router_ip, number)
+    except requests.HTTPError as e:
+        # errors are not cached, the next status asks the router again
+        print(f"Error. {e}")
+        return f"No Interface loopback {number} (checked by Restconf)"
 
-    resp = requests.get(
-        api_url_status, 
-        auth=basicauth, 
-        headers=headers, 
-        verify=False
-        )
+
+@status_cache.cached("restconf_status")
+def _status(router_ip, number):
+    api_url_status = f"{base_url(router_ip)}/data/ietf-interfaces:interfaces-state/interface=Loopback{number}"
+
+    resp = _request("GET", router_ip, api_url_status)
 
     if(resp.status_code >= 200 and resp.status_code <= 299):
         print("STATUS OK: {}".format(resp.status_code))
-        response_json = resp.json()
+        with metrics.timed("reply_parse", "restconf"):
+            response_json = resp.json()
         admin_status = response_json['ietf-interfaces:interface']['admin-status']
         oper_status = response_json['ietf-interfaces:interface']['oper-status']
         if admin_status == 'up' and oper_status == 'up':
-            return "Interface loopback 66070077 is enabled (checked by Restconf)"
+            return f"Interface loopback {number} is enabled (checked by Restconf)"
         elif admin_status == 'down' and oper_status == 'down':
-            return "Interface loopback 66070077 is disabled (checked by Restconf)"
+            return f"Interface loopback {number} is disabled (checked by Restconf)"
     elif(resp.status_code == 404):
         print("STATUS NOT FOUND: {}".format(resp.status_code))
-        return "No Interface loopback 66070077 (checked by Restconf)"
+        return f"No Interface loopback {number} (checked by Restconf)"
     else:
-        print('Error. Status Code: {}'.format(resp.status_code))
-        return "No Interface loopback 66070077 (checked by Restconf)"
+        raise requests.HTTPError(f"Status Code: {resp.status_code}", response=resp)
+
+
+def all_interface_states(router_ip):
+    """
+    Name, admin-status and oper-status of every interface in one request
+
+    The fields= query parameter (RFC 8040 4.8.3) makes the device return only
+    these three leaves of interfaces-state. Returns a list of dicts; raises on
+    HTTP errors so callers can fall back to another method.
+    """
+    api_url = f"{base_url(router_ip)}/data/ietf-interfaces:interfaces-state"
+
+    resp = _request(
+        "GET", router_ip, api_url,
+        params={"fields": "interface(name;admin-status;oper-status)"}
+        )
+    resp.raise_for_status()
+
+    with metrics.timed("reply_parse", "restconf"):
+        interfaces = resp.json().get("ietf-interfaces:interfaces-state", {}).get("interface", [])
+        return [
+            {
+                "name": interface.get("name", ""),
+                "admin-status": interface.get("admin-status", "down"),
+                "oper-status": interface.get("oper-status", "down"),
+            }
+            for interface in interfaces
+        ]
+
+
+def interface_edit(operation, name, **fields):
+    """
+    Build one edit for patch_interfaces
+
+    Args:
+        operation: create, merge, replace, delete or remove
+        name: interface name, e.g. "Loopback1"
+        fields: interface leaves for create/merge/replace, e.g.
+            description="...", enabled=True, type="iana-if-type:softwareLoopback",
+            ip="172.0.1.1", netmask="255.255.255.0"
+
+    Returns:
+        Dict with "operation", "interface" and (if any) "value"
+    """
+    edit = {"operation": operation, "interface": name}
+    if operation in ("create", "merge", "replace"):
+        value = {"name": name}
+        ip = fields.pop("ip", None)
+        netmask = fields.pop("netmask", "255.255.255.0")
+        value.update(fields)
+        if ip is not None:
+            value["ietf-ip:ipv4"] = {"address": [{"ip": ip, "netmask": netmask}]}
+        edit["value"] = value
+    return edit
+
+
+@status_cache.invalidates
+def patch_interfaces(router_ip, edits, patch_id="ipa2024-batch"):
+    """
+    Apply many interface changes in one RFC 8072 YANG-Patch request
+
+    All edits go to the device in a single PATCH with the
+    application/yang-patch+json media type. The device applies them all or
+    none, and reports which edit failed.
+
+    Args:
+        router_ip: IP address of the router
+        edits: list of edits from interface_edit(), at least one
+        patch_id: identifier echoed back by the device
+
+    Returns:
+        Dict {"ok": bool, "status_code": int, "edits": [...]} where every edit
+        has "edit-id", "interface", "operation", "ok" and "error"
+    """
+    if not edits:
+        raise ValueError("patch_interfaces needs at least one edit")
+
+    api_url = f"{base_url(router_ip)}/data/ietf-interfaces:interfaces"
+
+    patch_edits = []
+    results = []
+    for number, edit in enumerate(edits, start=1):
+        edit_id = f"edit-{number}"
+        patch_edit = {
+            "edit-id": edit_id,
+            "operation": edit["operation"],
+            # names like GigabitEthernet0/0/1 contain "/", which must be
+            # percent-encoded in the key of the target (RFC 8040 3.5.3)
+            "target": f"/interface={quote(edit['interface'], safe='')}",
+        }
+        if "value" in edit:
+            patch_edit["value"] = {"ietf-interfaces:interface": [edit["value"]]}
+        patch_edits.append(patch_edit)
+        results.append({
+            "edit-id": edit_id,
+            "interface": edit["interface"],
+            "operation": edit["operation"],
+            "ok": False,
+            "error": None,
+        })
+
+    yangPatch = {
+        "ietf-yang-patch:yang-patch": {
+            "patch-id": patch_id,
+            "edit": patch_edits
+        }
+    }
+
+    resp = _request(
+        "PATCH", router_ip, api_url,
+        data=json.dumps(yangPatch),
+        headers={"Content-Type": "application/yang-patch+json"}
+        )
+
+    status = {}
+    if resp.content:
+        try:
+            status = resp.json().get("ietf-yang-patch:yang-patch-status", {})
+        except ValueError:
+            status = {}
+
+    if(resp.status_code >= 200 and resp.status_code <= 299):
+        print("STATUS OK: {} ({} edits)".format(resp.status_code, len(edits)))
+        for result in results:
+            result["ok"] = True
+        return {"ok": True, "status_code": resp.status_code, "edits": results}
+
+    print('Error. Status Code: {}'.format(resp.status_code))
+    # the patch is applied all-or-nothing: failed edits carry their errors,
+    # the others were rolled back
+    edit_errors = {}
+    for edit_status in status.get("edit-status", {}).get("edit", []):
+        errors = edit_status.get("errors", {}).get("error", [])
+        if errors:
+            edit_errors[edit_status.get("edit-id")] = errors[0].get("error-message") or errors[0].get("error-tag")
+    global_errors = status.get("errors", {}).get("error", [])
+    global_error = None
+    if global_errors:
+        global_error = global_errors[0].get("error-message") or global_errors[0].get("error-tag")
+
+    for result in results:
+        result["error"] = edit_errors.get(result["edit-id"]) or global_error or "not applied"
+    return {"ok": False, "status_code": resp.status_code, "edits": results}
@@ -0,0 +1,112 @@
+import functools
+import os
+import threading
+import time
+
+# Seconds a status answer stays valid (0 disables caching)
+CACHE_TTL = float(os.environ.get("STATUS_CACHE_TTL", 5))
+
+
+class StatusCache:
+    """
+    Short-lived cache for read-only device queries
+
+    Entries are keyed by (router_ip, query) and expire after ttl seconds.
+    When several callers ask for the same key at the same time only the first
+    one talks to the device and the others wait for its answer. Any change
+    made to a router (invalidate) drops its entries, and a read that was
+    already running when the change happened is not stored.
+    """
+
+    def __init__(self, ttl=CACHE_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}      # (router_ip, query) -> (expires_at, value)
+        self._inflight = {}     # (router_ip, query) -> running call
+        self._generation = {}   # router_ip -> number of invalidations so far
+
+    def get(self, router_ip, query, fetch):
+        """Return the cached answer for (router_ip, query), calling fetch() when needed"""
+        key = (router_ip, query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                return entry[1]
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = {
+                    "done": threading.Event(),
+                    "value": None,
+                    "error": None,
+                    "generation": self._generation.get(router_ip, 0),
+                }
+                self._inflight[key] = call
+
+        if not leader:
+            call["done"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            return call["value"]
+
+        try:
+            call["value"] = fetch()
+            return call["value"]
+        except Exception as e:
+            call["error"] = e
+            raise
+        finally:
+            with self._lock:
+                if self._inflight.get(key) is call:
+                    del self._inflight[key]
+                unchanged = call["generation"] == self._generation.get(router_ip, 0)
+                if call["error"] is None and unchanged and self.ttl > 0:
+                    self._entries[key] = (time.monotonic() + self.ttl, call["value"])
+            call["done"].set()
+
+    def invalidate(self, router_ip):
+        """Forget everything cached for router_ip"""
+        with self._lock:
+            self._generation[router_ip] = self._generation.get(router_ip, 0) + 1
+            for key in [k for k in self._entries if k[0] == router_ip]:
+                del self._entries[key]
+            # new readers must not join a read that started before the change
+            for key in [k for k in self._inflight if k[0] == router_ip]:
+                del self._inflight[key]
+
+    def clear(self):
+        with self._lock:
+            for router_ip in list(self._generation):
+                self._generation[router_ip] += 1
+            self._entries.clear()
+            self._inflight.clear()
+
+
+cache = StatusCache()
+
+
+def cached(query):
+    """
+    Decorator for f(router_ip, ...) status reads
+
+    The answer is cached under (router_ip, query), extra arguments are part
+    of the query.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(router_ip, *args, **kwargs):
+            key = (query,) + args + tuple(sorted(kwargs.items())) if args or kwargs else query
+            return cache.get(router_ip, key, lambda: function(router_ip, *args, **kwargs))
+        return wrapper
+    return decorator
+
+
+def invalidates(function):
+    """Decorator for f(router_ip, ...) that changes the router, drops its cached status"""
+    @functools.wraps(function)
+    def wrapper(router_ip, *args, **kwargs):
+        try:
+            return function(router_ip, *args, **kwargs)
+        finally:
+            cache.invalidate(router_ip)
+    return wrapper
@@ -0,0 +1,118 @@
+import hashlib
+import hmac
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class WebhookServer:
+    """
+    Small HTTP listener for Webex webhook events
+
+    Webex POSTs a JSON event to the listener whenever something happens in
+    the room. Only "messages" / "created" events are passed on, and only the
+    message id is handed to on_message; the message itself still has to be
+    fetched from the messages API because the event does not contain its text.
+
+    Without a secret any client that reaches the listener can post events,
+    so it listens on localhost unless another host is given.
+    """
+
+    def __init__(self, on_message, host="127.0.0.1", port=8080, secret=None):
+        self.on_message = on_message
+        self.secret = secret
+        self.httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def port(self):
+        return self.httpd.server_address[1]
+
+    def _valid_signature(self, body, signature):
+        # Webex signs the body with HMAC-SHA1 of the webhook secret
+        if not self.secret:
+            return True
+        expected = hmac.new(self.secret.encode(), body, hashlib.sha1).hexdigest()
+        return hmac.compare_digest(expected, signature or "")
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length)
+
+                if not server._valid_signature(body, self.headers.get("X-Spark-Signature")):
+                    self.send_response(403)
+                    self.end_headers()
+                    return
+
+                try:
+                    event = json.loads(body)
+                except ValueError:
+                    self.send_response(400)
+                    self.end_headers()
+                    return
+
+                # answer right away, Webex does not wait for the command to finish
+                self.send_response(200)
+                self.end_headers()
+
+                if event.get("resource") == "messages" and event.get("event") == "created":
+                    message_id = event.get("data", {}).get("id")
+                    if message_id:
+                        try:
+                            server.on_message(message_id)
+                        except Exception as e:
+                            print(f"Error handling webhook event: {e}")
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        host = self.httpd.server_address[0]
+        print(f"Webhook listener started on {host}:{self.port}")
+        if not self.secret and host not in ("127.0.0.1", "localhost", "::1"):
+            print("Warning: webhook events are not signed, set WEBHOOK_SECRET")
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def register_webhook(api_url, access_token, target_url, room_id, secret=None, name="IPA2024 bot"):
+    """
+    Register (or reuse) a messages/created webhook for the room
+
+    Returns the webhook id, or None if Webex refused the registration.
+    """
+    import requests
+
+    headers = {"Authorization": "Bearer " + access_token, "Content-Type": "application/json"}
+
+    r = requests.get(f"{api_url}/webhooks", headers=headers)
+    if r.status_code == 200:
+        for hook in r.json().get("items", []):
+            if hook.get("targetUrl") == target_url and hook.get("resource") == "messages":
+                return hook["id"]
+
+    data = {
+        "name": name,
+        "targetUrl": target_url,
+        "resource": "messages",
+        "event": "created",
+        "filter": f"roomId={room_id}",
+    }
+    if secret:
+        data["secret"] = secret
+    r = requests.post(f"{api_url}/webhooks", data=json.dumps(data), headers=headers)
+    if r.status_code != 200:
+        print(f"Error registering webhook. Status code: {r.status_code}")
+        return None
+    return r.json()["id"]